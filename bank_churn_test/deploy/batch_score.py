@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+"""Chấm điểm churn offline cho file khách hàng lớn (CSV/Parquet), không qua HTTP
+
+File đầu vào được đọc tuần tự theo chunk (CHUNK_ROWS dòng), mỗi chunk được chấm
+điểm trong một process của pool bằng model MLflow đã log (sklearn Pipeline nhận
+feature gốc, xem pipeline/serving_transform.py) rồi ghi thành Parquet phân vùng
+(hive, vd. Geography=France/part-00012-0.parquet) ở thư mục local hoặc MinIO.
+Số chunk đang xử lý được giới hạn nên bộ nhớ không phụ thuộc kích thước file.
+
+Tiến độ được ghi vào _progress.json ở thư mục đầu ra sau mỗi chunk; chạy lại cùng
+lệnh thì các chunk đã xong được bỏ qua. Tên file của một chunk cố định nên chunk
+đang ghi dở khi bị dừng sẽ được ghi đè ở lần chạy sau.
+
+    python batch_score.py --model-uri runs:/<run_id>/model --input ../dataset/churn.csv \\
+        --output s3://mlflow-artifacts/batch-scores/2025-06-01 --partition-by Geography
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import boto3
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from botocore.client import Config
+from botocore.exceptions import ClientError
+
+from config.mlflow_config import MLFLOW_TRACKING_URI, MINIO_ENDPOINT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY
+
+# Thứ tự feature của model
+MODEL_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_schema.json")
+# Cột định danh được giữ lại trong kết quả nếu có trong file đầu vào
+ID_COLUMNS = ["RowNumber", "CustomerId"]
+PROGRESS_FILE = "_progress.json"
+CHUNK_ROWS = 100_000
+BATCH_WORKERS = min(4, os.cpu_count() or 1)
+# Số chunk tối đa đang chờ/đang chấm điểm trên mỗi worker
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+PREDICTION_THRESHOLD = 0.5
+
+def get_minio_client(endpoint=MINIO_ENDPOINT):
+    """Khởi tạo MinIO client"""
+    return boto3.client(
+        's3',
+        endpoint_url=endpoint,
+        aws_access_key_id=MINIO_ACCESS_KEY,
+        aws_secret_access_key=MINIO_SECRET_KEY,
+        config=Config(signature_version='s3v4'),
+        region_name='us-east-1'
+    )
+
+def split_s3_uri(uri):
+    """s3://bucket/prefix -> (bucket, prefix)"""
+    bucket, _, prefix = uri[len("s3://"):].partition("/")
+    return bucket, prefix.strip("/")
+
+class ParquetSink:
+    """Thư mục đầu ra (local hoặc s3://bucket/prefix) cho file Parquet và file tiến độ
+
+    Được pickle sang worker; MinIO client chỉ được tạo khi cần trong từng process.
+    """
+
+    def __init__(self, target, minio_endpoint=MINIO_ENDPOINT):
+        self.target = target.rstrip("/")
+        self.minio_endpoint = minio_endpoint
+        self.is_s3 = target.startswith("s3://")
+        self._client = None
+
+    def __getstate__(self):
+        return dict(self.__dict__, _client=None)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_minio_client(self.minio_endpoint)
+        return self._client
+
+    def write_chunk(self, index, table, partition_by):
+        """Ghi một chunk; tên file cố định theo index nên ghi lại thì đè lên bản cũ"""
+        options = dict(partition_cols=partition_by or None, basename_template=f"part-{index:05d}-{{i}}.parquet",
+                       existing_data_behavior="overwrite_or_ignore")
+        if not self.is_s3:
+            pq.write_to_dataset(table, self.target, **options)
+            return
+        bucket, prefix = split_s3_uri(self.target)
+        with tempfile.TemporaryDirectory() as staging:
+            pq.write_to_dataset(table, staging, **options)
+            for directory, _, files in os.walk(staging):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    key = "/".join(filter(None, [prefix, os.path.relpath(path, staging).replace(os.sep, "/")]))
+                    self.client.upload_file(path, bucket, key)
+
+    def read_progress(self):
+        if not self.is_s3:
+            path = os.path.join(self.target, PROGRESS_FILE)
+            if not os.path.exists(path):
+                return None
+            with open(path) as f:
+                return json.load(f)
+        bucket, prefix = split_s3_uri(self.target)
+        try:
+            body = self.client.get_object(Bucket=bucket, Key=f"{prefix}/{PROGRESS_FILE}".lstrip("/"))["Body"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise
+        return json.loads(body.read())
+
+    def write_progress(self, progress):
+        data = json.dumps(progress, indent=2).encode("utf-8")
+        if self.is_s3:
+            bucket, prefix = split_s3_uri(self.target)
+            self.client.put_object(Bucket=bucket, Key=f"{prefix}/{PROGRESS_FILE}".lstrip("/"), Body=data)
+            return
+        # Ghi file tạm rồi đổi tên để file tiến độ không bao giờ bị ghi dở
+        os.makedirs(self.target, exist_ok=True)
+        path = os.path.join(self.target, PROGRESS_FILE)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+def open_input(path, minio_endpoint, workdir):
+    """Trả về (đường dẫn local, phiên bản) của file đầu vào; file trên MinIO được tải về workdir
+
+    Phiên bản (ETag hoặc kích thước + mtime) được lưu trong file tiến độ để không tiếp
+    tục một lần chạy dở trên một file đã thay đổi.
+    """
+    if not path.startswith("s3://"):
+        if os.path.isdir(path):
+            # Thư mục Parquet: phiên bản theo từng file bên trong
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+            return path, json.dumps([[os.path.relpath(f, path), os.stat(f).st_size, os.stat(f).st_mtime_ns]
+                                     for f in files])
+        stat = os.stat(path)
+        return path, f"{stat.st_size}-{stat.st_mtime_ns}"
+    bucket, key = split_s3_uri(path)
+    client = get_minio_client(minio_endpoint)
+    etag = client.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+    local_path = os.path.join(workdir, os.path.basename(key))
+    client.download_file(bucket, key, local_path)
+    return local_path, etag
+
+def is_parquet(path):
+    return path.endswith((".parquet", ".pq")) or os.path.isdir(path)
+
+def parquet_dataset(path):
+    """File Parquet hoặc thư mục Parquet (có thể phân vùng kiểu hive)"""
+    return ds.dataset(path, format="parquet", partitioning="hive")
+
+def input_columns(path):
+    if is_parquet(path):
+        return parquet_dataset(path).schema.names
+    import pandas as pd
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def iter_chunks(path, columns, chunk_rows):
+    """Đọc file theo từng chunk (DataFrame) cố định chunk_rows dòng, chỉ các cột cần"""
+    if is_parquet(path):
+        # Batch của dataset bị cắt ở ranh giới file/row group: gom lại cho đủ chunk_rows dòng
+        # để biên chunk cố định giữa các lần chạy (tiếp tục từ _progress.json)
+        pending, pending_rows = [], 0
+        for batch in parquet_dataset(path).to_batches(batch_size=chunk_rows, columns=columns, use_threads=False):
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= chunk_rows:
+                table = pa.Table.from_batches(pending)
+                yield table.slice(0, chunk_rows).to_pandas()
+                rest = table.slice(chunk_rows)
+                pending, pending_rows = rest.to_batches(), rest.num_rows
+        if pending_rows:
+            yield pa.Table.from_batches(pending).to_pandas()
+    else:
+        import pandas as pd
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+_worker = {}
+
+def _init_worker(model_path):
+    """Chạy trong process con: load model một lần cho mọi chunk"""
+    import mlflow.sklearn
+    _worker["model"] = mlflow.sklearn.load_model(model_path)
+
+def _score_chunk(index, chunk, row_start, keep_columns, sink, partition_by):
+    """Chấm điểm một chunk và ghi ra sink, trả về (index, số dòng, giây chấm điểm)"""
+    start_time = time.perf_counter()
+    probability = _worker["model"].predict_proba(chunk)[:, 1]
+    table = pa.Table.from_pandas(chunk[keep_columns], preserve_index=False)
+    table = table.append_column("row_index", pa.array(range(row_start, row_start + len(chunk)), pa.int64()))
+    table = table.append_column("churn_probability", pa.array(probability))
+    table = table.append_column("churn_prediction", pa.array((probability > PREDICTION_THRESHOLD).astype("int8")))
+    seconds = time.perf_counter() - start_time
+    sink.write_chunk(index, table, partition_by)
+    return index, len(chunk), seconds
+
+def run_batch(model_uri, input_path, output, partition_by=None, chunk_rows=CHUNK_ROWS,
+              workers=BATCH_WORKERS, minio_endpoint=MINIO_ENDPOINT):
+    """Chấm điểm cả file, trả về thống kê (dòng, giây, dòng/giây)"""
+    import mlflow.artifacts
+
+    partition_by = list(partition_by or [])
+    sink = ParquetSink(output, minio_endpoint)
+    workdir = tempfile.mkdtemp(prefix="batch-score-")
+    try:
+        local_input, input_version = open_input(input_path, minio_endpoint, workdir)
+        with open(MODEL_SCHEMA_PATH) as f:
+            feature_names = json.load(f)["feature_names"]
+        available = input_columns(local_input)
+        missing = [name for name in feature_names + partition_by if name not in available]
+        if missing:
+            raise ValueError(f"File đầu vào thiếu cột: {missing}")
+        keep_columns = [name for name in ID_COLUMNS if name in available and name not in partition_by] + partition_by
+        columns = list(dict.fromkeys(feature_names + keep_columns))
+
+        job = {"input": input_path, "input_version": input_version, "model_uri": model_uri,
+               "chunk_rows": chunk_rows, "partition_by": partition_by}
+        progress = sink.read_progress()
+        if progress is None:
+            progress = dict(job, completed={}, rows=0, seconds=0.0)
+        elif any(progress.get(key) != value for key, value in job.items()):
+            raise ValueError(f"{output} chứa kết quả của một lần chạy khác (input/model/chunk), "
+                             f"dùng thư mục đầu ra khác")
+        else:
+            print(f"Tiếp tục: {len(progress['completed'])} chunk đã xong ({progress['rows']} dòng)")
+        completed = progress["completed"]
+
+        # Tải model một lần, các worker load từ bản local
+        model_path = mlflow.artifacts.download_artifacts(model_uri, dst_path=os.path.join(workdir, "model"))
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(model_path,)
+        )
+        rows, scoring_seconds = 0, 0.0
+        start_time = time.perf_counter()
+
+        def collect(futures):
+            nonlocal rows, scoring_seconds
+            for future in futures:
+                index, count, seconds = future.result()
+                completed[str(index)] = count
+                rows += count
+                scoring_seconds += seconds
+                progress["rows"] += count
+                sink.write_progress(progress)
+                elapsed = time.perf_counter() - start_time
+                print(f"[{elapsed:7.1f}s] chunk {index}: {count} dòng, tổng {rows} dòng, "
+                      f"{rows / elapsed:,.0f} dòng/s")
+
+        running = set()
+        row_start = 0
+        with executor:
+            for index, chunk in enumerate(iter_chunks(local_input, columns, chunk_rows)):
+                if str(index) not in completed:
+                    if len(running) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                        done, running = wait(running, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    running.add(executor.submit(_score_chunk, index, chunk, row_start,
+                                                keep_columns, sink, partition_by))
+                row_start += len(chunk)
+            collect(wait(running).done)
+
+        elapsed = time.perf_counter() - start_time
+        progress["seconds"] += elapsed
+        progress["total_rows"] = row_start
+        sink.write_progress(progress)
+        return {
+            "rows": rows,
+            "seconds": elapsed,
+            "rows_per_second": rows / elapsed if elapsed > 0 else 0.0,
+            "scoring_seconds": scoring_seconds,
+            "total_rows": row_start
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Chấm điểm churn offline theo chunk')
+    parser.add_argument('--model-uri', required=True, help='MLflow model (vd. runs:/<run_id>/model)')
+    parser.add_argument('--input', required=True, help='File CSV/Parquet, local hoặc s3://bucket/key')
+    parser.add_argument('--output', required=True, help='Thư mục kết quả, local hoặc s3://bucket/prefix')
+    parser.add_argument('--partition-by', nargs='*', default=[], help='Cột phân vùng (vd. Geography)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='Số dòng mỗi chunk')
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help='Số process chấm điểm')
+    parser.add_argument('--minio-endpoint', default=MINIO_ENDPOINT, help='MinIO endpoint')
+    parser.add_argument('--tracking-uri', default=MLFLOW_TRACKING_URI, help='MLflow tracking URI')
+    args = parser.parse_args()
+
+    os.environ["AWS_ACCESS_KEY_ID"] = MINIO_ACCESS_KEY
+    os.environ["AWS_SECRET_ACCESS_KEY"] = MINIO_SECRET_KEY
+    os.environ["MLFLOW_S3_ENDPOINT_URL"] = args.minio_endpoint
+    os.environ["MLFLOW_TRACKING_URI"] = args.tracking_uri
+
+    stats = run_batch(args.model_uri, args.input, args.output, args.partition_by,
+                      args.chunk_rows, args.workers, args.minio_endpoint)
+    if stats["rows"] == 0:
+        print(f"Không còn chunk nào cần chấm điểm ({stats['total_rows']} dòng đã xong)")
+        return
+    print(f"Đã chấm điểm {stats['rows']} dòng trong {stats['seconds']:.1f}s "
+          f"({stats['rows_per_second']:,.0f} dòng/s, {args.workers} worker, "
+          f"{stats['scoring_seconds']:.1f}s chấm điểm trong worker) -> {args.output}")
+
+if __name__ == "__main__":
+    main()
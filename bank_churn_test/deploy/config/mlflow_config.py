@@ -11,6 +11,11 @@ MINIO_BUCKET = "mlflow-artifacts"
 # KServe configuration
 KSERVE_ENDPOINT = "http://localhost:8085"
 MODEL_NAME = "bankchurn"
+# Giao thức gọi model: "rest" (HTTP/JSON) hoặc "grpc" (Open Inference Protocol qua gRPC)
+KSERVE_PROTOCOL = os.environ.get("KSERVE_PROTOCOL", "rest")
+KSERVE_GRPC_ENDPOINT = os.environ.get("KSERVE_GRPC_ENDPOINT", "localhost:8081")
+# Dùng binary tensor data extension cho request nhiều dòng (tự quay về JSON nếu server không hỗ trợ)
+KSERVE_BINARY_DATA = True
 
 def configure_mlflow(experiment_name="bank-churn-default"):
     """Configure MLflow tracking with MinIO as artifact store
@@ -1,22 +1,29 @@
 #!/usr/bin/env python
-import requests
-import json
 import mlflow
+import mlflow.sklearn
 import os
 import numpy as np
 import pandas as pd
 import time
+import uuid
+import tempfile
+import shutil
 from datetime import datetime
 import threading
 import schedule
-from sklearn.metrics import f1_score, accuracy_score
-from scipy.stats import ks_2samp
-import pickle
+from concurrent.futures import ThreadPoolExecutor
 import joblib
-import io
+import yaml
 import boto3
 from botocore.client import Config
 
+from config.mlflow_config import KSERVE_ENDPOINT, MODEL_NAME
+from utils.kserve_client import infer_batch
+from utils.reference_store import fetch_reference, load_reference, upload_reference, migrate_legacy_reference
+from utils.drift_metrics import load_feature_types, compute_drift, drift_metrics_to_flat
+from utils.performance_tracker import PerformanceTracker
+from utils.drift_report import submit_report
+
 # Cấu hình MLflow
 MLFLOW_TRACKING_URI = "http://mlflow.mlflow.svc.cluster.local:5000"
 MINIO_ENDPOINT = "http://minio-service.kubeflow.svc.cluster.local:9000"
@@ -24,16 +31,50 @@ MINIO_ACCESS_KEY = "minio"
 MINIO_SECRET_KEY = "minio123"
 MINIO_BUCKET = "mlflow-artifacts"
 
-# Cấu hình KServe
-KSERVE_ENDPOINT = "http://localhost:8085"
-MODEL_NAME = "bankchurn"
-
 # Cấu hình drift detection
 DRIFT_DETECTION_INTERVAL_HOURS = 1  # Thực hiện mỗi 1 giờ
 REFERENCE_DATA_SIZE = 100
 CURRENT_DATA_SIZE = 50
+# Các feature được kiểm tra drift (chỉ các cột này được đọc từ file tham chiếu)
+DRIFT_FEATURES = [
+    "CreditScore", "Geography", "Gender", "Age", "Tenure", "Balance",
+    "NumOfProducts", "HasCrCard", "IsActiveMember", "EstimatedSalary"
+]
 PSI_THRESHOLD = 0.2  # Population Stability Index threshold
 KS_THRESHOLD = 0.1  # Kolmogorov-Smirnov threshold
+JS_THRESHOLD = 0.1  # Jensen-Shannon divergence threshold (feature phân loại)
+CHI2_PVALUE_THRESHOLD = 0.01  # Mức ý nghĩa chi-square (feature phân loại)
+# Số process tính drift cho feature liên tục (1 = tuần tự, chỉ song song khi dữ liệu lớn)
+DRIFT_WORKERS = min(4, os.cpu_count() or 1)
+# Schema chứa loại của từng feature (categorical/continuous)
+MODEL_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_schema.json")
+
+# Theo dõi hiệu năng với nhãn đến muộn (CSV request_id,label trên MinIO)
+PERFORMANCE_DB_PATH = os.environ.get("PERFORMANCE_DB_PATH", "performance.db")
+LABELS_PREFIX = "labels/"
+# Mỗi lần chạy ghi CSV request_id + feature + dự đoán vào đây để bên gắn nhãn biết request ID
+PREDICTIONS_PREFIX = "predictions/"
+PERFORMANCE_ROLLING_WINDOWS = 24  # Số cửa sổ (giờ) gộp cho metric rolling
+
+# KServe (MLServer, model pyfunc) chỉ trả về nhãn; xác suất cho Brier/calibration được tính
+# bằng predict_proba của chính model đó. Mặc định đọc storageUri từ inference_service.yaml để
+# không giữ bản sao run ID thứ hai; PROBABILITY_MODEL_URI chỉ dùng để ghi đè
+INFERENCE_SERVICE_PATH = os.environ.get(
+    "INFERENCE_SERVICE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "inference_service.yaml")
+)
+
+def served_model_uri(path=INFERENCE_SERVICE_PATH):
+    """Đọc storageUri của predictor trong manifest InferenceService"""
+    with open(path) as f:
+        manifest = yaml.safe_load(f)
+    return manifest["spec"]["predictor"]["model"]["storageUri"]
+
+PROBABILITY_MODEL_URI = os.environ.get("PROBABILITY_MODEL_URI") or served_model_uri()
+
+# Cấu hình dự đoán batch
+PREDICT_CHUNK_SIZE = 1000  # Số dòng mỗi request
+PREDICT_MAX_IN_FLIGHT = 4  # Số request chạy đồng thời
+PREDICT_DEADLINE_SECONDS = 30
 
 def configure_mlflow():
     """Cấu hình MLflow tracking"""
@@ -73,113 +114,199 @@ def generate_data(count=100):
     
     return data
 
-def get_reference_data():
-    """Lấy dữ liệu tham chiếu từ MinIO hoặc tạo mới nếu chưa có"""
+def get_reference_data(columns=None):
+    """Lấy dữ liệu tham chiếu (Parquet, memory-mapped) từ MinIO hoặc tạo mới nếu chưa có
+
+    Args:
+        columns: chỉ đọc các cột này (mặc định: tất cả)
+    """
     s3_client = get_minio_client()
-    try:
-        # Thử lấy từ MinIO
-        response = s3_client.get_object(Bucket=MINIO_BUCKET, Key='reference_data.pkl')
-        reference_data = pickle.loads(response['Body'].read())
+    path = fetch_reference(s3_client, MINIO_BUCKET)
+    if path is None:
+        # Chuyển file pickle cũ nếu có, nếu không thì tạo mới
+        if migrate_legacy_reference(s3_client, MINIO_BUCKET) is None:
+            print("Dữ liệu tham chiếu không tồn tại, tạo mới...")
+            upload_reference(generate_data(REFERENCE_DATA_SIZE), s3_client, MINIO_BUCKET)
+        path = fetch_reference(s3_client, MINIO_BUCKET)
+    else:
         print("Đã lấy dữ liệu tham chiếu từ MinIO")
-        return reference_data
-    except:
-        # Nếu không tìm thấy, tạo mới
-        print("Dữ liệu tham chiếu không tồn tại, tạo mới...")
-        reference_data = generate_data(REFERENCE_DATA_SIZE)
-        
-        # Lưu vào MinIO
-        with io.BytesIO() as bio:
-            pickle.dump(reference_data, bio)
-            bio.seek(0)
-            s3_client.upload_fileobj(bio, MINIO_BUCKET, 'reference_data.pkl')
-        
-        return reference_data
-
-def predict_batch(data):
-    """Dự đoán cho một batch dữ liệu"""
-    url = f"{KSERVE_ENDPOINT}/v2/models/{MODEL_NAME}/infer"
-    headers = {"Content-Type": "application/json"}
     
+    return load_reference(path, columns)
+
+_predict_executor = None
+
+def get_predict_executor():
+    """Thread pool dùng chung giới hạn số request dự đoán đồng thời"""
+    global _predict_executor
+    if _predict_executor is None:
+        _predict_executor = ThreadPoolExecutor(max_workers=PREDICT_MAX_IN_FLIGHT,
+                                               thread_name_prefix="drift-predict")
+    return _predict_executor
+
+def to_feature_columns(data):
+    """Chuyển DataFrame thành dict {tên cột: mảng FP64 liên tục}
+
+    Mỗi nhóm cột cùng dtype được lấy bằng một lần to_numpy(), sau đó chuyển
+    vị để mỗi feature nằm liên tục trong bộ nhớ; các lát cắt theo chunk vì
+    vậy là view, không phải copy.
+    """
+    columns = {}
+    for dtype in data.dtypes.unique():
+        names = data.columns[data.dtypes == dtype]
+        block = np.ascontiguousarray(data[names].to_numpy(dtype=np.float64).T)
+        for i, name in enumerate(names):
+            columns[name] = block[i]
+    return {name: columns[name] for name in data.columns}
+
+def new_request_ids(count):
+    """Request ID cho từng dòng: <id của lần chạy>-<số thứ tự dòng>"""
+    run_id = uuid.uuid4().hex
+    return np.array([f"{run_id}-{i:06d}" for i in range(count)])
+
+def _predict_chunk(columns, start, end, request_id=None):
+    """Dự đoán các dòng [start, end) trong một request"""
+    chunk = {name: values[start:end] for name, values in columns.items()}
+    result = infer_batch(chunk, timeout=PREDICT_DEADLINE_SECONDS, idempotent=True, request_id=request_id)
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+    return np.asarray(result["outputs"][0]["data"], dtype=np.float64).ravel()
+
+def predict_batches(*datasets, request_ids=None):
+    """Dự đoán nhiều DataFrame cùng lúc, các chunk của mọi tập chạy song song
+
+    Args:
+        datasets: các DataFrame cần dự đoán
+        request_ids: list (mỗi tập một phần tử) mảng request ID từng dòng hoặc None.
+            V2 chỉ có một "id" cho mỗi request nên chunk được gửi với ID của dòng đầu tiên;
+            các dòng còn lại của chunk có cùng tiền tố và số thứ tự liên tiếp
+
+    Trả về list mảng NumPy (mỗi tập một mảng), NaN ở những dòng dự đoán lỗi.
+    """
+    executor = get_predict_executor()
+    request_ids = request_ids or [None] * len(datasets)
     results = []
-    
-    for _, row in data.iterrows():
-        # Chuyển đổi data thành định dạng KServe input
-        inputs = []
-        for column in data.columns:
-            inputs.append({
-                "name": column,
-                "shape": [1],
-                "datatype": "FP64",
-                "data": [float(row[column])]
-            })
-        
-        payload = {"inputs": inputs}
-        
+    futures = []
+    for data, ids in zip(datasets, request_ids):
+        columns = to_feature_columns(data)
+        predictions = np.full(len(data), np.nan)
+        results.append(predictions)
+        for start in range(0, len(data), PREDICT_CHUNK_SIZE):
+            end = min(start + PREDICT_CHUNK_SIZE, len(data))
+            request_id = None if ids is None else str(ids[start])
+            futures.append((predictions, start, end,
+                            executor.submit(_predict_chunk, columns, start, end, request_id)))
+
+    for predictions, start, end, future in futures:
         try:
-            response = requests.post(url, headers=headers, data=json.dumps(payload))
-            response_data = response.json()
-            
-            # Lấy giá trị dự đoán
-            prediction_value = response_data["outputs"][0]["data"][0]
-            results.append(prediction_value)
+            values = future.result()
+            predictions[start:start + len(values)] = values[:end - start]
         except Exception as e:
-            print(f"Lỗi khi dự đoán: {str(e)}")
-            results.append(None)
-    
+            print(f"Lỗi khi dự đoán dòng {start}-{end - 1}: {str(e)}")
     return results
 
-def calculate_psi(expected, actual, buckets=10):
-    """Tính Population Stability Index"""
-    def psi_bucket(e_perc, a_perc):
-        """PSI per bucket"""
-        if e_perc == 0:
-            e_perc = 0.0001
-        if a_perc == 0:
-            a_perc = 0.0001
-        return (e_perc - a_perc) * np.log(e_perc / a_perc)
-    
-    # Chuyển đổi thành mảng numpy
-    expected = np.array(expected)
-    actual = np.array(actual)
-    
-    # Xác định buckets trên dữ liệu expected
-    breakpoints = np.arange(0, 101, 100 / buckets)
-    breakpoints = np.percentile(expected, breakpoints)
-    
-    # Xóa các điểm trùng nhau
-    breakpoints = np.unique(breakpoints)
-    
-    # Đếm số lượng giá trị trong mỗi bucket
-    expected_counts = np.histogram(expected, bins=breakpoints)[0]
-    actual_counts = np.histogram(actual, bins=breakpoints)[0]
-    
-    # Tính phần trăm
-    expected_percents = expected_counts / len(expected)
-    actual_percents = actual_counts / len(actual)
-    
-    # Tính PSI cho mỗi bucket và tổng
-    psi_values = np.sum([psi_bucket(expected_percents[i], actual_percents[i]) 
-                          for i in range(len(expected_percents))])
-    
-    return psi_values
+def predict_batch(data):
+    """Dự đoán cho một batch dữ liệu, trả về mảng NumPy (NaN = dự đoán lỗi)"""
+    return predict_batches(data)[0]
+
+_probability_model = None
+
+def get_probability_model():
+    """Model sklearn (Pipeline nhận giá trị gốc) đang được serve, load một lần; None nếu không load được"""
+    global _probability_model
+    if _probability_model is None:
+        try:
+            _probability_model = mlflow.sklearn.load_model(PROBABILITY_MODEL_URI)
+        except Exception as e:
+            print(f"Không thể load model {PROBABILITY_MODEL_URI} để tính xác suất: {str(e)}")
+    return _probability_model
+
+def predict_probabilities(data):
+    """Xác suất churn của từng dòng, None nếu không có model"""
+    model = get_probability_model()
+    if model is None:
+        return None
+    return model.predict_proba(data)[:, 1]
+
+_performance_tracker = None
+
+def get_performance_tracker():
+    """Performance tracker dùng chung"""
+    global _performance_tracker
+    if _performance_tracker is None:
+        _performance_tracker = PerformanceTracker(PERFORMANCE_DB_PATH)
+    return _performance_tracker
+
+def save_predictions(request_ids, data, predictions, probabilities=None):
+    """Ghi CSV request_id + feature + dự đoán (và xác suất) lên MinIO, trả về key
+
+    Nhãn thật được upload vào LABELS_PREFIX với cùng request_id.
+    """
+    frame = data.reset_index(drop=True).copy()
+    frame.insert(0, "request_id", request_ids)
+    frame["prediction"] = predictions
+    if probabilities is not None:
+        frame["probability"] = probabilities
+    key = f"{PREDICTIONS_PREFIX}{datetime.now().strftime('%Y%m%dT%H%M%S')}.csv"
+    get_minio_client().put_object(Bucket=MINIO_BUCKET, Key=key,
+                                  Body=frame.to_csv(index=False).encode("utf-8"))
+    return key
+
+def track_performance(current_predictions, request_ids, current_probabilities=None, reference_positive_rate=None):
+    """Ghi dự đoán hiện tại, join nhãn mới từ MinIO và trả về metric hiệu năng rolling"""
+    tracker = get_performance_tracker()
+    tracker.log_predictions(request_ids, current_predictions, current_probabilities)
+    joined = 0
+    try:
+        joined = tracker.ingest_labels_from_s3(get_minio_client(), MINIO_BUCKET, LABELS_PREFIX)
+        if joined:
+            print(f"Đã join {joined} nhãn mới với dự đoán")
+    except Exception as e:
+        print(f"Không thể đọc nhãn từ MinIO: {str(e)}")
+
+    rolling = tracker.rolling_metrics(PERFORMANCE_ROLLING_WINDOWS)
+    metrics = {f"rolling_{key}": value for key, value in rolling.items() if value is not None}
+    if joined and "rolling_expected_calibration_error" not in metrics:
+        # Nhãn đã join nhưng dự đoán không kèm xác suất: Brier/ECE không tính được
+        print("Cảnh báo: đã join nhãn nhưng chưa có calibration (dự đoán được ghi không có xác suất)")
+    windows = tracker.window_metrics(baseline_positive_rate=reference_positive_rate)
+    if windows and windows[-1]["positive_rate_drift"] is not None:
+        metrics["window_positive_rate_drift"] = windows[-1]["positive_rate_drift"] * 100
+    return metrics
 
 def detect_data_drift():
     """Phát hiện data drift và model drift"""
     print(f"[{datetime.now()}] Bắt đầu phát hiện drift...")
     
     # Lấy dữ liệu tham chiếu
-    reference_data = get_reference_data()
+    reference_data = get_reference_data(DRIFT_FEATURES)
     
-    # Tạo dữ liệu hiện tại
+    # Tạo dữ liệu hiện tại, request ID có trước khi gửi để server và kho nhãn dùng chung
     current_data = generate_data(CURRENT_DATA_SIZE)
+    current_request_ids = new_request_ids(len(current_data))
     
-    # Thực hiện dự đoán
-    reference_predictions = predict_batch(reference_data)
-    current_predictions = predict_batch(current_data)
+    # Thực hiện dự đoán (tập tham chiếu và hiện tại chạy song song)
+    reference_predictions, current_predictions = predict_batches(
+        reference_data, current_data, request_ids=[None, current_request_ids]
+    )
     
-    # Loại bỏ các giá trị None
-    reference_predictions = [p for p in reference_predictions if p is not None]
-    current_predictions = [p for p in current_predictions if p is not None]
+    # Xác suất cho Brier/calibration (server chỉ trả về nhãn)
+    current_probabilities = predict_probabilities(current_data)
+    
+    # Loại bỏ các dòng dự đoán lỗi (NaN)
+    reference_predictions = reference_predictions[~np.isnan(reference_predictions)]
+    current_valid = ~np.isnan(current_predictions)
+    current_request_ids = current_request_ids[current_valid]
+    current_predictions = current_predictions[current_valid]
+    if current_probabilities is not None:
+        current_probabilities = current_probabilities[current_valid]
+    
+    # Công bố request ID cùng dự đoán để nhãn thật upload sau này join được
+    try:
+        key = save_predictions(current_request_ids, current_data[current_valid], current_predictions,
+                               current_probabilities)
+        print(f"Đã lưu {len(current_request_ids)} dự đoán tại s3://{MINIO_BUCKET}/{key}")
+    except Exception as e:
+        print(f"Không thể lưu dự đoán lên MinIO: {str(e)}")
     
     # Tính các metric drift
     drift_metrics = {
@@ -191,52 +318,63 @@ def detect_data_drift():
     }
     
     # Thêm thông tin về phân phối dự đoán
-    if reference_predictions and current_predictions:
-        reference_positive_rate = sum(1 for p in reference_predictions if p == 1) / len(reference_predictions)
-        current_positive_rate = sum(1 for p in current_predictions if p == 1) / len(current_predictions)
+    if len(reference_predictions) and len(current_predictions):
+        reference_positive_rate = float(np.mean(reference_predictions == 1))
+        current_positive_rate = float(np.mean(current_predictions == 1))
         
         drift_metrics.update({
             "reference_positive_rate": reference_positive_rate * 100,
             "current_positive_rate": current_positive_rate * 100,
             "positive_rate_diff": abs(reference_positive_rate - current_positive_rate) * 100,
         })
-    
-    # Phát hiện input drift cho các tính năng số
-    for column in reference_data.columns:
-        # Kolmogorov-Smirnov test
-        ks_statistic, ks_pvalue = ks_2samp(reference_data[column], current_data[column])
         
-        # Population Stability Index
-        psi_value = calculate_psi(reference_data[column], current_data[column])
-        
-        drift_detected = ks_statistic > KS_THRESHOLD or psi_value > PSI_THRESHOLD
-        
-        drift_metrics.update({
-            f"{column}_ks_statistic": ks_statistic,
-            f"{column}_ks_pvalue": ks_pvalue,
-            f"{column}_psi": psi_value,
-            f"{column}_drift_detected": 1 if drift_detected else 0,
-        })
+        # Hiệu năng theo thời gian khi nhãn thật đến muộn (join theo request ID)
+        drift_metrics.update(track_performance(current_predictions, current_request_ids,
+                                               current_probabilities, reference_positive_rate))
     
-    # Log kết quả vào MLflow
+    # Phát hiện input drift: KS + PSI phân vị cho feature liên tục,
+    # PSI theo tần suất + chi-square + JS divergence cho feature phân loại
+    feature_drift = compute_drift(
+        reference_data, current_data, load_feature_types(MODEL_SCHEMA_PATH),
+        features=reference_data.columns,
+        thresholds={"psi": PSI_THRESHOLD, "ks": KS_THRESHOLD,
+                    "js": JS_THRESHOLD, "chi2_pvalue": CHI2_PVALUE_THRESHOLD},
+        workers=DRIFT_WORKERS
+    )
+    
+    # Báo cáo JSON + HTML được dựng từ histogram đã tính, trong process riêng
+    report_dir = tempfile.mkdtemp(prefix="drift-report-")
+    report_future = submit_report(feature_drift, drift_metrics, report_dir)
+    drift_metrics.update(drift_metrics_to_flat(feature_drift))
+    
+    # Log kết quả vào MLflow: một lần ghi metric, một lần ghi param, một lần upload báo cáo
     with mlflow.start_run():
-        for key, value in drift_metrics.items():
-            mlflow.log_metric(key, value)
-        
-        # Log một số thông tin về model
-        mlflow.log_param("model_name", MODEL_NAME)
-        mlflow.log_param("endpoint", KSERVE_ENDPOINT)
-        mlflow.log_param("drift_detection_time", datetime.now().isoformat())
-        
-        # Log các ngưỡng sử dụng
-        mlflow.log_param("psi_threshold", PSI_THRESHOLD)
-        mlflow.log_param("ks_threshold", KS_THRESHOLD)
+        mlflow.log_metrics(drift_metrics)
+        mlflow.log_params({
+            "model_name": MODEL_NAME,
+            "endpoint": KSERVE_ENDPOINT,
+            "drift_detection_time": datetime.now().isoformat(),
+            # Các ngưỡng sử dụng
+            "psi_threshold": PSI_THRESHOLD,
+            "ks_threshold": KS_THRESHOLD,
+            "js_threshold": JS_THRESHOLD,
+            "chi2_pvalue_threshold": CHI2_PVALUE_THRESHOLD
+        })
+        try:
+            mlflow.log_artifacts(report_future.result(), artifact_path="drift_report")
+        except Exception as e:
+            print(f"Không thể tạo báo cáo drift: {str(e)}")
+        finally:
+            shutil.rmtree(report_dir, ignore_errors=True)
     
     # Hiển thị kết quả
     print(f"[{datetime.now()}] Đã hoàn thành phát hiện drift.")
     print(f"Tỷ lệ dự đoán dương tính (tham chiếu): {drift_metrics.get('reference_positive_rate', 'N/A'):.2f}%")
     print(f"Tỷ lệ dự đoán dương tính (hiện tại): {drift_metrics.get('current_positive_rate', 'N/A'):.2f}%")
     print(f"Chênh lệch: {drift_metrics.get('positive_rate_diff', 'N/A'):.2f}%")
+    if "rolling_accuracy" in drift_metrics:
+        print(f"Hiệu năng {PERFORMANCE_ROLLING_WINDOWS} giờ gần nhất ({drift_metrics['rolling_n_labeled']} nhãn): "
+              f"accuracy={drift_metrics['rolling_accuracy']:.4f}, F1={drift_metrics.get('rolling_f1', 0):.4f}")
     
     # Hiển thị các tính năng bị phát hiện drift
     drift_features = [col.replace("_drift_detected", "") for col, val in drift_metrics.items() 
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""Benchmark JSON và binary tensor data extension cho request V2 nhiều dòng
+
+Đo số byte của body request/response và độ trễ end-to-end (p50/p95) của
+kserve_client.infer_batch cho từng kích thước batch. Mặc định chạy với
+stand-in server local; dùng --endpoint để đo trên KServe thật.
+"""
+import sys
+import os
+import argparse
+import time
+
+import numpy as np
+
+# Add parent directory to path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils import kserve_client
+from scripts.local_v2_server import FEATURE_NAMES, start_rest_server
+
+def generate_columns(rows):
+    """Tạo dữ liệu dạng cột (FP64) cho benchmark"""
+    rng = np.random.default_rng(42)
+    low_high = {
+        "CreditScore": (300, 900), "Geography": (0, 3), "Gender": (0, 2),
+        "Age": (18, 95), "Tenure": (0, 11), "Balance": (0, 250000),
+        "NumOfProducts": (1, 5), "HasCrCard": (0, 2), "IsActiveMember": (0, 2),
+        "EstimatedSalary": (10000, 200000)
+    }
+    return {name: rng.uniform(*low_high[name], rows) for name in FEATURE_NAMES}
+
+def run_case(columns, binary_data, repeats):
+    """Chạy một cấu hình, trả về thống kê kích thước và độ trễ"""
+    latencies = []
+    result = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = kserve_client.infer_batch(columns, binary_data=binary_data)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        if not result["success"]:
+            raise RuntimeError(f"Request thất bại: {result['error']}")
+    return {
+        "request_size": result["request_size"],
+        "response_size": result["response_size"],
+        "binary_data": result["binary_data"],
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "outputs": result["outputs"][0]["data"]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON vs binary V2 transport')
+    parser.add_argument('--endpoint', type=str, help='KServe endpoint (mặc định: stand-in server local)')
+    parser.add_argument('--rows', type=str, default='1,100,1000,10000,100000', help='Các kích thước batch, phân tách bởi dấu phẩy')
+    parser.add_argument('--repeats', type=int, default=20, help='Số lần lặp cho mỗi cấu hình')
+    args = parser.parse_args()
+
+    server = None
+    if args.endpoint:
+        kserve_client.KSERVE_ENDPOINT = args.endpoint
+    else:
+        server, kserve_client.KSERVE_ENDPOINT = start_rest_server()
+    print(f"Endpoint: {kserve_client.KSERVE_ENDPOINT}")
+
+    print(f"{'rows':>8} {'mode':>7} {'req bytes':>12} {'resp bytes':>12} {'p50 ms':>9} {'p95 ms':>9}")
+    try:
+        for rows in [int(r) for r in args.rows.split(',')]:
+            columns = generate_columns(rows)
+            json_stats = run_case(columns, False, args.repeats)
+            binary_stats = run_case(columns, True, args.repeats)
+            if not np.array_equal(np.asarray(json_stats["outputs"]), np.asarray(binary_stats["outputs"])):
+                raise RuntimeError("Kết quả JSON và binary không khớp")
+
+            for mode, stats in (("json", json_stats), ("binary", binary_stats)):
+                if mode == "binary" and not stats["binary_data"]:
+                    mode = "json*"  # server không hỗ trợ, client đã fallback
+                print(f"{rows:>8} {mode:>7} {stats['request_size']:>12} {stats['response_size']:>12} "
+                      f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f}")
+            print(f"{'':>8} {'ratio':>7} {json_stats['request_size'] / binary_stats['request_size']:>11.1f}x "
+                  f"{json_stats['response_size'] / binary_stats['response_size']:>11.1f}x "
+                  f"{json_stats['p50_ms'] / binary_stats['p50_ms']:>8.1f}x")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""Benchmark khả năng mở rộng của tính drift song song (1..N process)
+
+Sinh tập tham chiếu và hiện tại lớn gồm các feature của DRIFT_FEATURES cộng thêm
+các feature liên tục tổng hợp, chạy compute_drift với số worker tăng dần, in
+thời gian/speedup và kiểm tra kết quả giống hệt chế độ tuần tự.
+"""
+import sys
+import os
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.drift_metrics import compute_drift, load_feature_types, drift_metrics_to_flat
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model_schema.json')
+
+def generate_window(rows, extra_features, shift, seed):
+    """Dữ liệu giả lập theo phân phối của bộ churn, shift dịch chuyển các feature liên tục"""
+    rng = np.random.default_rng(seed)
+    data = {
+        "CreditScore": rng.normal(650 + 10 * shift, 97, rows),
+        "Geography": rng.integers(0, 3, rows),
+        "Gender": rng.integers(0, 2, rows),
+        "Age": rng.normal(39 + 2 * shift, 10, rows),
+        "Tenure": rng.integers(0, 11, rows),
+        "Balance": rng.exponential(76000, rows),
+        "NumOfProducts": rng.integers(1, 5, rows),
+        "HasCrCard": rng.integers(0, 2, rows),
+        "IsActiveMember": rng.integers(0, 2, rows),
+        "EstimatedSalary": rng.uniform(10000, 200000, rows)
+    }
+    for i in range(extra_features):
+        data[f"Synthetic{i}"] = rng.normal(shift * 0.05 * (i % 3), 1, rows)
+    return pd.DataFrame(data)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tính drift song song')
+    parser.add_argument('--reference-rows', type=int, default=1000000, help='Số dòng tập tham chiếu')
+    parser.add_argument('--current-rows', type=int, default=500000, help='Số dòng tập hiện tại')
+    parser.add_argument('--extra-features', type=int, default=14, help='Số feature liên tục tổng hợp thêm')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1, help='Số process tối đa')
+    parser.add_argument('--repeats', type=int, default=3, help='Số lần đo mỗi cấu hình')
+    args = parser.parse_args()
+
+    feature_types = load_feature_types(SCHEMA_PATH)
+    reference = generate_window(args.reference_rows, args.extra_features, shift=0, seed=1)
+    current = generate_window(args.current_rows, args.extra_features, shift=1, seed=2)
+    print(f"Tham chiếu: {len(reference)} dòng, hiện tại: {len(current)} dòng, {reference.shape[1]} feature")
+
+    worker_counts = sorted({1, *[w for w in (2, 4, 8, 16, 32) if w < args.max_workers], args.max_workers})
+    baseline = None
+    baseline_time = None
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8}")
+    for workers in worker_counts:
+        # Lần chạy đầu làm nóng process pool
+        compute_drift(reference, current, feature_types, workers=workers)
+        timings = []
+        for _ in range(args.repeats):
+            start_time = time.perf_counter()
+            results = compute_drift(reference, current, feature_types, workers=workers)
+            timings.append(time.perf_counter() - start_time)
+        elapsed = min(timings)
+
+        metrics = drift_metrics_to_flat(results)
+        if baseline is None:
+            baseline, baseline_time = metrics, elapsed
+        elif metrics != baseline:
+            raise RuntimeError(f"Kết quả với {workers} worker khác chế độ tuần tự")
+        print(f"{workers:>8} {elapsed:>9.3f} {baseline_time / elapsed:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""Benchmark REST và gRPC (unary, streaming) cho V2 inference protocol
+
+Chạy cùng một tập request qua:
+  - rest:        kserve_client.predict_churn (mỗi request một dòng, JSON)
+  - grpc:        grpc_client.predict_churn (ModelInfer, channel dùng chung)
+  - grpc-stream: grpc_client.stream_predict (ModelStreamInfer, không chờ từng response)
+và so sánh throughput, độ trễ p50/p95 cùng kích thước request batch lớn.
+Mặc định dùng stand-in server local (REST + gRPC).
+"""
+import sys
+import os
+import argparse
+import time
+
+import numpy as np
+
+# Add parent directory to path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils import kserve_client, grpc_client
+from scripts.local_v2_server import start_rest_server, start_grpc_server
+from scripts.benchmark_binary_transport import generate_columns
+
+def summarize(name, latencies, elapsed, count):
+    """In một dòng kết quả"""
+    print(f"{name:>12} {count / elapsed:>10.1f} {np.percentile(latencies, 50):>9.2f} {np.percentile(latencies, 95):>9.2f}")
+
+def bench_requests(rows, grpc_endpoint):
+    """So sánh các cách gửi từng dòng một"""
+    print(f"{'mode':>12} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9}")
+
+    start_time = time.perf_counter()
+    latencies = [kserve_client.predict_churn(row)["response_time"] for row in rows]
+    summarize("rest", latencies, time.perf_counter() - start_time, len(rows))
+
+    start_time = time.perf_counter()
+    latencies = [grpc_client.predict_churn(row, endpoint=grpc_endpoint)["response_time"] for row in rows]
+    summarize("grpc", latencies, time.perf_counter() - start_time, len(rows))
+
+    start_time = time.perf_counter()
+    results = list(grpc_client.stream_predict(rows, endpoint=grpc_endpoint))
+    elapsed = time.perf_counter() - start_time
+    if not all(r["success"] for r in results):
+        raise RuntimeError(f"Stream thất bại: {results[-1]['error']}")
+    summarize("grpc-stream", [r["response_time"] for r in results], elapsed, len(rows))
+
+def bench_batch(batch_rows, grpc_endpoint, repeats):
+    """So sánh một request nhiều dòng qua REST (JSON/binary) và gRPC"""
+    columns = generate_columns(batch_rows)
+    print(f"\nBatch {batch_rows} dòng:")
+    print(f"{'mode':>12} {'req bytes':>12} {'p50 ms':>9}")
+    cases = [
+        ("rest-json", lambda: kserve_client.infer_batch(columns, binary_data=False)),
+        ("rest-binary", lambda: kserve_client.infer_batch(columns, binary_data=True)),
+        ("grpc", lambda: grpc_client.infer_batch(columns, endpoint=grpc_endpoint)),
+    ]
+    for name, call in cases:
+        latencies = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            result = call()
+            latencies.append((time.perf_counter() - start_time) * 1000)
+        if not result["success"]:
+            raise RuntimeError(f"{name} thất bại: {result['error']}")
+        print(f"{name:>12} {result['request_size']:>12} {np.percentile(latencies, 50):>9.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark REST vs gRPC V2 inference')
+    parser.add_argument('--endpoint', type=str, help='REST endpoint (mặc định: stand-in server local)')
+    parser.add_argument('--grpc-endpoint', type=str, help='gRPC endpoint host:port (mặc định: stand-in server local)')
+    parser.add_argument('--requests', type=int, default=2000, help='Số request một dòng')
+    parser.add_argument('--batch-rows', type=int, default=10000, help='Số dòng cho benchmark batch')
+    parser.add_argument('--repeats', type=int, default=10, help='Số lần lặp cho benchmark batch')
+    args = parser.parse_args()
+
+    servers = []
+    if args.endpoint:
+        kserve_client.KSERVE_ENDPOINT = args.endpoint
+    else:
+        rest_server, kserve_client.KSERVE_ENDPOINT = start_rest_server()
+        servers.append(lambda: rest_server.shutdown())
+    grpc_endpoint = args.grpc_endpoint
+    if not grpc_endpoint:
+        grpc_server, grpc_endpoint = start_grpc_server()
+        servers.append(lambda: grpc_server.stop(grace=None))
+    print(f"REST: {kserve_client.KSERVE_ENDPOINT}  gRPC: {grpc_endpoint}\n")
+
+    columns = generate_columns(args.requests)
+    rows = [{name: float(values[i]) for name, values in columns.items()} for i in range(args.requests)]
+    try:
+        # Làm nóng kết nối trước khi đo
+        kserve_client.predict_churn(rows[0])
+        grpc_client.predict_churn(rows[0], endpoint=grpc_endpoint)
+
+        bench_requests(rows, grpc_endpoint)
+        bench_batch(args.batch_rows, grpc_endpoint, args.repeats)
+    finally:
+        grpc_client.close_channels()
+        for stop in servers:
+            stop()
+
+if __name__ == "__main__":
+    main()
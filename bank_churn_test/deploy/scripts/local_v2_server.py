@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+"""Server V2 giả lập (stand-in) cho model bankchurn, dùng để benchmark trên máy local
+
+Server trả lời các endpoint health/metadata/infer của V2 inference protocol
+giống MLServer (REST và gRPC), chấm điểm bằng một logistic regression cố
+định (hệ số lấy từ model huấn luyện trên churn.csv). Có thể bật/tắt binary
+tensor data extension để kiểm tra đường fallback về JSON của client.
+"""
+import sys
+import os
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Add parent directory to path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config.mlflow_config import MODEL_NAME
+from utils.kserve_client import BINARY_HEADER, V2_NUMPY_DTYPES
+
+FEATURE_NAMES = [
+    "CreditScore", "Geography", "Gender", "Age", "Tenure", "Balance",
+    "NumOfProducts", "HasCrCard", "IsActiveMember", "EstimatedSalary"
+]
+
+# Thống kê StandardScaler và hệ số LogisticRegression trên churn.csv
+FEATURE_MEANS = np.array([650.5288, 0.7463, 0.5457, 38.9218, 5.0128,
+                          76485.8893, 1.5302, 0.7055, 0.5151, 100090.2399])
+FEATURE_SCALES = np.array([96.6485, 0.8275, 0.4979, 10.4873, 2.892,
+                           62394.2853, 0.5816, 0.4558, 0.4998, 57507.6172])
+COEFFICIENTS = np.array([-0.0638, 0.0704, -0.2702, 0.7627, -0.0422,
+                         0.3096, -0.0228, -0.0127, -0.5393, 0.0285])
+INTERCEPT = -1.6309
+
+def score(features):
+    """Chấm điểm ma trận (n, 10) -> nhãn INT64 shape (n, 1)"""
+    logits = ((features - FEATURE_MEANS) / FEATURE_SCALES) @ COEFFICIENTS + INTERCEPT
+    return (logits > 0).astype("<i8").reshape(-1, 1)
+
+def decode_inputs(request, body, header_length):
+    """Đọc các input của request V2 (JSON hoặc binary) thành dict {tên: mảng}"""
+    tensors = {}
+    offset = header_length
+    for item in request["inputs"]:
+        dtype = V2_NUMPY_DTYPES[item["datatype"]]
+        size = item.get("parameters", {}).get("binary_data_size")
+        if size is not None:
+            tensors[item["name"]] = np.frombuffer(body, dtype=dtype, count=size // dtype.itemsize, offset=offset)
+            offset += size
+        else:
+            tensors[item["name"]] = np.asarray(item["data"], dtype=dtype)
+    return tensors
+
+def encode_outputs(labels, binary_output, request_id=None):
+    """Tạo body response V2 (trả lại "id" của request như MLServer), trả về (body, độ dài JSON header hoặc None)"""
+    output = {
+        "name": "output-1",
+        "shape": list(labels.shape),
+        "datatype": "INT64",
+        "parameters": {"content_type": "np"}
+    }
+    result = {"model_name": MODEL_NAME, "outputs": [output]}
+    if request_id is not None:
+        result["id"] = request_id
+    if not binary_output:
+        output["data"] = labels.ravel().tolist()
+        return json.dumps(result).encode("utf-8"), None
+
+    buffer = memoryview(labels).cast("B")
+    output["parameters"]["binary_data_size"] = buffer.nbytes
+    header = json.dumps(result).encode("utf-8")
+    return header + buffer, len(header)
+
+class V2RequestHandler(BaseHTTPRequestHandler):
+    """Xử lý các endpoint V2 protocol"""
+    protocol_version = "HTTP/1.1"
+    # Header và body được ghi bằng hai lần write trên kết nối keep-alive: không tắt Nagle thì
+    # lần write thứ hai chờ delayed ACK của client (~40 ms mỗi request, bất kể kích thước)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", header_length=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if header_length is not None:
+            self.send_header(BINARY_HEADER, str(header_length))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode("utf-8"))
+
+    def do_GET(self):
+        if self.path in ("/v2/health/live", "/v2/health/ready"):
+            self._send_json(200, {"live": True, "ready": True})
+        elif self.path == f"/v2/models/{MODEL_NAME}/ready":
+            self._send_json(200, {"name": MODEL_NAME, "ready": True})
+        elif self.path == f"/v2/models/{MODEL_NAME}":
+            self._send_json(200, {
+                "name": MODEL_NAME,
+                "versions": ["1"],
+                "platform": "local-stand-in",
+                "inputs": [{"name": name, "datatype": "FP64", "shape": [-1]} for name in FEATURE_NAMES],
+                "outputs": [{"name": "output-1", "datatype": "INT64", "shape": [-1, 1]}]
+            })
+        else:
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.path != f"/v2/models/{MODEL_NAME}/infer":
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+            return
+
+        header_length = self.headers.get(BINARY_HEADER)
+        if header_length is not None and not self.server.binary_data:
+            # Mô phỏng server không hỗ trợ binary extension (ví dụ MLServer)
+            self._send_json(400, {"error": "binary tensor data extension is not supported"})
+            return
+
+        try:
+            header_length = int(header_length) if header_length is not None else len(body)
+            request = json.loads(body[:header_length])
+            tensors = decode_inputs(request, body, header_length)
+            features = np.column_stack([tensors[name] for name in FEATURE_NAMES]).astype(np.float64)
+        except Exception as e:
+            self._send_json(422, {"error": str(e)})
+            return
+
+        binary_output = self.server.binary_data and request.get("parameters", {}).get("binary_data_output", False)
+        response_body, response_header_length = encode_outputs(score(features), binary_output, request.get("id"))
+        content_type = "application/octet-stream" if response_header_length is not None else "application/json"
+        self._send(200, response_body, content_type, response_header_length)
+
+def start_rest_server(port=0, binary_data=True):
+    """Chạy REST stand-in server trong thread nền, trả về (server, endpoint)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), V2RequestHandler)
+    server.daemon_threads = True
+    server.binary_data = binary_data
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def start_grpc_server(port=0, max_workers=8):
+    """Chạy gRPC stand-in server (GRPCInferenceService), trả về (server, endpoint)"""
+    from concurrent import futures
+    import grpc
+    from utils.grpc_client import load_protos
+
+    protos, services = load_protos()
+
+    def infer(request):
+        tensors = {}
+        for i, item in enumerate(request.inputs):
+            dtype = V2_NUMPY_DTYPES[item.datatype]
+            if i < len(request.raw_input_contents):
+                tensors[item.name] = np.frombuffer(request.raw_input_contents[i], dtype=dtype)
+            else:
+                tensors[item.name] = np.asarray(item.contents.fp64_contents, dtype=dtype)
+        features = np.column_stack([tensors[name] for name in FEATURE_NAMES]).astype(np.float64)
+        labels = score(features)
+
+        response = protos.ModelInferResponse(model_name=MODEL_NAME, id=request.id)
+        response.outputs.add(name="output-1", datatype="INT64", shape=list(labels.shape))
+        response.raw_output_contents.append(labels.tobytes())
+        return response
+
+    class InferenceServicer(services.GRPCInferenceServiceServicer):
+        def ServerLive(self, request, context):
+            return protos.ServerLiveResponse(live=True)
+
+        def ServerReady(self, request, context):
+            return protos.ServerReadyResponse(ready=True)
+
+        def ModelReady(self, request, context):
+            return protos.ModelReadyResponse(ready=request.name == MODEL_NAME)
+
+        def ModelMetadata(self, request, context):
+            response = protos.ModelMetadataResponse(name=MODEL_NAME, versions=["1"], platform="local-stand-in")
+            for name in FEATURE_NAMES:
+                response.inputs.add(name=name, datatype="FP64", shape=[-1])
+            response.outputs.add(name="output-1", datatype="INT64", shape=[-1, 1])
+            return response
+
+        def ModelInfer(self, request, context):
+            return infer(request)
+
+        def ModelStreamInfer(self, request_iterator, context):
+            for request in request_iterator:
+                yield infer(request)
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    services.add_GRPCInferenceServiceServicer_to_server(InferenceServicer(), server)
+    port = server.add_insecure_port(f"127.0.0.1:{port}")
+    server.start()
+    return server, f"127.0.0.1:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Local V2 inference stand-in server')
+    parser.add_argument('--port', type=int, default=8085, help='REST port')
+    parser.add_argument('--grpc-port', type=int, default=8081, help='gRPC port (0 để tắt)')
+    parser.add_argument('--no-binary', action='store_true', help='Reject binary tensor data requests')
+    args = parser.parse_args()
+
+    server, endpoint = start_rest_server(args.port, binary_data=not args.no_binary)
+    print(f"REST stand-in server đang chạy tại {endpoint} (model: {MODEL_NAME})")
+    grpc_server = None
+    if args.grpc_port:
+        grpc_server, grpc_endpoint = start_grpc_server(args.grpc_port)
+        print(f"gRPC stand-in server đang chạy tại {grpc_endpoint}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        if grpc_server is not None:
+            grpc_server.stop(grace=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+"""Các chỉ số data drift theo loại feature
+
+- Feature liên tục: Kolmogorov-Smirnov và PSI theo bucket phân vị
+- Feature phân loại (mã số nguyên): PSI theo tần suất, chi-square và
+  Jensen-Shannon divergence; tất cả feature phân loại được đếm bằng một lần
+  np.bincount trên mã đã cộng offset, các chỉ số tính vector hóa theo đoạn
+
+Loại của từng feature lấy từ model_schema.json (khóa "feature_types").
+
+Với cửa sổ dữ liệu lớn, compute_drift(..., workers=N) chia các feature liên tục
+(KS là phần tốn CPU) cho một ProcessPoolExecutor; dữ liệu được đặt một lần
+vào multiprocessing.shared_memory, worker chỉ nhận tên vùng nhớ và chỉ số
+feature thay vì pickle mảng. Kết quả được ghép theo thứ tự feature nên giống
+hệt chế độ tuần tự.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy.stats import chi2, ks_2samp
+
+CATEGORICAL = "categorical"
+CONTINUOUS = "continuous"
+
+# Ngưỡng mặc định
+PSI_THRESHOLD = 0.2
+KS_THRESHOLD = 0.1
+JS_THRESHOLD = 0.1
+CHI2_PVALUE_THRESHOLD = 0.01
+
+PSI_BUCKETS = 10
+PROPORTION_FLOOR = 0.0001  # Tránh log(0) khi một bucket/category trống
+
+# Chế độ song song chỉ dùng khi đủ lớn để bù chi phí process/shared memory
+PARALLEL_MIN_ROWS = 50000
+
+def load_feature_types(schema_path):
+    """Đọc {feature: "categorical"|"continuous"} từ model_schema.json
+
+    Feature không có trong schema (hoặc schema cũ không có "feature_types")
+    được coi là liên tục.
+    """
+    if not os.path.exists(schema_path):
+        return {}
+    with open(schema_path) as f:
+        schema = json.load(f)
+    return schema.get("feature_types", {})
+
+def quantile_psi(expected, actual, buckets=PSI_BUCKETS):
+    """PSI theo bucket phân vị của expected, trả về (psi, edges, expected_counts, actual_counts)"""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+
+    # Xác định buckets trên dữ liệu expected, xóa các điểm trùng nhau
+    edges = np.unique(np.percentile(expected, np.arange(0, 101, 100 / buckets)))
+    if len(edges) < 2:
+        edges = np.array([edges[0], edges[0] + 1.0])
+
+    expected_counts = np.histogram(expected, bins=edges)[0]
+    actual_counts = np.histogram(actual, bins=edges)[0]
+
+    expected_percents = np.maximum(expected_counts / len(expected), PROPORTION_FLOOR)
+    actual_percents = np.maximum(actual_counts / len(actual), PROPORTION_FLOOR)
+    psi = float(np.sum((expected_percents - actual_percents) * np.log(expected_percents / actual_percents)))
+    return psi, edges, expected_counts, actual_counts
+
+def continuous_drift(reference, current):
+    """KS + PSI phân vị cho một feature liên tục"""
+    ks_statistic, ks_pvalue = ks_2samp(reference, current)
+    psi, edges, reference_counts, current_counts = quantile_psi(reference, current)
+    return {
+        "type": CONTINUOUS,
+        "ks_statistic": float(ks_statistic),
+        "ks_pvalue": float(ks_pvalue),
+        "psi": psi,
+        "edges": edges,
+        "reference_counts": reference_counts,
+        "current_counts": current_counts
+    }
+
+def _is_integer_codes(values):
+    """Mảng số chỉ gồm giá trị nguyên (mảng chuỗi/object như "France" thì không)"""
+    if not np.issubdtype(values.dtype, np.number):
+        return False
+    return np.issubdtype(values.dtype, np.integer) or bool(np.all(np.mod(values, 1) == 0))
+
+def _category_codes(reference, current):
+    """Mã hóa hai mảng về mã 0..k-1 chung, trả về (ref_codes, cur_codes, categories)"""
+    reference = np.asarray(reference)
+    current = np.asarray(current)
+    if _is_integer_codes(reference) and _is_integer_codes(current) \
+            and min(reference.min(initial=0), current.min(initial=0)) >= 0:
+        # Đã là mã số nguyên không âm (label-encoded): dùng trực tiếp
+        size = int(max(reference.max(initial=0), current.max(initial=0))) + 1
+        return reference.astype(np.int64), current.astype(np.int64), np.arange(size)
+    if not (np.issubdtype(reference.dtype, np.number) and np.issubdtype(current.dtype, np.number)):
+        # Giá trị gốc dạng chuỗi (Geography="France"); so sánh dưới dạng chuỗi để hai tập khác kiểu vẫn gộp được
+        reference = reference.astype(str)
+        current = current.astype(str)
+    categories, codes = np.unique(np.concatenate([reference, current]), return_inverse=True)
+    return codes[:len(reference)], codes[len(reference):], categories
+
+def categorical_drift(reference, current, features):
+    """PSI, chi-square và JS divergence cho nhiều feature phân loại cùng lúc
+
+    Args:
+        reference, current: DataFrame chứa các cột trong features
+        features: danh sách feature phân loại
+
+    Returns:
+        dict {feature: kết quả}
+    """
+    if not features:
+        return {}
+
+    reference_codes, current_codes, categories, offsets = [], [], [], [0]
+    for name in features:
+        ref, cur, cats = _category_codes(reference[name].to_numpy(), current[name].to_numpy())
+        reference_codes.append(ref + offsets[-1])
+        current_codes.append(cur + offsets[-1])
+        categories.append(cats)
+        offsets.append(offsets[-1] + len(cats))
+    total = offsets[-1]
+    starts = np.array(offsets[:-1])
+
+    # Một lần bincount cho tất cả feature
+    reference_counts = np.bincount(np.concatenate(reference_codes), minlength=total).astype(np.float64)
+    current_counts = np.bincount(np.concatenate(current_codes), minlength=total).astype(np.float64)
+
+    segment = np.repeat(np.arange(len(features)), np.diff(offsets))
+    n_reference = np.add.reduceat(reference_counts, starts)
+    n_current = np.add.reduceat(current_counts, starts)
+    p = reference_counts / n_reference[segment]
+    q = current_counts / n_current[segment]
+
+    # PSI theo tần suất
+    p_floor = np.maximum(p, PROPORTION_FLOOR)
+    q_floor = np.maximum(q, PROPORTION_FLOOR)
+    psi = np.add.reduceat((p_floor - q_floor) * np.log(p_floor / q_floor), starts)
+
+    # Chi-square (kiểm định đồng nhất 2 x k), bỏ qua category không xuất hiện ở cả hai tập
+    pooled = reference_counts + current_counts
+    observed_total = n_reference + n_current
+    expected_reference = pooled * (n_reference / observed_total)[segment]
+    expected_current = pooled * (n_current / observed_total)[segment]
+    present = pooled > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(present,
+                         (reference_counts - expected_reference) ** 2 / expected_reference
+                         + (current_counts - expected_current) ** 2 / expected_current,
+                         0.0)
+    chi2_statistic = np.add.reduceat(terms, starts)
+    dof = np.maximum(np.add.reduceat(present.astype(np.int64), starts) - 1, 1)
+    chi2_pvalue = chi2.sf(chi2_statistic, dof)
+
+    # Jensen-Shannon divergence (log cơ số 2, nằm trong [0, 1])
+    m = (p + q) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kl_p = np.where(p > 0, p * np.log2(p / m), 0.0)
+        kl_q = np.where(q > 0, q * np.log2(q / m), 0.0)
+    js = np.add.reduceat(0.5 * kl_p + 0.5 * kl_q, starts)
+
+    results = {}
+    for i, name in enumerate(features):
+        start, end = offsets[i], offsets[i + 1]
+        results[name] = {
+            "type": CATEGORICAL,
+            "psi": float(psi[i]),
+            "chi2_statistic": float(chi2_statistic[i]),
+            "chi2_pvalue": float(chi2_pvalue[i]),
+            "js_divergence": float(js[i]),
+            "categories": categories[i],
+            "reference_counts": reference_counts[start:end].astype(np.int64),
+            "current_counts": current_counts[start:end].astype(np.int64)
+        }
+    return results
+
+def is_drifted(result, thresholds=None):
+    """Quyết định drift cho kết quả của một feature"""
+    thresholds = {
+        "psi": PSI_THRESHOLD, "ks": KS_THRESHOLD,
+        "js": JS_THRESHOLD, "chi2_pvalue": CHI2_PVALUE_THRESHOLD,
+        **(thresholds or {})
+    }
+    if result["type"] == CATEGORICAL:
+        return (result["psi"] > thresholds["psi"]
+                or result["js_divergence"] > thresholds["js"]
+                or result["chi2_pvalue"] < thresholds["chi2_pvalue"])
+    return result["ks_statistic"] > thresholds["ks"] or result["psi"] > thresholds["psi"]
+
+def _attach_shared(name):
+    """Mở vùng shared memory do tiến trình cha tạo (chỉ tiến trình cha unlink)"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: worker dùng chung resource tracker với tiến trình cha,
+        # việc đăng ký lại tên vùng nhớ là idempotent
+        return shared_memory.SharedMemory(name=name)
+
+def _continuous_shard(reference_spec, current_spec, indices):
+    """Worker: tính drift cho các feature liên tục tại indices của ma trận dùng chung
+
+    Mỗi spec là (tên shared memory, shape); ma trận float64 dạng (feature, dòng).
+    """
+    results = {}
+    handles = []
+    try:
+        arrays = []
+        for name, shape in (reference_spec, current_spec):
+            shm = _attach_shared(name)
+            handles.append(shm)
+            arrays.append(np.ndarray(shape, dtype=np.float64, buffer=shm.buf))
+        reference, current = arrays
+        for i in indices:
+            results[i] = continuous_drift(reference[i], current[i])
+        del arrays, reference, current
+    finally:
+        for shm in handles:
+            shm.close()
+    return results
+
+def _to_shared(data, names):
+    """Chép các cột vào shared memory dạng (feature, dòng), trả về (shm, spec)"""
+    shape = (len(names), len(data))
+    shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * 8, 1))
+    matrix = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    for i, name in enumerate(names):
+        matrix[i] = data[name].to_numpy(dtype=np.float64)
+    del matrix
+    return shm, (shm.name, shape)
+
+_drift_executor = None
+_drift_executor_workers = 0
+
+def get_drift_executor(workers):
+    """Process pool dùng chung cho tính drift song song"""
+    global _drift_executor, _drift_executor_workers
+    if _drift_executor is None or _drift_executor_workers != workers:
+        if _drift_executor is not None:
+            _drift_executor.shutdown()
+        _drift_executor = ProcessPoolExecutor(max_workers=workers)
+        _drift_executor_workers = workers
+    return _drift_executor
+
+def _continuous_drift_parallel(reference, current, names, workers):
+    """Chia các feature liên tục cho worker qua shared memory, trả về {feature: kết quả}"""
+    reference_shm, reference_spec = _to_shared(reference, names)
+    try:
+        current_shm, current_spec = _to_shared(current, names)
+        try:
+            executor = get_drift_executor(workers)
+            # Chia xen kẽ để các shard có số feature gần bằng nhau
+            shards = [list(range(len(names)))[k::workers] for k in range(workers)]
+            futures = [executor.submit(_continuous_shard, reference_spec, current_spec, shard)
+                       for shard in shards if shard]
+            merged = {}
+            for future in futures:
+                merged.update(future.result())
+        finally:
+            current_shm.close()
+            current_shm.unlink()
+    finally:
+        reference_shm.close()
+        reference_shm.unlink()
+    return {names[i]: merged[i] for i in range(len(names))}
+
+def compute_drift(reference, current, feature_types, features=None, thresholds=None, workers=1):
+    """Tính drift cho mọi feature theo loại của nó
+
+    Args:
+        workers: số process cho feature liên tục; 1 (hoặc dữ liệu nhỏ hơn
+            PARALLEL_MIN_ROWS) thì tính tuần tự trong tiến trình hiện tại
+
+    Returns:
+        dict {feature: kết quả}, mỗi kết quả có thêm "drift_detected"
+    """
+    features = list(features if features is not None else reference.columns)
+    categorical = [f for f in features if feature_types.get(f) == CATEGORICAL]
+    continuous = [f for f in features if feature_types.get(f) != CATEGORICAL]
+
+    parallel = (workers > 1 and len(continuous) > 1
+                and max(len(reference), len(current)) >= PARALLEL_MIN_ROWS)
+    if parallel:
+        results = _continuous_drift_parallel(reference, current, continuous, min(workers, len(continuous)))
+    else:
+        results = {name: continuous_drift(reference[name].to_numpy(), current[name].to_numpy())
+                   for name in continuous}
+    results.update(categorical_drift(reference, current, categorical))
+
+    ordered = {}
+    for name in features:
+        result = results[name]
+        result["drift_detected"] = bool(is_drifted(result, thresholds))
+        ordered[name] = result
+    return ordered
+
+def drift_metrics_to_flat(results):
+    """Chuyển kết quả drift thành dict metric phẳng để log vào MLflow"""
+    metrics = {}
+    for name, result in results.items():
+        metrics[f"{name}_psi"] = result["psi"]
+        if result["type"] == CATEGORICAL:
+            metrics[f"{name}_chi2_statistic"] = result["chi2_statistic"]
+            metrics[f"{name}_chi2_pvalue"] = result["chi2_pvalue"]
+            metrics[f"{name}_js_divergence"] = result["js_divergence"]
+        else:
+            metrics[f"{name}_ks_statistic"] = result["ks_statistic"]
+            metrics[f"{name}_ks_pvalue"] = result["ks_pvalue"]
+        metrics[f"{name}_drift_detected"] = 1 if result["drift_detected"] else 0
+    return metrics
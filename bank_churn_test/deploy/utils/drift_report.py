@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""Báo cáo drift: JSON + trang HTML tĩnh với histogram chồng nhau cho từng feature
+
+Báo cáo được dựng từ các histogram compute_drift đã tính sẵn (không đọc lại
+dữ liệu) và được ghi trong một process riêng để không chặn lần chạy drift.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from html import escape
+
+import numpy as np
+
+REPORT_JSON = "drift_report.json"
+REPORT_HTML = "drift_report.html"
+
+CHART_WIDTH = 360
+CHART_HEIGHT = 140
+REFERENCE_COLOR = "#1f77b4"
+CURRENT_COLOR = "#ff7f0e"
+
+def build_report(results, summary):
+    """Gom kết quả compute_drift và metric tổng thành dict JSON được
+
+    Args:
+        results: dict {feature: kết quả} từ compute_drift
+        summary: metric tổng của lần chạy (tỷ lệ dương tính, kích thước dữ liệu, ...)
+    """
+    features = {}
+    for name, result in results.items():
+        entry = {
+            key: (value.tolist() if isinstance(value, np.ndarray) else value)
+            for key, value in result.items()
+        }
+        if "categories" in entry:
+            entry["bins"] = [str(c) for c in entry.pop("categories")]
+        else:
+            edges = entry.pop("edges")
+            entry["bins"] = [f"{lo:.4g}–{hi:.4g}" for lo, hi in zip(edges[:-1], edges[1:])]
+        features[name] = entry
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "summary": {key: float(value) for key, value in summary.items()},
+        "drifted_features": [name for name, result in results.items() if result["drift_detected"]],
+        "features": features
+    }
+
+def _svg_histogram(bins, reference_counts, current_counts):
+    """SVG cột chồng: tỷ lệ từng bin của tập tham chiếu và tập hiện tại"""
+    reference = np.asarray(reference_counts, dtype=np.float64)
+    current = np.asarray(current_counts, dtype=np.float64)
+    reference = reference / max(reference.sum(), 1)
+    current = current / max(current.sum(), 1)
+    peak = max(reference.max(initial=0), current.max(initial=0)) or 1.0
+
+    plot_height = CHART_HEIGHT - 20
+    width = CHART_WIDTH / max(len(bins), 1)
+    parts = [f'<svg width="{CHART_WIDTH}" height="{CHART_HEIGHT}" xmlns="http://www.w3.org/2000/svg">']
+    for i, label in enumerate(bins):
+        x = i * width
+        for values, color, offset in ((reference, REFERENCE_COLOR, 0.1), (current, CURRENT_COLOR, 0.3)):
+            height = values[i] / peak * plot_height
+            parts.append(
+                f'<rect x="{x + width * offset:.1f}" y="{plot_height - height:.1f}" width="{width * 0.6:.1f}" '
+                f'height="{height:.1f}" fill="{color}" fill-opacity="0.55"><title>{escape(label)}: '
+                f'{values[i]:.1%}</title></rect>'
+            )
+        if len(bins) <= 12:
+            parts.append(f'<text x="{x + width / 2:.1f}" y="{CHART_HEIGHT - 5}" font-size="9" '
+                         f'text-anchor="middle">{escape(label)}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+def render_html(report):
+    """Trang HTML tĩnh (không cần JS/thư viện ngoài)"""
+    rows = []
+    for name, feature in report["features"].items():
+        if feature["type"] == "categorical":
+            stats = (f"PSI {feature['psi']:.4f} · χ² p {feature['chi2_pvalue']:.3g} · "
+                     f"JS {feature['js_divergence']:.4f}")
+        else:
+            stats = f"PSI {feature['psi']:.4f} · KS {feature['ks_statistic']:.4f} (p {feature['ks_pvalue']:.3g})"
+        status = "drift" if feature["drift_detected"] else "ok"
+        rows.append(
+            f'<div class="card {status}"><h3>{escape(name)} <small>{feature["type"]} · {status}</small></h3>'
+            f'<p>{stats}</p>{_svg_histogram(feature["bins"], feature["reference_counts"], feature["current_counts"])}</div>'
+        )
+    summary = "".join(f"<tr><td>{escape(k)}</td><td>{v:.4g}</td></tr>" for k, v in report["summary"].items())
+    drifted = ", ".join(report["drifted_features"]) or "không có"
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Drift report {report['generated_at']}</title>
+<style>
+body {{ font-family: sans-serif; margin: 20px; }}
+.grid {{ display: flex; flex-wrap: wrap; gap: 12px; }}
+.card {{ border: 1px solid #ccc; border-radius: 4px; padding: 8px; }}
+.card.drift {{ border-color: #d62728; }}
+.card h3 {{ margin: 0 0 4px; font-size: 15px; }}
+.card p {{ margin: 0 0 6px; font-size: 12px; }}
+table {{ border-collapse: collapse; margin-bottom: 12px; }}
+td {{ padding: 2px 8px; font-size: 13px; }}
+</style></head><body>
+<h1>Drift report</h1>
+<p>{report['generated_at']} · Feature bị drift: {escape(drifted)}</p>
+<p><span style="color:{REFERENCE_COLOR}">■ tham chiếu</span> <span style="color:{CURRENT_COLOR}">■ hiện tại</span></p>
+<table>{summary}</table>
+<div class="grid">{''.join(rows)}</div>
+</body></html>
+"""
+
+def write_report(report, output_dir):
+    """Ghi drift_report.json và drift_report.html vào output_dir, trả về output_dir"""
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, REPORT_JSON), "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    with open(os.path.join(output_dir, REPORT_HTML), "w", encoding="utf-8") as f:
+        f.write(render_html(report))
+    return output_dir
+
+_report_executor = None
+
+def submit_report(results, summary, output_dir):
+    """Dựng và ghi báo cáo trong process riêng, trả về Future (kết quả là output_dir)"""
+    global _report_executor
+    if _report_executor is None:
+        _report_executor = ProcessPoolExecutor(max_workers=1)
+    return _report_executor.submit(write_report, build_report(results, summary), output_dir)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""Client gRPC cho Open Inference Protocol (V2) của KServe/MLServer
+
+Cùng API kết quả với utils.kserve_client (REST) để có thể chọn giao thức
+bằng cấu hình KSERVE_PROTOCOL. Stub protobuf được nạp trực tiếp từ
+utils/proto/grpc_predict_v2.proto lúc chạy (cần grpcio-tools).
+"""
+import time
+import sys
+import os
+import threading
+import uuid
+import numpy as np
+import grpc
+
+# Add parent directory to path so we can import config
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config.mlflow_config import KSERVE_GRPC_ENDPOINT, MODEL_NAME
+from utils.kserve_client import V2_NUMPY_DTYPES
+
+PROTO_PATH = "utils/proto/grpc_predict_v2.proto"
+
+# Channel giữ kết nối HTTP/2 lâu dài, tránh handshake lại cho mỗi request
+CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.max_send_message_length", 64 * 1024 * 1024),
+    ("grpc.max_receive_message_length", 64 * 1024 * 1024),
+]
+
+_protos = None
+_services = None
+_channels = {}
+_lock = threading.Lock()
+
+def load_protos():
+    """Nạp (một lần) các message và service sinh từ file .proto"""
+    global _protos, _services
+    if _protos is None:
+        with _lock:
+            if _protos is None:
+                _protos, _services = grpc.protos_and_services(PROTO_PATH)
+    return _protos, _services
+
+def get_stub(endpoint=None):
+    """Lấy stub dùng chung cho endpoint, channel được tạo một lần và tái sử dụng"""
+    endpoint = endpoint or KSERVE_GRPC_ENDPOINT
+    _, services = load_protos()
+    with _lock:
+        if endpoint not in _channels:
+            channel = grpc.insecure_channel(endpoint, options=CHANNEL_OPTIONS)
+            _channels[endpoint] = (channel, services.GRPCInferenceServiceStub(channel))
+        return _channels[endpoint][1]
+
+def close_channels():
+    """Đóng tất cả channel đang mở"""
+    with _lock:
+        for channel, _ in _channels.values():
+            channel.close()
+        _channels.clear()
+
+def _columns_to_tensors(columns, datatype="FP64"):
+    """Chuyển DataFrame, dict {tên: mảng} hoặc dict một dòng thành dict tensor 1 chiều"""
+    if hasattr(columns, "columns") and hasattr(columns, "to_numpy"):
+        columns = {name: columns[name].to_numpy() for name in columns.columns}
+    dtype = V2_NUMPY_DTYPES[datatype]
+    return {name: np.ascontiguousarray(np.atleast_1d(values), dtype=dtype) for name, values in columns.items()}
+
+def build_infer_request(tensors, datatype="FP64", request_id=None):
+    """Tạo ModelInferRequest với dữ liệu tensor trong raw_input_contents"""
+    protos, _ = load_protos()
+    request = protos.ModelInferRequest(model_name=MODEL_NAME, id=request_id or str(uuid.uuid4()))
+    for name, array in tensors.items():
+        request.inputs.add(name=name, datatype=datatype, shape=list(array.shape))
+        request.raw_input_contents.append(array.tobytes())
+    return request
+
+def parse_infer_response(response):
+    """Đọc ModelInferResponse thành dict kiểu V2 với output là mảng NumPy"""
+    outputs = []
+    for i, output in enumerate(response.outputs):
+        dtype = V2_NUMPY_DTYPES.get(output.datatype)
+        if i < len(response.raw_output_contents):
+            data = np.frombuffer(response.raw_output_contents[i], dtype=dtype)
+        else:
+            contents = output.contents
+            values = (contents.fp64_contents or contents.fp32_contents or contents.int64_contents
+                      or contents.int_contents or contents.bool_contents or contents.uint64_contents
+                      or contents.uint_contents)
+            data = np.asarray(values, dtype=dtype)
+        outputs.append({
+            "name": output.name,
+            "shape": list(output.shape),
+            "datatype": output.datatype,
+            "data": data.reshape(list(output.shape))
+        })
+    return {
+        "model_name": response.model_name,
+        "model_version": response.model_version,
+        "id": response.id,
+        "outputs": outputs
+    }
+
+def _error_result(e, start_time):
+    """Kết quả lỗi cùng định dạng với kserve_client"""
+    code = e.code() if isinstance(e, grpc.RpcError) else None
+    return {
+        "error": e.details() if isinstance(e, grpc.RpcError) else str(e),
+        "grpc_code": code.name if code is not None else None,
+        "response_time": (time.time() - start_time) * 1000,
+        "status_code": 503 if code == grpc.StatusCode.UNAVAILABLE else 500,
+        "success": False
+    }
+
+def infer_batch(columns, datatype="FP64", timeout=30, endpoint=None, request_id=None):
+    """Dự đoán nhiều dòng bằng ModelInfer (unary), kết quả giống kserve_client.infer_batch"""
+    start_time = time.time()
+    try:
+        request = build_infer_request(_columns_to_tensors(columns, datatype), datatype, request_id)
+        response = get_stub(endpoint).ModelInfer(request, timeout=timeout)
+        result = parse_infer_response(response)
+        result["response_time"] = (time.time() - start_time) * 1000  # Convert to ms
+        result["request_size"] = request.ByteSize()
+        result["response_size"] = response.ByteSize()
+        result["status_code"] = 200
+        result["error"] = None
+        result["success"] = True
+        return result
+    except Exception as e:
+        return _error_result(e, start_time)
+
+def predict_churn(data, timeout=5, endpoint=None):
+    """Dự đoán churn cho một dòng qua gRPC, trả về dict giống kserve_client.predict_churn"""
+    result = infer_batch(data, timeout=timeout, endpoint=endpoint)
+    if result["success"]:
+        for output in result["outputs"]:
+            output["data"] = output["data"].ravel().tolist()
+    return result
+
+def stream_predict(rows, datatype="FP64", timeout=None, endpoint=None):
+    """Dự đoán liên tục qua ModelStreamInfer (bidirectional streaming)
+
+    Các request được gửi ngay khi stream sẵn sàng, không chờ response trước
+    đó, nên phù hợp cho probing tần suất cao. Mỗi phần tử của rows là một
+    dict một dòng hoặc một batch dạng cột; yield kết quả theo thứ tự nhận.
+    """
+    sent_at = {}
+
+    def request_iterator():
+        for row in rows:
+            request = build_infer_request(_columns_to_tensors(row, datatype), datatype)
+            sent_at[request.id] = (time.time(), request.ByteSize())
+            yield request
+
+    start_time = time.time()
+    try:
+        for response in get_stub(endpoint).ModelStreamInfer(request_iterator(), timeout=timeout):
+            send_time, request_size = sent_at.pop(response.id, (start_time, 0))
+            result = parse_infer_response(response)
+            result["response_time"] = (time.time() - send_time) * 1000
+            result["request_size"] = request_size
+            result["response_size"] = response.ByteSize()
+            result["status_code"] = 200
+            result["error"] = None
+            result["success"] = True
+            yield result
+    except Exception as e:
+        yield _error_result(e, start_time)
+
+def check_model_health(timeout=5, endpoint=None):
+    """Kiểm tra model sẵn sàng qua ModelReady"""
+    protos, _ = load_protos()
+    start_time = time.time()
+    try:
+        response = get_stub(endpoint).ModelReady(protos.ModelReadyRequest(name=MODEL_NAME), timeout=timeout)
+        return {
+            "status_code": 200 if response.ready else 503,
+            "response_time": (time.time() - start_time) * 1000,
+            "is_healthy": response.ready,
+            "timestamp": time.time()
+        }
+    except Exception as e:
+        result = _error_result(e, start_time)
+        result.update({"response_time": None, "is_healthy": False, "timestamp": time.time()})
+        return result
+
+def check_server_live(timeout=5, endpoint=None):
+    """Kiểm tra liveness của server qua ServerLive"""
+    protos, _ = load_protos()
+    start_time = time.time()
+    try:
+        response = get_stub(endpoint).ServerLive(protos.ServerLiveRequest(), timeout=timeout)
+        return {
+            "status_code": 200 if response.live else 503,
+            "response_time": (time.time() - start_time) * 1000,
+            "is_healthy": response.live,
+            "timestamp": time.time()
+        }
+    except Exception as e:
+        result = _error_result(e, start_time)
+        result.update({"response_time": None, "is_healthy": False, "timestamp": time.time()})
+        return result
+
+def get_model_metadata(timeout=5, endpoint=None):
+    """Lấy metadata của model qua ModelMetadata, trả về (metadata, thời gian ms)"""
+    protos, _ = load_protos()
+    start_time = time.time()
+    response = get_stub(endpoint).ModelMetadata(protos.ModelMetadataRequest(name=MODEL_NAME), timeout=timeout)
+    response_time = (time.time() - start_time) * 1000
+
+    def tensor(t):
+        return {"name": t.name, "datatype": t.datatype, "shape": list(t.shape)}
+
+    return {
+        "name": response.name,
+        "versions": list(response.versions),
+        "platform": response.platform,
+        "inputs": [tensor(t) for t in response.inputs],
+        "outputs": [tensor(t) for t in response.outputs]
+    }, response_time
@@ -1,24 +1,69 @@
 #!/usr/bin/env python
-import requests
 import json
 import time
 import sys
 import os
+import numpy as np
 
 # Add parent directory to path so we can import config
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config.mlflow_config import KSERVE_ENDPOINT, MODEL_NAME
+from config.mlflow_config import KSERVE_ENDPOINT, MODEL_NAME, KSERVE_BINARY_DATA, KSERVE_PROTOCOL
+from utils import http_transport
+from utils.http_transport import CircuitOpenError, DeadlineExceededError
+
+# Header của binary tensor data extension (V2): độ dài phần JSON đứng đầu body
+BINARY_HEADER = "Inference-Header-Content-Length"
+
+# Kiểu dữ liệu V2 -> dtype little-endian của NumPy
+V2_NUMPY_DTYPES = {
+    "BOOL": np.dtype("|b1"),
+    "UINT8": np.dtype("|u1"),
+    "INT8": np.dtype("|i1"),
+    "INT16": np.dtype("<i2"),
+    "INT32": np.dtype("<i4"),
+    "INT64": np.dtype("<i8"),
+    "FP16": np.dtype("<f2"),
+    "FP32": np.dtype("<f4"),
+    "FP64": np.dtype("<f8"),
+}
+
+# Server có hỗ trợ binary data không: None = chưa biết, True/False khi server trả lời rõ ràng
+_binary_data_supported = None
+# Status code khi server không hiểu request binary; 500 chỉ tính khi body nhắc tới binary extension
+BINARY_REJECT_STATUS = (400, 415, 422, 501)
+
+def _binary_rejected(response):
+    """Server có từ chối binary tensor data extension không (lỗi 5xx tạm thời không tính)"""
+    if response.status_code in BINARY_REJECT_STATUS:
+        return True
+    return response.status_code == 500 and "binary" in response.text.lower()
+
+def _error_status(e):
+    """Status code tương ứng với lỗi phía client"""
+    if isinstance(e, CircuitOpenError):
+        return 503
+    if isinstance(e, DeadlineExceededError):
+        return 504
+    return 500
 
 def get_model_metadata():
     """Lấy metadata của model từ KServe"""
+    if KSERVE_PROTOCOL == "grpc":
+        from utils import grpc_client
+        return grpc_client.get_model_metadata()
+
     url = f"{KSERVE_ENDPOINT}/v2/models/{MODEL_NAME}"
     start_time = time.time()
-    response = requests.get(url)
+    response = http_transport.request("GET", url, deadline=5)
     response_time = (time.time() - start_time) * 1000  # Convert to ms
     return response.json(), response_time
 
 def predict_churn(data):
     """Dự đoán churn với KServe API"""
+    if KSERVE_PROTOCOL == "grpc":
+        from utils import grpc_client
+        return grpc_client.predict_churn(data)
+
     url = f"{KSERVE_ENDPOINT}/v2/models/{MODEL_NAME}/infer"
     headers = {"Content-Type": "application/json"}
     
@@ -36,7 +81,7 @@ def predict_churn(data):
     
     start_time = time.time()
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=5)
+        response = http_transport.request("POST", url, deadline=5, headers=headers, data=json.dumps(payload))
         response_time = (time.time() - start_time) * 1000  # Convert to ms
         
         result = response.json()
@@ -53,33 +98,58 @@ def predict_churn(data):
         return {
             "error": str(e),
             "response_time": response_time,
-            "status_code": 500,
+            "status_code": _error_status(e),
             "success": False
         }
 
-def check_model_health():
-    """Kiểm tra model có hoạt động không"""
-    url = f"{KSERVE_ENDPOINT}/v2/models/{MODEL_NAME}"
+def _probe(url):
+    """Gọi GET một endpoint health/metadata, trả về kết quả chuẩn hóa"""
     try:
         start_time = time.time()
-        response = requests.get(url, timeout=5)
+        response = http_transport.request("GET", url, deadline=5)
         response_time = (time.time() - start_time) * 1000  # Convert to ms
         
         return {
             "status_code": response.status_code,
             "response_time": response_time,
             "is_healthy": response.status_code == 200,
+            "circuit_state": http_transport.get_breaker(url).snapshot()["state"],
             "timestamp": time.time()
         }
     except Exception as e:
         return {
-            "status_code": 500,
+            "status_code": _error_status(e),
             "response_time": None,
             "is_healthy": False,
             "error": str(e),
+            "circuit_state": http_transport.get_breaker(url).snapshot()["state"],
             "timestamp": time.time()
         }
 
+def check_model_health():
+    """Kiểm tra model có hoạt động không"""
+    if KSERVE_PROTOCOL == "grpc":
+        from utils import grpc_client
+        return grpc_client.check_model_health()
+
+    return _probe(f"{KSERVE_ENDPOINT}/v2/models/{MODEL_NAME}")
+
+def check_server_live():
+    """Kiểm tra liveness của server (V2: /v2/health/live)"""
+    if KSERVE_PROTOCOL == "grpc":
+        from utils import grpc_client
+        return grpc_client.check_server_live()
+
+    return _probe(f"{KSERVE_ENDPOINT}/v2/health/live")
+
+def check_model_ready():
+    """Kiểm tra readiness của model (V2: /v2/models/{name}/ready)"""
+    if KSERVE_PROTOCOL == "grpc":
+        from utils import grpc_client
+        return grpc_client.check_model_health()
+
+    return _probe(f"{KSERVE_ENDPOINT}/v2/models/{MODEL_NAME}/ready")
+
 def generate_test_data(count=10):
     """Tạo dữ liệu test ngẫu nhiên"""
     import numpy as np
@@ -100,4 +170,177 @@ def generate_test_data(count=10):
         }
         test_data.append(data)
     
-    return test_data 
\ No newline at end of file
+    return test_data
+
+class _BinaryBody:
+    """Body của request binary: JSON header + các buffer tensor, gửi không copy
+
+    requests/urllib3 lấy Content-Length từ __len__ và gửi lần lượt từng
+    memoryview, nên buffer của NumPy không bị nối lại thành một bytes mới.
+    """
+
+    def __init__(self, header, buffers):
+        self.parts = [header] + buffers
+        self.size = sum(part.nbytes if isinstance(part, memoryview) else len(part)
+                        for part in self.parts)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(self.parts)
+
+def _as_tensor(values, datatype="FP64"):
+    """Chuyển giá trị thành mảng NumPy little-endian liên tục (không copy nếu đã đúng dtype)"""
+    return np.ascontiguousarray(values, dtype=V2_NUMPY_DTYPES[datatype])
+
+def _columns_to_tensors(columns, datatype="FP64"):
+    """Chuyển DataFrame hoặc dict {tên: mảng} thành dict {tên: tensor 1 chiều}"""
+    if hasattr(columns, "columns") and hasattr(columns, "to_numpy"):
+        columns = {name: columns[name].to_numpy() for name in columns.columns}
+    return {name: _as_tensor(values, datatype) for name, values in columns.items()}
+
+def build_json_request(tensors, datatype="FP64", request_id=None):
+    """Tạo body JSON của V2 protocol từ các tensor (request_id -> trường "id" của request)"""
+    inputs = []
+    for name, array in tensors.items():
+        inputs.append({
+            "name": name,
+            "shape": list(array.shape),
+            "datatype": datatype,
+            "data": array.tolist()
+        })
+    payload = {"inputs": inputs}
+    if request_id is not None:
+        payload["id"] = request_id
+    return json.dumps(payload).encode("utf-8")
+
+def build_binary_request(tensors, datatype="FP64", request_id=None):
+    """Tạo body binary (JSON header + raw buffers) theo binary tensor data extension
+
+    Trả về (body, độ dài JSON header). Dữ liệu tensor được tham chiếu qua
+    memoryview của chính mảng NumPy, không sao chép.
+    """
+    inputs = []
+    buffers = []
+    for name, array in tensors.items():
+        buffer = memoryview(array).cast("B")
+        inputs.append({
+            "name": name,
+            "shape": list(array.shape),
+            "datatype": datatype,
+            "parameters": {"binary_data_size": buffer.nbytes}
+        })
+        buffers.append(buffer)
+
+    payload = {
+        "inputs": inputs,
+        "parameters": {"binary_data_output": True}
+    }
+    if request_id is not None:
+        payload["id"] = request_id
+    header = json.dumps(payload).encode("utf-8")
+    return _BinaryBody(header, buffers), len(header)
+
+def parse_infer_response(content, header_length=None):
+    """Đọc response V2 (JSON hoặc binary), trả về dict với output là mảng NumPy
+
+    Output dạng binary được đọc bằng np.frombuffer nên là view (read-only)
+    trên chính buffer của response.
+    """
+    if header_length is None:
+        result = json.loads(content)
+        for output in result.get("outputs", []):
+            dtype = V2_NUMPY_DTYPES.get(output.get("datatype"))
+            output["data"] = np.asarray(output.get("data", []), dtype=dtype).reshape(output["shape"])
+        return result
+
+    result = json.loads(content[:header_length])
+    offset = header_length
+    for output in result.get("outputs", []):
+        size = output.get("parameters", {}).get("binary_data_size")
+        dtype = V2_NUMPY_DTYPES.get(output.get("datatype"))
+        if size is None or dtype is None:
+            output["data"] = np.asarray(output.get("data", []), dtype=dtype).reshape(output["shape"])
+            offset += size or 0
+            continue
+        output["data"] = np.frombuffer(
+            content, dtype=dtype, count=size // dtype.itemsize, offset=offset
+        ).reshape(output["shape"])
+        offset += size
+    return result
+
+def infer_batch(columns, binary_data=None, datatype="FP64", timeout=30, idempotent=False, request_id=None):
+    """Dự đoán nhiều dòng trong một request, mỗi feature là một tensor shape [n]
+
+    Args:
+        columns: DataFrame hoặc dict {tên feature: mảng giá trị}
+        binary_data: True/False để ép kiểu truyền, None để tự chọn
+            (dùng binary nếu server chưa từng từ chối, ngược lại dùng JSON)
+        datatype: kiểu dữ liệu V2 của các input
+        timeout: deadline (giây) cho toàn bộ lời gọi, kể cả retry
+        idempotent: cho phép retry khi lỗi kết nối/5xx tạm thời (inference không có side effect)
+        request_id: id của request V2 (server ghi lại và trả về trong response)
+
+    Returns:
+        dict giống predict_churn, trong đó outputs[i]["data"] là mảng NumPy
+    """
+    global _binary_data_supported
+
+    if KSERVE_PROTOCOL == "grpc":
+        from utils import grpc_client
+        return grpc_client.infer_batch(columns, datatype=datatype, timeout=timeout, request_id=request_id)
+
+    url = f"{KSERVE_ENDPOINT}/v2/models/{MODEL_NAME}/infer"
+    tensors = _columns_to_tensors(columns, datatype)
+
+    if binary_data is None:
+        binary_data = KSERVE_BINARY_DATA and _binary_data_supported is not False
+
+    start_time = time.time()
+    try:
+        if binary_data:
+            body, header_length = build_binary_request(tensors, datatype, request_id)
+            headers = {
+                "Content-Type": "application/octet-stream",
+                BINARY_HEADER: str(header_length)
+            }
+            response = http_transport.request("POST", url, deadline=timeout, idempotent=idempotent,
+                                              headers=headers, data=body)
+
+            # Server không hiểu binary extension -> ghi nhớ và quay về JSON
+            if _binary_data_supported is not True and _binary_rejected(response):
+                _binary_data_supported = False
+                return infer_batch(tensors, binary_data=False, datatype=datatype, timeout=timeout,
+                                   idempotent=idempotent, request_id=request_id)
+            # Chỉ ghi nhớ là hỗ trợ khi request binary thật sự thành công
+            if response.status_code == 200:
+                _binary_data_supported = True
+        else:
+            body = build_json_request(tensors, datatype, request_id)
+            headers = {"Content-Type": "application/json"}
+            response = http_transport.request("POST", url, deadline=timeout, idempotent=idempotent,
+                                              headers=headers, data=body)
+
+        response_header_length = response.headers.get(BINARY_HEADER)
+        result = parse_infer_response(
+            response.content,
+            int(response_header_length) if response_header_length is not None else None
+        )
+        result["response_time"] = (time.time() - start_time) * 1000  # Convert to ms
+        result["request_size"] = len(body)
+        result["response_size"] = len(response.content)
+        result["status_code"] = response.status_code
+        result["binary_data"] = bool(binary_data)
+        result["error"] = None if response.status_code == 200 else result.get("error", response.reason)
+        result["success"] = response.status_code == 200
+        return result
+    except Exception as e:
+        response_time = (time.time() - start_time) * 1000
+        return {
+            "error": str(e),
+            "response_time": response_time,
+            "status_code": _error_status(e),
+            "binary_data": bool(binary_data),
+            "success": False
+        }
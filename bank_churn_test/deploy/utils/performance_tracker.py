@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+"""Theo dõi hiệu năng model khi nhãn thật đến muộn
+
+- Dự đoán được ghi vào SQLite với khóa request_id (primary key); nhãn đến sau
+  được join theo request_id qua index, nhãn đến trước dự đoán được giữ chờ
+- Mỗi cửa sổ thời gian (WINDOW_SECONDS) có một dòng tổng hợp: số dự đoán,
+  confusion matrix, tổng xác suất/Brier và các bin calibration. Các tổng này
+  được cộng dồn khi có dữ liệu mới nên accuracy, F1, calibration và
+  positive-rate drift theo cửa sổ tính được mà không quét lại lịch sử
+"""
+import os
+import sqlite3
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+WINDOW_SECONDS = 3600
+CALIBRATION_BINS = 10
+DEFAULT_DB_PATH = os.environ.get("PERFORMANCE_DB_PATH", "performance.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    request_id TEXT PRIMARY KEY,
+    window_start INTEGER NOT NULL,
+    prediction INTEGER NOT NULL,
+    probability REAL,
+    label INTEGER
+);
+CREATE TABLE IF NOT EXISTS pending_labels (
+    request_id TEXT PRIMARY KEY,
+    label INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS window_stats (
+    window_start INTEGER PRIMARY KEY,
+    n_predictions INTEGER NOT NULL DEFAULT 0,
+    n_positive INTEGER NOT NULL DEFAULT 0,
+    n_labeled INTEGER NOT NULL DEFAULT 0,
+    tp INTEGER NOT NULL DEFAULT 0,
+    fp INTEGER NOT NULL DEFAULT 0,
+    fn INTEGER NOT NULL DEFAULT 0,
+    tn INTEGER NOT NULL DEFAULT 0,
+    n_scored INTEGER NOT NULL DEFAULT 0,
+    brier_sum REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS calibration_bins (
+    window_start INTEGER NOT NULL,
+    bin INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    probability_sum REAL NOT NULL DEFAULT 0,
+    label_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (window_start, bin)
+);
+CREATE TABLE IF NOT EXISTS ingested_objects (
+    key TEXT PRIMARY KEY,
+    etag TEXT NOT NULL
+);
+"""
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if denominator else None
+
+def summarize_counts(stats, bins=None):
+    """Tính metric từ các tổng cộng dồn (một cửa sổ hoặc tổng của nhiều cửa sổ)"""
+    tp, fp, fn, tn = stats["tp"], stats["fp"], stats["fn"], stats["tn"]
+    precision = _ratio(tp, tp + fp)
+    recall = _ratio(tp, tp + fn)
+    metrics = {
+        "n_predictions": int(stats["n_predictions"]),
+        "n_labeled": int(stats["n_labeled"]),
+        "positive_rate": _ratio(stats["n_positive"], stats["n_predictions"]),
+        "label_positive_rate": _ratio(tp + fn, stats["n_labeled"]),
+        "accuracy": _ratio(tp + tn, stats["n_labeled"]),
+        "precision": precision,
+        "recall": recall,
+        "f1": _ratio(2 * tp, 2 * tp + fp + fn),
+        "brier_score": _ratio(stats["brier_sum"], stats["n_scored"]),
+        "expected_calibration_error": None
+    }
+    if bins is not None and bins["count"].sum() > 0:
+        # ECE: trung bình có trọng số |xác suất trung bình - tỷ lệ nhãn dương| theo bin
+        counts = bins["count"].to_numpy(dtype=np.float64)
+        gap = np.abs(bins["probability_sum"].to_numpy() - bins["label_sum"].to_numpy()) / counts
+        metrics["expected_calibration_error"] = float(np.sum(gap * counts) / counts.sum())
+    return metrics
+
+class PerformanceTracker:
+    """Kho dự đoán/nhãn SQLite với các tổng hợp theo cửa sổ thời gian"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, window_seconds=WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._conn.close()
+
+    def _window(self, timestamp):
+        return int(timestamp // self.window_seconds) * self.window_seconds
+
+    def log_predictions(self, request_ids, predictions, probabilities=None, timestamp=None):
+        """Ghi dự đoán (bỏ qua request_id đã có), trả về số dòng mới"""
+        window_start = self._window(time.time() if timestamp is None else timestamp)
+        predictions = np.asarray(predictions, dtype=np.int64)
+        if probabilities is None:
+            probabilities = [None] * len(predictions)
+        else:
+            probabilities = np.asarray(probabilities, dtype=np.float64).tolist()
+        rows = list(zip(map(str, request_ids), [window_start] * len(predictions),
+                        predictions.tolist(), probabilities))
+
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming_predictions "
+                               "(request_id TEXT PRIMARY KEY, window_start INTEGER, prediction INTEGER, probability REAL)")
+            self._conn.execute("DELETE FROM incoming_predictions")
+            self._conn.executemany("INSERT OR IGNORE INTO incoming_predictions VALUES (?, ?, ?, ?)", rows)
+            # Bỏ các request_id đã được ghi trước đó
+            self._conn.execute("DELETE FROM incoming_predictions WHERE request_id IN "
+                               "(SELECT i.request_id FROM incoming_predictions i "
+                               "JOIN predictions p ON p.request_id = i.request_id)")
+            inserted = self._conn.execute("SELECT COUNT(*) FROM incoming_predictions").fetchone()[0]
+            if inserted:
+                self._conn.execute(
+                    "INSERT INTO window_stats (window_start, n_predictions, n_positive) "
+                    "SELECT window_start, COUNT(*), SUM(prediction = 1) FROM incoming_predictions "
+                    "GROUP BY window_start ON CONFLICT(window_start) DO UPDATE SET "
+                    "n_predictions = n_predictions + excluded.n_predictions, "
+                    "n_positive = n_positive + excluded.n_positive")
+                self._conn.execute("INSERT INTO predictions (request_id, window_start, prediction, probability) "
+                                   "SELECT request_id, window_start, prediction, probability FROM incoming_predictions")
+                # Nhãn đã đến trước dự đoán
+                pending = self._conn.execute(
+                    "SELECT l.request_id, l.label FROM pending_labels l "
+                    "JOIN incoming_predictions i ON i.request_id = l.request_id").fetchall()
+                if pending:
+                    self._apply_labels(pending)
+                    self._conn.executemany("DELETE FROM pending_labels WHERE request_id = ?",
+                                           [(r[0],) for r in pending])
+        return inserted
+
+    def log_labels(self, request_ids, labels):
+        """Ghi nhãn thật, trả về số nhãn được join với dự đoán
+
+        Nhãn chưa có dự đoán tương ứng được giữ lại và join khi dự đoán đến.
+        """
+        rows = list(zip(map(str, request_ids), np.asarray(labels, dtype=np.int64).tolist()))
+        with self._lock, self._conn:
+            joined = self._apply_labels(rows)
+            matched = {r[0] for r in joined}
+            unmatched = [r for r in rows if r[0] not in matched]
+            if unmatched:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO pending_labels (request_id, label) "
+                    "SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM predictions WHERE request_id = ?)",
+                    [(r[0], r[1], r[0]) for r in unmatched])
+        return len(joined)
+
+    def _apply_labels(self, rows):
+        """Join nhãn với dự đoán chưa có nhãn và cộng dồn vào tổng hợp của cửa sổ"""
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming_labels "
+                           "(request_id TEXT PRIMARY KEY, label INTEGER)")
+        self._conn.execute("DELETE FROM incoming_labels")
+        self._conn.executemany("INSERT OR REPLACE INTO incoming_labels VALUES (?, ?)", rows)
+        joined = self._conn.execute(
+            "SELECT p.request_id, p.window_start, p.prediction, p.probability, l.label "
+            "FROM incoming_labels l JOIN predictions p ON p.request_id = l.request_id "
+            "WHERE p.label IS NULL").fetchall()
+        if not joined:
+            return []
+
+        frame = pd.DataFrame(joined, columns=["request_id", "window_start", "prediction", "probability", "label"])
+        prediction = frame["prediction"].to_numpy() == 1
+        label = frame["label"].to_numpy() == 1
+        frame["tp"] = prediction & label
+        frame["fp"] = prediction & ~label
+        frame["fn"] = ~prediction & label
+        frame["tn"] = ~prediction & ~label
+        frame["scored"] = frame["probability"].notna()
+        frame["brier"] = ((frame["probability"] - frame["label"]) ** 2).fillna(0.0)
+        stats = frame.groupby("window_start").agg(
+            n_labeled=("label", "size"), tp=("tp", "sum"), fp=("fp", "sum"),
+            fn=("fn", "sum"), tn=("tn", "sum"), n_scored=("scored", "sum"), brier_sum=("brier", "sum"))
+        self._conn.executemany(
+            "INSERT INTO window_stats (window_start, n_labeled, tp, fp, fn, tn, n_scored, brier_sum) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(window_start) DO UPDATE SET "
+            "n_labeled = n_labeled + excluded.n_labeled, tp = tp + excluded.tp, fp = fp + excluded.fp, "
+            "fn = fn + excluded.fn, tn = tn + excluded.tn, n_scored = n_scored + excluded.n_scored, "
+            "brier_sum = brier_sum + excluded.brier_sum",
+            [(int(w), int(r.n_labeled), int(r.tp), int(r.fp), int(r.fn), int(r.tn), int(r.n_scored), float(r.brier_sum))
+             for w, r in stats.iterrows()])
+
+        scored = frame[frame["scored"]]
+        if len(scored):
+            scored = scored.assign(bin=np.minimum((scored["probability"] * CALIBRATION_BINS).astype(int),
+                                                  CALIBRATION_BINS - 1))
+            bins = scored.groupby(["window_start", "bin"]).agg(
+                count=("label", "size"), probability_sum=("probability", "sum"), label_sum=("label", "sum"))
+            self._conn.executemany(
+                "INSERT INTO calibration_bins (window_start, bin, count, probability_sum, label_sum) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(window_start, bin) DO UPDATE SET "
+                "count = count + excluded.count, probability_sum = probability_sum + excluded.probability_sum, "
+                "label_sum = label_sum + excluded.label_sum",
+                [(int(w), int(b), int(r["count"]), float(r["probability_sum"]), int(r["label_sum"]))
+                 for (w, b), r in bins.iterrows()])
+
+        self._conn.executemany("UPDATE predictions SET label = ? WHERE request_id = ?",
+                               [(int(label), request_id) for request_id, _, _, _, label in joined])
+        return joined
+
+    def ingest_labels_from_s3(self, s3_client, bucket, prefix):
+        """Đọc các file CSV nhãn (cột request_id, label) mới hoặc đã đổi trên MinIO"""
+        total = 0
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                key, etag = obj["Key"], obj["ETag"].strip('"')
+                with self._lock:
+                    seen = self._conn.execute("SELECT etag FROM ingested_objects WHERE key = ?", (key,)).fetchone()
+                if seen and seen[0] == etag:
+                    continue
+                body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+                labels = pd.read_csv(BytesIO(body), usecols=["request_id", "label"], dtype={"request_id": str})
+                total += self.log_labels(labels["request_id"], labels["label"])
+                with self._lock, self._conn:
+                    self._conn.execute("INSERT OR REPLACE INTO ingested_objects (key, etag) VALUES (?, ?)", (key, etag))
+        return total
+
+    def _read_windows(self, since=None):
+        since = 0 if since is None else self._window(since)
+        with self._lock:
+            stats = pd.read_sql_query(
+                "SELECT * FROM window_stats WHERE window_start >= ? ORDER BY window_start",
+                self._conn, params=(since,))
+            bins = pd.read_sql_query(
+                "SELECT * FROM calibration_bins WHERE window_start >= ?", self._conn, params=(since,))
+        return stats, bins
+
+    def window_metrics(self, since=None, baseline_positive_rate=None):
+        """Metric của từng cửa sổ (chỉ đọc các dòng tổng hợp)
+
+        positive_rate_drift: chênh lệch tỷ lệ dự đoán dương so với baseline
+        (mặc định là cửa sổ đầu tiên).
+        """
+        stats, bins = self._read_windows(since)
+        results = []
+        for row in stats.to_dict("records"):
+            metrics = summarize_counts(row, bins[bins["window_start"] == row["window_start"]])
+            if baseline_positive_rate is None:
+                baseline_positive_rate = metrics["positive_rate"]
+            metrics["window_start"] = int(row["window_start"])
+            metrics["positive_rate_drift"] = (
+                abs(metrics["positive_rate"] - baseline_positive_rate)
+                if metrics["positive_rate"] is not None and baseline_positive_rate is not None else None
+            )
+            results.append(metrics)
+        return results
+
+    def rolling_metrics(self, windows=24, now=None):
+        """Metric gộp của `windows` cửa sổ gần nhất"""
+        now = time.time() if now is None else now
+        stats, bins = self._read_windows(now - (windows - 1) * self.window_seconds)
+        totals = stats.drop(columns="window_start").sum().to_dict() if len(stats) else {
+            "n_predictions": 0, "n_positive": 0, "n_labeled": 0, "tp": 0, "fp": 0,
+            "fn": 0, "tn": 0, "n_scored": 0, "brier_sum": 0.0}
+        bins = bins.groupby("bin")[["count", "probability_sum", "label_sum"]].sum()
+        return summarize_counts(totals, bins)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""Lưu trữ dữ liệu tham chiếu cho drift detection dưới dạng Parquet
+
+- Định dạng cột, không phụ thuộc phiên bản pandas (thay cho pickle)
+- Footer chứa schema version và thống kê từng cột (min/max/mean/std/null),
+  đọc được mà không cần đọc dữ liệu
+- Đọc bằng memory map và chỉ các cột cần thiết (các cột được chọn vẫn nằm hết
+  trong RAM vì KS/PSI phân vị cần toàn bộ giá trị của cột)
+- Bản sao local được cache theo ETag, chỉ tải lại khi object trên MinIO đổi
+"""
+import os
+import json
+import pickle
+import tempfile
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
+
+REFERENCE_KEY = "reference/reference_data.parquet"
+LEGACY_REFERENCE_KEY = "reference_data.pkl"
+
+# Tăng khi thay đổi cấu trúc file; reader từ chối version mới hơn nó hiểu
+SCHEMA_VERSION = 1
+METADATA_KEY = b"bankchurn.reference"
+
+ROW_GROUP_SIZE = 64 * 1024
+LOCAL_CACHE_DIR = os.environ.get(
+    "REFERENCE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bankchurn-reference")
+)
+
+def compute_column_stats(table):
+    """Thống kê từng cột số của bảng Arrow"""
+    stats = {}
+    for name in table.column_names:
+        column = table.column(name)
+        entry = {"type": str(column.type), "null_count": column.null_count}
+        if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+            min_max = pc.min_max(column)
+            entry.update({
+                "min": min_max["min"].as_py(),
+                "max": min_max["max"].as_py(),
+                "mean": pc.mean(column).as_py(),
+                "std": pc.stddev(column).as_py()
+            })
+        stats[name] = entry
+    return stats
+
+def write_reference(data, path):
+    """Ghi DataFrame tham chiếu ra file Parquet kèm metadata trong footer"""
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    metadata = {
+        "schema_version": SCHEMA_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "num_rows": table.num_rows,
+        "columns": compute_column_stats(table)
+    }
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        METADATA_KEY: json.dumps(metadata).encode("utf-8")
+    })
+    pq.write_table(table, path, row_group_size=ROW_GROUP_SIZE, write_statistics=True)
+    return metadata
+
+def upload_reference(data, s3_client, bucket, key=REFERENCE_KEY):
+    """Ghi dữ liệu tham chiếu thành Parquet và upload lên MinIO"""
+    os.makedirs(LOCAL_CACHE_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=LOCAL_CACHE_DIR, suffix=".parquet", delete=False) as f:
+        path = f.name
+    try:
+        metadata = write_reference(data, path)
+        s3_client.upload_file(path, bucket, key)
+    finally:
+        os.remove(path)
+    return metadata
+
+def fetch_reference(s3_client, bucket, key=REFERENCE_KEY):
+    """Đảm bảo có bản sao local mới nhất của file tham chiếu, trả về đường dẫn
+
+    Chỉ tải về khi ETag trên MinIO khác bản đã cache. Trả về None nếu object
+    chưa tồn tại.
+    """
+    try:
+        etag = s3_client.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+    os.makedirs(LOCAL_CACHE_DIR, exist_ok=True)
+    path = os.path.join(LOCAL_CACHE_DIR, f"{bucket}_{key.replace('/', '_')}")
+    etag_path = path + ".etag"
+    if os.path.exists(path) and os.path.exists(etag_path):
+        with open(etag_path) as f:
+            if f.read() == etag:
+                return path
+
+    tmp_path = path + ".part"
+    s3_client.download_file(bucket, key, tmp_path)
+    os.replace(tmp_path, path)
+    with open(etag_path, "w") as f:
+        f.write(etag)
+    return path
+
+def read_reference_metadata(path):
+    """Đọc schema version và thống kê cột từ footer (không đọc dữ liệu)"""
+    schema = pq.read_schema(path, memory_map=True)
+    raw = (schema.metadata or {}).get(METADATA_KEY)
+    if raw is None:
+        raise ValueError(f"{path} không phải file tham chiếu (thiếu metadata)")
+    metadata = json.loads(raw)
+    if metadata.get("schema_version", 0) > SCHEMA_VERSION:
+        raise ValueError(
+            f"File tham chiếu có schema version {metadata['schema_version']}, "
+            f"phiên bản hiện tại chỉ hỗ trợ tới {SCHEMA_VERSION}"
+        )
+    return metadata
+
+def load_reference(path, columns=None):
+    """Đọc các cột cần thiết của file tham chiếu thành DataFrame (memory-mapped)"""
+    read_reference_metadata(path)
+    table = pq.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def migrate_legacy_reference(s3_client, bucket, key=REFERENCE_KEY):
+    """Chuyển reference_data.pkl (pickle DataFrame) cũ sang Parquet nếu còn tồn tại
+
+    Trả về DataFrame đã chuyển, hoặc None nếu không có file cũ.
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=LEGACY_REFERENCE_KEY)
+    except ClientError:
+        return None
+    data = pickle.loads(response['Body'].read())
+    upload_reference(data, s3_client, bucket, key)
+    print(f"Đã chuyển {LEGACY_REFERENCE_KEY} sang {key}")
+    return data
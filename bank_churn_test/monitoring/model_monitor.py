@@ -16,7 +16,8 @@ import json
 
 # Import from monitoring modules
 from config.mlflow_config import configure_mlflow, ensure_no_active_runs
-from utils.kserve_client import check_model_health, generate_test_data, predict_churn
+from utils.kserve_client import generate_test_data, predict_churn
+from utils.model_health import get_health_monitor
 from utils.system_metrics import get_system_metrics
 
 # Global configuration
@@ -531,8 +532,8 @@ def run_monitoring_batch():
     system_metrics = get_system_metrics()
     print(f"CPU: {system_metrics['cpu_percent']}%, Memory: {system_metrics['memory_percent']}%")
     
-    # Kiểm tra sức khỏe model
-    health = check_model_health()
+    # Kiểm tra sức khỏe model (trạng thái gần nhất từ monitor nền, không gọi mạng)
+    health = get_health_monitor().get_state()
     if not health["is_healthy"]:
         print(f"Model không khỏe mạnh. Status code: {health['status_code']}")
         
@@ -541,8 +542,10 @@ def run_monitoring_batch():
         with mlflow.start_run(run_name="model-health-alert"):
             mlflow.log_param("error_timestamp", current_time.isoformat())
             mlflow.log_param("error_message", health.get("error", "Unknown error"))
+            mlflow.log_param("circuit_state", health.get("circuit_state", "unknown"))
             mlflow.log_metric("health_status", 0)
-            mlflow.log_metric("status_code", health.get("status_code", 500))
+            mlflow.log_metric("status_code", health.get("status_code") or 500)
+            mlflow.log_metric("consecutive_failures", health.get("consecutive_failures", 0))
             
             # Log time-based context for error
             mlflow.log_metric("time.hour", current_time.hour)
@@ -710,6 +713,10 @@ def main():
     # Tạo thư mục cho visualizations nếu chưa tồn tại
     os.makedirs('mlops_bigdata_2025II/bank_churn_test/monitoring', exist_ok=True)
     
+    # Bắt đầu probe sức khỏe model nền (chu kỳ thích ứng, có hysteresis)
+    health_monitor = get_health_monitor()
+    print(f"Trạng thái model ban đầu: {'khỏe mạnh' if health_monitor.get_state()['is_healthy'] else 'không khỏe mạnh'}")
+    
     # Chạy đợt monitoring đầu tiên ngay lập tức
     run_monitoring_batch()
     
@@ -731,6 +738,7 @@ def main():
             
     except KeyboardInterrupt:
         print("Đã nhận lệnh dừng. Kết thúc chương trình.")
+        health_monitor.stop()
         # Đảm bảo đóng tất cả các active run trước khi thoát
         try:
             mlflow.end_run()
@@ -7,7 +7,8 @@ from datetime import datetime
 # Add parent directory to path so we can import modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config.mlflow_config import configure_mlflow, ensure_no_active_runs
-from utils.kserve_client import get_model_metadata, predict_churn, generate_test_data
+from utils.kserve_client import predict_churn, generate_test_data
+from utils.model_health import get_health_monitor
 from utils.mlflow_utils import log_prediction_to_mlflow, log_batch_summary
 
 def main():
@@ -16,7 +17,10 @@ def main():
     ensure_no_active_runs()
     
     print("Kiểm tra model metadata...")
-    model_metadata, metadata_response_time = get_model_metadata()
+    model_metadata, metadata_response_time = get_health_monitor(start=False).get_metadata()
+    if model_metadata is None:
+        print("Không lấy được metadata của model, dừng.")
+        return
     print(f"Model: {model_metadata['name']}")
     print(f"Inputs: {len(model_metadata['inputs'])}")
     print(f"Metadata response time: {metadata_response_time:.2f} ms")
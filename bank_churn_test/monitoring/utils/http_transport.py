@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+"""Lớp HTTP dùng chung cho các lời gọi KServe
+
+- Một requests.Session với connection pool keep-alive (giới hạn số socket)
+- Deadline cho toàn bộ lời gọi (kể cả retry), không có request nào chờ vô hạn
+- Retry có giới hạn với backoff + jitter, chỉ cho lời gọi idempotent
+- Circuit breaker theo từng host: khi model chết thì fail fast thay vì treo
+"""
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pool
+POOL_CONNECTIONS = 4      # Số host được giữ pool
+POOL_MAXSIZE = 16         # Số kết nối tối đa mỗi host
+CONNECT_TIMEOUT = 3.05    # Giây
+DEFAULT_DEADLINE = 10     # Giây, tổng thời gian cho một lời gọi kể cả retry
+
+# Retry
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.2        # Giây
+BACKOFF_MAX = 2.0         # Giây
+RETRY_STATUS_CODES = (502, 503, 504)
+# Lỗi tạm thời được retry; các RequestException khác vẫn tính là lỗi cho breaker nhưng không retry
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+# Circuit breaker
+BREAKER_FAILURE_THRESHOLD = 5   # Số lỗi liên tiếp để mở mạch
+BREAKER_RESET_TIMEOUT = 30      # Giây chờ trước khi thử lại (half-open)
+BREAKER_TRIAL_TIMEOUT = 60      # Giây; request thử quá thời gian này mà chưa có kết quả thì cho request thử khác
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+class CircuitOpenError(requests.ConnectionError):
+    """Mạch đang mở: endpoint bị coi là chết, lời gọi bị từ chối ngay"""
+
+class DeadlineExceededError(requests.Timeout):
+    """Hết deadline của lời gọi trước khi có response"""
+
+class CircuitBreaker:
+    """Circuit breaker ba trạng thái: closed -> open -> half_open -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT,
+                 trial_timeout=BREAKER_TRIAL_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_timeout = trial_timeout
+        self._trial_in_flight = False
+        self._trial_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Trả về True nếu được phép gửi request"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                # Chỉ cho một request thử đi qua; request thử bị treo quá trial_timeout thì bỏ qua nó
+                now = time.monotonic()
+                if self._trial_in_flight and now - self._trial_started_at < self.trial_timeout:
+                    return False
+                self._trial_in_flight = True
+                self._trial_started_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release(self):
+        """Trả lại lượt thử half-open khi request kết thúc mà không có kết quả (không đổi trạng thái)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self):
+        """Trạng thái hiện tại (dùng cho log/metrics)"""
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+_session = None
+_breakers = {}
+_lock = threading.Lock()
+
+def get_session():
+    """Session dùng chung với connection pool keep-alive"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            # Retry do lớp này tự xử lý (có deadline), adapter không retry
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                                  max_retries=0, pool_block=True)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+def get_breaker(url):
+    """Circuit breaker của host trong url"""
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    with _lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker()
+        return _breakers[key]
+
+def _backoff(attempt, remaining):
+    """Thời gian chờ trước lần retry: exponential backoff với full jitter"""
+    return min(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))), max(remaining, 0))
+
+def request(method, url, deadline=DEFAULT_DEADLINE, idempotent=None, max_retries=MAX_RETRIES, **kwargs):
+    """Gửi HTTP request qua session dùng chung
+
+    Args:
+        method: HTTP method
+        url: URL đầy đủ
+        deadline: tổng thời gian tối đa (giây) cho lời gọi, kể cả các lần retry
+        idempotent: có được retry không; mặc định suy ra từ method
+        max_retries: số lần retry tối đa cho lời gọi idempotent
+        **kwargs: truyền thẳng cho requests.Session.request (headers, data, ...)
+
+    Raises:
+        CircuitOpenError: mạch của host đang mở
+        DeadlineExceededError: hết deadline
+        requests.RequestException: lỗi kết nối ở lần thử cuối, hoặc lỗi không retry được
+    """
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    attempts = 1 + (max_retries if idempotent else 0)
+
+    breaker = get_breaker(url)
+    session = get_session()
+    deadline_at = time.monotonic() + deadline
+    last_error = None
+
+    for attempt in range(attempts):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError(f"Deadline {deadline}s exceeded for {method} {url}") from last_error
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for {url}") from last_error
+
+        try:
+            response = session.request(method, url, timeout=(min(CONNECT_TIMEOUT, remaining), remaining), **kwargs)
+        except RETRY_EXCEPTIONS as e:
+            breaker.record_failure()
+            last_error = e
+        except requests.RequestException:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Lỗi không phải của endpoint (tham số sai, KeyboardInterrupt...): không để kẹt lượt thử
+            breaker.release()
+            raise
+        else:
+            if response.status_code < 500:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            if response.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+                return response
+            last_error = requests.HTTPError(f"{response.status_code} from {url}", response=response)
+
+        if attempt < attempts - 1:
+            time.sleep(_backoff(attempt, deadline_at - time.monotonic()))
+
+    raise last_error
+
+def breaker_states():
+    """Trạng thái circuit breaker của tất cả host"""
+    with _lock:
+        breakers = dict(_breakers)
+    return {host: breaker.snapshot() for host, breaker in breakers.items()}
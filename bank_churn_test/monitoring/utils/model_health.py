@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""Theo dõi sức khỏe model và cache metadata, chạy nền
+
+- Probe liveness (/v2/health/live) và readiness (/v2/models/{name}/ready) với
+  chu kỳ thích ứng: giãn dần khi model ổn định, rút ngắn khi lỗi hoặc flapping
+- Hysteresis: chỉ chuyển sang "unhealthy" sau FAILURE_THRESHOLD lần lỗi liên
+  tiếp và chỉ "healthy" lại sau RECOVERY_THRESHOLD lần thành công liên tiếp
+- Metadata (inputs, outputs, versions) được cache với TTL và làm mới nền
+- get_state()/get_metadata() trả về trạng thái gần nhất, không gọi mạng
+"""
+import sys
+import os
+import threading
+import time
+from collections import deque
+
+# Add parent directory to path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.kserve_client import check_server_live, check_model_ready, get_model_metadata
+
+# Chu kỳ probe (giây)
+MIN_PROBE_INTERVAL = 2
+MAX_PROBE_INTERVAL = 60
+PROBE_BACKOFF_FACTOR = 1.5
+
+# Hysteresis
+FAILURE_THRESHOLD = 3
+RECOVERY_THRESHOLD = 2
+
+# Flapping: số lần đổi kết quả probe trong FLAP_WINDOW lần probe gần nhất
+FLAP_WINDOW = 10
+FLAP_THRESHOLD = 3
+
+# Metadata cache
+METADATA_TTL_SECONDS = 300
+
+class ModelHealthMonitor:
+    """Probe model nền và giữ trạng thái sức khỏe/metadata gần nhất"""
+
+    def __init__(self):
+        self.interval = MIN_PROBE_INTERVAL
+        self.is_healthy = None           # None = chưa probe lần nào
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.last_probe = {}
+        self.transitions = 0
+        self.recent_results = deque(maxlen=FLAP_WINDOW)
+        self.metadata = None
+        self.metadata_response_time = None
+        self.metadata_fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Probe ngay một lần rồi chạy thread nền"""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self.probe_now()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="model-health-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            self.probe_now()
+
+    def _is_flapping(self):
+        results = list(self.recent_results)
+        changes = sum(1 for a, b in zip(results, results[1:]) if a != b)
+        return changes >= FLAP_THRESHOLD
+
+    def probe_now(self):
+        """Probe liveness + readiness, cập nhật trạng thái (có hysteresis) và metadata"""
+        live = check_server_live()
+        ready = check_model_ready() if live["is_healthy"] else live
+        success = live["is_healthy"] and ready["is_healthy"]
+
+        with self._lock:
+            self.recent_results.append(success)
+            if success:
+                self.consecutive_successes += 1
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+                self.consecutive_successes = 0
+
+            previous = self.is_healthy
+            if self.is_healthy is None:
+                self.is_healthy = success
+            elif self.is_healthy and self.consecutive_failures >= FAILURE_THRESHOLD:
+                self.is_healthy = False
+            elif not self.is_healthy and self.consecutive_successes >= RECOVERY_THRESHOLD:
+                self.is_healthy = True
+            if previous is not None and previous != self.is_healthy:
+                self.transitions += 1
+
+            # Giãn chu kỳ khi ổn định, rút về tối thiểu khi lỗi hoặc flapping
+            if success and not self._is_flapping():
+                self.interval = min(self.interval * PROBE_BACKOFF_FACTOR, MAX_PROBE_INTERVAL)
+            else:
+                self.interval = MIN_PROBE_INTERVAL
+
+            self.last_probe = {
+                "live": live["is_healthy"],
+                "ready": ready["is_healthy"],
+                "status_code": ready.get("status_code"),
+                "response_time": ready.get("response_time"),
+                "circuit_state": ready.get("circuit_state"),
+                "error": ready.get("error"),
+                "timestamp": time.time()
+            }
+            metadata_stale = time.time() - self.metadata_fetched_at > METADATA_TTL_SECONDS
+
+        if success and (self.metadata is None or metadata_stale):
+            self.refresh_metadata()
+        return self.get_state()
+
+    def refresh_metadata(self):
+        """Tải lại metadata của model vào cache"""
+        try:
+            metadata, response_time = get_model_metadata()
+        except Exception as e:
+            print(f"Không thể làm mới metadata: {str(e)}")
+            return None
+        if "inputs" not in metadata:
+            return None
+        with self._lock:
+            self.metadata = metadata
+            self.metadata_response_time = response_time
+            self.metadata_fetched_at = time.time()
+        return metadata
+
+    def get_state(self):
+        """Trạng thái sức khỏe gần nhất (cùng khóa với check_model_health), không gọi mạng"""
+        with self._lock:
+            probe = dict(self.last_probe)
+            return {
+                "is_healthy": bool(self.is_healthy),
+                "status_code": probe.get("status_code"),
+                "response_time": probe.get("response_time"),
+                "error": probe.get("error"),
+                "circuit_state": probe.get("circuit_state"),
+                "live": probe.get("live"),
+                "ready": probe.get("ready"),
+                "consecutive_failures": self.consecutive_failures,
+                "consecutive_successes": self.consecutive_successes,
+                "transitions": self.transitions,
+                "flapping": self._is_flapping(),
+                "probe_interval": self.interval,
+                "timestamp": probe.get("timestamp")
+            }
+
+    def get_metadata(self):
+        """Metadata trong cache, trả về (metadata, thời gian phản hồi ms) giống get_model_metadata
+
+        Chỉ gọi mạng khi cache còn trống (lần đầu).
+        """
+        if self.metadata is None:
+            self.refresh_metadata()
+        with self._lock:
+            return self.metadata, self.metadata_response_time
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+def get_health_monitor(start=True):
+    """Monitor dùng chung cho cả tiến trình"""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = ModelHealthMonitor()
+        if start:
+            _monitor.start()
+    return _monitor
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Benchmark evaluation.evaluate trên tập test lớn
+
+Đo thời gian metric điểm và thời gian bootstrap (BOOTSTRAP_RESAMPLES mẫu) theo số
+dòng, và so khoảng tin cậy với bootstrap lấy mẫu lại từng dòng (cách cũ, chậm) trên
+tập nhỏ nhất. Thoát với lỗi nếu bootstrap chậm hơn --max-seconds ở bất kỳ kích thước nào:
+
+    python benchmark_evaluation.py
+    python benchmark_evaluation.py --rows 100000 1000000 5000000 --max-seconds 1
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PIPELINE_DIR)
+from evaluation import BOOTSTRAP_RESAMPLES, CALIBRATION_BINS, METRICS, _Prepared, _weighted_metrics, evaluate
+
+ROWS = [100_000, 1_000_000]
+MAX_BOOTSTRAP_SECONDS = 1.0
+# Số mẫu của bootstrap từng dòng dùng để đối chiếu (mỗi mẫu tốn O(rows))
+REFERENCE_RESAMPLES = 200
+
+def synthetic_scores(rows, seed=0):
+    """Nhãn (20% dương), xác suất có tín hiệu và nhãn dự đoán ngưỡng 0.5"""
+    rng = np.random.default_rng(seed)
+    y_true = rng.random(rows) < 0.2
+    y_prob = np.clip(0.2 + 0.35 * (y_true - 0.2) + rng.normal(0, 0.2, rows), 0, 1)
+    return y_true, y_prob > 0.5, y_prob
+
+def row_bootstrap(y_true, y_pred, y_prob, resamples, confidence=0.95, seed=42):
+    """Bootstrap lấy mẫu lại từng dòng rồi tính metric đầy đủ (chuẩn để so sánh)"""
+    rng = np.random.default_rng(seed)
+    samples = {name: [] for name in METRICS}
+    for _ in range(resamples):
+        index = rng.integers(0, len(y_true), len(y_true))
+        prepared = _Prepared(y_true[index], y_pred[index], y_prob[index], CALIBRATION_BINS)
+        values = _weighted_metrics(prepared, prepared.segment_rows[None, :])
+        for name in METRICS:
+            samples[name].append(values[name][0])
+    tail = (1 - confidence) / 2 * 100
+    return {name: tuple(np.nanpercentile(samples[name], [tail, 100 - tail])) for name in METRICS}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark evaluate + bootstrap theo số dòng')
+    parser.add_argument('--rows', type=int, nargs='+', default=ROWS, help='Số dòng của tập test')
+    parser.add_argument('--resamples', type=int, default=BOOTSTRAP_RESAMPLES, help='Số mẫu bootstrap')
+    parser.add_argument('--max-seconds', type=float, default=MAX_BOOTSTRAP_SECONDS,
+                        help='Thời gian bootstrap tối đa cho phép')
+    parser.add_argument('--skip-reference', action='store_true', help='Bỏ qua so sánh với bootstrap từng dòng')
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'metrics (s)':>12} {'bootstrap (s)':>14}")
+    slow = []
+    for rows in args.rows:
+        y_true, y_pred, y_prob = synthetic_scores(rows)
+        start_time = time.perf_counter()
+        evaluate(y_true, y_pred, y_prob, resamples=0)
+        point_seconds = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        report = evaluate(y_true, y_pred, y_prob, resamples=args.resamples)
+        bootstrap_seconds = time.perf_counter() - start_time - point_seconds
+        print(f"{rows:>10} {point_seconds:>12.3f} {bootstrap_seconds:>14.3f}")
+        if bootstrap_seconds > args.max_seconds:
+            slow.append(rows)
+
+    if not args.skip_reference:
+        rows = min(args.rows)
+        y_true, y_pred, y_prob = synthetic_scores(rows)
+        intervals = evaluate(y_true, y_pred, y_prob, resamples=args.resamples)["intervals"]
+        reference = row_bootstrap(y_true, y_pred, y_prob, REFERENCE_RESAMPLES)
+        print(f"\nKhoảng tin cậy ({rows} dòng): bootstrap theo đoạn / từng dòng ({REFERENCE_RESAMPLES} mẫu)")
+        for name in METRICS:
+            low, high = reference[name]
+            print(f"{name:<10} [{intervals[name]['low']:.4f}, {intervals[name]['high']:.4f}]"
+                  f"  [{low:.4f}, {high:.4f}]")
+
+    if slow:
+        sys.exit(f"Bootstrap {args.resamples} mẫu chậm hơn {args.max_seconds}s với {slow} dòng")
+
+if __name__ == "__main__":
+    main()
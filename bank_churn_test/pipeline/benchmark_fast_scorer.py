@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""Benchmark FastScorer (file scoring gọn, chỉ NumPy) so với MLflow pyfunc
+
+Đo cho cả hai cách, mỗi cách trong một process mới:
+- thời gian import + load model và bộ nhớ đỉnh (VmHWM) sau khi load
+- độ trễ predict theo kích thước batch (median)
+và kiểm tra hai cách cho cùng nhãn dự đoán.
+
+Mặc định train nhanh một model từ dataset/churn.csv (mã hóa + scale giống
+preprocess_data); hoặc chỉ định model của một lần chạy pipeline:
+
+    python benchmark_fast_scorer.py --estimator gradient_boosting
+    python benchmark_fast_scorer.py --model-uri runs:/<run_id>/model --scoring-path scoring.npz
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import shutil
+import tempfile
+import time
+
+from process_memory import peak_rss_mb
+
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET = os.path.join(PIPELINE_DIR, "..", "dataset", "churn.csv")
+FEATURE_NAMES = ["CreditScore", "Geography", "Gender", "Age", "Tenure", "Balance",
+                 "NumOfProducts", "HasCrCard", "IsActiveMember", "EstimatedSalary"]
+CATEGORICAL_COLUMNS = ["Geography", "Gender"]
+BATCH_SIZES = [1, 100, 10000]
+
+def load_raw(rows):
+    """Feature gốc (Geography/Gender đã mã hóa theo thứ tự sort như LabelEncoder) và nhãn"""
+    import numpy as np
+    import pandas as pd
+
+    df = pd.read_csv(DATASET)
+    categories = {column: sorted(df[column].unique()) for column in CATEGORICAL_COLUMNS}
+    for column, values in categories.items():
+        df[column] = df[column].map({value: code for code, value in enumerate(values)})
+    repeats = -(-rows // len(df))
+    X = np.tile(df[FEATURE_NAMES].to_numpy(dtype=np.float64), (repeats, 1))[:rows]
+    y = np.tile(df["Exited"].to_numpy(), repeats)[:rows]
+    return X, y, categories
+
+def train_and_export(estimator, workdir):
+    """Train model trên dữ liệu đã scale, lưu dạng MLflow model và file scoring gọn"""
+    import mlflow.sklearn
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.ensemble import GradientBoostingClassifier
+    from fast_scorer import export_model
+
+    X, y, categories = load_raw(10000)
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X)
+    model = {
+        "logistic_regression": lambda: LogisticRegression(max_iter=1000),
+        "gradient_boosting": lambda: GradientBoostingClassifier(n_estimators=200, max_depth=3, random_state=42)
+    }[estimator]()
+    model.fit(X_scaled, y)
+
+    model_uri = os.path.join(workdir, "model")
+    mlflow.sklearn.save_model(model, model_uri, serialization_format="cloudpickle")
+    scoring_path = export_model(model, scaler, FEATURE_NAMES, categories,
+                                os.path.join(workdir, "scoring.npz"), check_inputs=X_scaled)
+    return model_uri, scoring_path, scaler.mean_, scaler.scale_
+
+def probe(kind, path, data_path, repeats):
+    """Chạy trong process mới: load, đo bộ nhớ và độ trễ, in JSON
+
+    Dữ liệu được đọc bằng np.load (không pandas) để bộ nhớ của FastScorer chỉ gồm NumPy.
+    """
+    import numpy as np
+
+    with np.load(data_path) as data:
+        X, mean, scale = data["X"], data["mean"], data["scale"]
+    start_time = time.perf_counter()
+    if kind == "pyfunc":
+        import mlflow.pyfunc
+        import pandas as pd
+        model = mlflow.pyfunc.load_model(path)
+        # pyfunc nhận feature đã scale dạng DataFrame (như MLServer)
+        inputs = pd.DataFrame((X - mean) / scale, columns=FEATURE_NAMES)
+        predict = lambda n: np.asarray(model.predict(inputs.iloc[:n]))
+    else:
+        from fast_scorer import FastScorer
+        model = FastScorer.load(path)
+        predict = lambda n: model.predict(X[:n])
+    load_seconds = time.perf_counter() - start_time
+    predict(1)
+    rss_mb = peak_rss_mb()
+
+    latency = {}
+    for n in BATCH_SIZES:
+        timings = []
+        for _ in range(repeats if n < 10000 else max(3, repeats // 20)):
+            start_time = time.perf_counter()
+            predict(n)
+            timings.append(time.perf_counter() - start_time)
+        latency[n] = float(np.median(timings))
+    print(json.dumps({
+        "load_seconds": load_seconds, "peak_rss_mb": rss_mb, "latency": latency,
+        "predictions": predict(len(X)).astype(int).tolist()
+    }))
+
+def run_probe(kind, path, data_path, repeats):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--probe", kind, "--probe-path", path,
+         "--probe-data", data_path, "--repeats", str(repeats)],
+        check=True, capture_output=True, text=True, cwd=PIPELINE_DIR
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark FastScorer so với MLflow pyfunc')
+    parser.add_argument('--estimator', default='logistic_regression',
+                        choices=['logistic_regression', 'gradient_boosting'], help='Model train nhanh khi không có --model-uri')
+    parser.add_argument('--model-uri', help='MLflow model (pyfunc) của lần chạy pipeline')
+    parser.add_argument('--scoring-path', help='File scoring.npz tương ứng')
+    parser.add_argument('--repeats', type=int, default=200, help='Số lần đo mỗi kích thước batch')
+    parser.add_argument('--probe', choices=['pyfunc', 'fast'], help=argparse.SUPPRESS)
+    parser.add_argument('--probe-path', help=argparse.SUPPRESS)
+    parser.add_argument('--probe-data', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, PIPELINE_DIR)
+    if args.probe:
+        probe(args.probe, args.probe_path, args.probe_data, args.repeats)
+        return
+
+    import numpy as np
+
+    workdir = tempfile.mkdtemp()
+    if args.model_uri and args.scoring_path:
+        with np.load(args.scoring_path) as arrays:
+            mean, scale = arrays["mean"], arrays["scale"]
+        model_uri, scoring_path = args.model_uri, args.scoring_path
+    else:
+        model_uri, scoring_path, mean, scale = train_and_export(args.estimator, workdir)
+    X, _, _ = load_raw(max(BATCH_SIZES))
+    data_path = os.path.join(workdir, "inputs.npz")
+    np.savez(data_path, X=X, mean=mean, scale=scale)
+
+    results = {kind: run_probe(kind, path, data_path, args.repeats)
+               for kind, path in (("pyfunc", model_uri), ("fast", scoring_path))}
+    if results["pyfunc"]["predictions"] != results["fast"]["predictions"]:
+        raise RuntimeError("FastScorer và pyfunc cho nhãn khác nhau")
+
+    print(f"File scoring: {os.path.getsize(scoring_path) / 1024:.1f} KB")
+    print(f"{'':<22} {'pyfunc':>10} {'fast':>10} {'speedup':>8}")
+    for label, key in (("load (s)", "load_seconds"), ("peak RSS (MB)", "peak_rss_mb")):
+        pyfunc, fast = results["pyfunc"][key], results["fast"][key]
+        print(f"{label:<22} {pyfunc:>10.2f} {fast:>10.2f} {pyfunc / fast:>7.1f}x")
+    for n in BATCH_SIZES:
+        pyfunc, fast = results["pyfunc"]["latency"][str(n)], results["fast"]["latency"][str(n)]
+        print(f"{f'predict {n} rows (ms)':<22} {pyfunc * 1000:>10.3f} {fast * 1000:>10.3f} {pyfunc / fast:>7.1f}x")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""Build image dựng sẵn cho các component của churn_pipeline
+
+Thay cho packages_to_install (pip install lúc container khởi động), mọi component
+dùng chung một image cài sẵn từ images/requirements.lock, kèm các module của
+pipeline mà component import (IMAGE_MODULES). Tag của image là hash của các file
+đó, nên đổi thư viện hay module sẽ đổi tag. Khóa cache của một bước chỉ dùng
+base_digest và hash các module mà bước đó import (module_digests), nên sửa
+evaluation.py không làm preprocess/tune chạy lại.
+
+    python build_image.py --lock      # resolve lại requirements.in -> requirements.lock
+    python build_image.py --push      # build + push image
+    python build_image.py --measure   # đo thời gian import/khởi động từng bước
+"""
+import argparse
+import ast
+import hashlib
+import inspect
+import os
+import subprocess
+import sys
+import time
+
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(PIPELINE_DIR, "images")
+REQUIREMENTS_IN = os.path.join(IMAGES_DIR, "requirements.in")
+REQUIREMENTS_LOCK = os.path.join(IMAGES_DIR, "requirements.lock")
+DOCKERFILE = os.path.join(IMAGES_DIR, "Dockerfile")
+# Module của pipeline được copy vào image
+IMAGE_MODULES = ["evaluation.py", "fast_scorer.py", "serving_transform.py", "step_cache.py"]
+
+IMAGE_REPOSITORY = os.environ.get("PIPELINE_IMAGE_REPOSITORY", "localhost:5000/bank-churn-pipeline")
+PYTHON_VERSION = "3.9"
+# Image cũ: python:3.9 + pip install lúc khởi động, dùng để so sánh
+BASELINE_IMAGE = f"python:{PYTHON_VERSION}"
+
+def _digest(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def image_tag():
+    """Tag theo nội dung: 12 ký tự đầu sha256(Dockerfile + requirements.lock + module được copy)"""
+    return _digest([DOCKERFILE, REQUIREMENTS_LOCK] + [os.path.join(PIPELINE_DIR, m) for m in IMAGE_MODULES])[:12]
+
+def base_digest():
+    """sha256(Dockerfile + requirements.lock): phần image mà mọi bước đều dùng"""
+    return _digest([DOCKERFILE, REQUIREMENTS_LOCK])
+
+def image_ref():
+    """Tên đầy đủ của image dùng cho các component"""
+    return f"{IMAGE_REPOSITORY}:{image_tag()}"
+
+def lock():
+    """Resolve requirements.in thành requirements.lock cho Python 3.9/Linux"""
+    subprocess.run([
+        "uv", "pip", "compile", REQUIREMENTS_IN,
+        "--python-version", PYTHON_VERSION,
+        "--python-platform", "x86_64-manylinux_2_28",
+        "--custom-compile-command", "python build_image.py --lock",
+        "-o", REQUIREMENTS_LOCK
+    ], check=True)
+
+def build(push=False):
+    ref = image_ref()
+    subprocess.run(["docker", "build", "-t", ref, "-f", DOCKERFILE, PIPELINE_DIR], check=True)
+    if push:
+        subprocess.run(["docker", "push", ref], check=True)
+    print(f"Image: {ref}")
+    return ref
+
+def step_imports(component):
+    """Các module mà component import (đọc từ mã nguồn hàm)"""
+    return sorted(_source_imports(inspect.getsource(getattr(component, "python_func", component))))
+
+def _source_imports(source):
+    """Tên các module được import trong một đoạn mã nguồn"""
+    modules = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.add(node.module)
+    return modules
+
+def module_digests(component):
+    """{file: sha256} của các module trong IMAGE_MODULES mà component import (kể cả gián tiếp)"""
+    image_modules = {os.path.splitext(m)[0]: m for m in IMAGE_MODULES}
+    pending = [name for name in step_imports(component) if name in image_modules]
+    used = set()
+    while pending:
+        name = pending.pop()
+        if name in used:
+            continue
+        used.add(name)
+        with open(os.path.join(PIPELINE_DIR, image_modules[name])) as f:
+            pending.extend(m for m in _source_imports(f.read()) if m in image_modules)
+    return {image_modules[name]: _digest([os.path.join(PIPELINE_DIR, image_modules[name])]) for name in sorted(used)}
+
+def time_container(image, script):
+    """Thời gian từ lúc docker run tới khi script xong, và thời gian import script tự đo"""
+    start_time = time.perf_counter()
+    result = subprocess.run(["docker", "run", "--rm", image, "sh", "-c", script],
+                            check=True, capture_output=True, text=True)
+    wall = time.perf_counter() - start_time
+    return wall, float(result.stdout.strip().splitlines()[-1])
+
+def measure(image, baseline=False):
+    """In thời gian khởi động container và import của từng bước"""
+    sys.path.insert(0, PIPELINE_DIR)
+    import kubeflow_pipeline_basic as pipeline
+
+    with open(REQUIREMENTS_IN) as f:
+        packages = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    print(f"{'step':<12} {'image':>10} {'startup_s':>10} {'import_s':>9}")
+    for step, component in pipeline.STEP_COMPONENTS.items():
+        imports = "; ".join(f"import {module}" for module in step_imports(component))
+        probe = f"python -c 'import time; t = time.perf_counter(); {imports}; print(time.perf_counter() - t)'"
+        runs = [("prebuilt", image, probe)]
+        if baseline:
+            runs.append(("pip", BASELINE_IMAGE, f"pip install -q {' '.join(packages)} >/dev/null 2>&1 && {probe}"))
+        for label, run_image, script in runs:
+            wall, import_time = time_container(run_image, script)
+            print(f"{step:<12} {label:>10} {wall:>10.2f} {import_time:>9.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Build image cho component của churn_pipeline')
+    parser.add_argument('--lock', action='store_true', help='Resolve lại requirements.lock')
+    parser.add_argument('--push', action='store_true', help='Push image sau khi build')
+    parser.add_argument('--skip-build', action='store_true', help='Không build (dùng image đã có)')
+    parser.add_argument('--measure', action='store_true', help='Đo thời gian khởi động/import từng bước')
+    parser.add_argument('--baseline', action='store_true',
+                        help='Đo thêm cách cũ (python:3.9 + pip install lúc khởi động)')
+    args = parser.parse_args()
+
+    if args.lock:
+        lock()
+    ref = image_ref() if args.skip_build else build(push=args.push)
+    if args.measure:
+        measure(ref, baseline=args.baseline)
+
+if __name__ == "__main__":
+    main()
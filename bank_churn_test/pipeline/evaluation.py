@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""Đánh giá model phân loại nhị phân: metric mở rộng + khoảng tin cậy bootstrap
+
+Tập test được sort theo score một lần. Mọi metric được tính từ một ma trận trọng
+số W (số dòng của mỗi đoạn score/nhãn/dự đoán trong mỗi mẫu): điểm ước lượng là
+W của chính tập test, bootstrap là W rút trực tiếp từ phân phối multinomial trên
+các đoạn. Ma trận nhầm lẫn, Brier và calibration là W @ cột của từng đoạn;
+ROC-AUC và PR-AUC dùng ma trận nhầm lẫn tích lũy qua mọi ngưỡng.
+
+Bootstrap chạy trên bản thô của tập test (score gom thành tối đa
+BOOTSTRAP_SCORE_CELLS ô) nên chi phí không phụ thuộc số dòng.
+
+Module được copy vào image của pipeline (xem images/Dockerfile) để evaluate_model import.
+"""
+import numpy as np
+
+CALIBRATION_BINS = 10
+BOOTSTRAP_RESAMPLES = 1000
+CONFIDENCE_LEVEL = 0.95
+# Số ô score tối đa cho bootstrap (biên theo phân vị + biên bin calibration)
+BOOTSTRAP_SCORE_CELLS = 1000
+# Số ô tối đa của ma trận trọng số mỗi lần (resamples x segments), giới hạn bộ nhớ
+MAX_BOOTSTRAP_CELLS = 2 ** 24
+
+METRICS = ["accuracy", "precision", "recall", "f1", "roc_auc", "pr_auc", "brier", "ece"]
+
+def confusion_matrix(y_true, y_pred):
+    """Ma trận nhầm lẫn [[tn, fp], [fn, tp]] bằng một lần bincount"""
+    cells = 2 * np.asarray(y_true, dtype=np.int64) + np.asarray(y_pred, dtype=np.int64)
+    return np.bincount(cells, minlength=4).reshape(2, 2)
+
+class _Prepared:
+    """Những gì chỉ phụ thuộc dữ liệu test, tính một lần cho cả điểm ước lượng lẫn bootstrap
+
+    Các dòng được sort một lần (score giảm dần) rồi gom thành đoạn liên tiếp có cùng
+    score, nhãn và dự đoán; mọi metric chỉ phụ thuộc trọng số của từng đoạn.
+
+    Với score_cells, score được thay bằng chỉ số ô (biên theo phân vị, cộng biên các bin
+    calibration để mỗi ô nằm trọn trong một bin): số đoạn bị chặn bởi khoảng 4 x score_cells.
+    Các dòng trong một ô được coi như cùng score; Brier/calibration dùng giá trị trung bình
+    của đoạn nên tổng theo đoạn vẫn đúng.
+    """
+
+    def __init__(self, y_true, y_pred, y_prob, bins, score_cells=None):
+        y_true = np.asarray(y_true).astype(bool)
+        y_pred = np.asarray(y_pred).astype(bool)
+        y_prob = np.asarray(y_prob, dtype=np.float64)
+        self.n = len(y_true)
+        self.bin_edges = np.linspace(0.0, 1.0, bins + 1)
+
+        score = y_prob
+        if score_cells:
+            edges = np.unique(np.r_[np.quantile(y_prob, np.linspace(0, 1, score_cells + 1)[1:-1]),
+                                    self.bin_edges[1:-1]])
+            score = np.searchsorted(edges, y_prob, side="right")
+
+        # Score giảm dần; cùng score thì dòng dương đứng trước để mỗi đoạn chỉ có một nhãn
+        order = np.lexsort((~y_pred, ~y_true, -score))
+        y_true, y_pred, y_prob, score = y_true[order], y_pred[order], y_prob[order], score[order]
+        new_group = np.r_[True, score[1:] != score[:-1]]
+        new_segment = new_group | np.r_[True, (y_true[1:] != y_true[:-1]) | (y_pred[1:] != y_pred[:-1])]
+        starts = np.flatnonzero(new_segment)
+        self.segments = len(starts)
+        self.segment_rows = np.diff(np.r_[starts, self.n]).astype(np.float64)
+
+        segment_true = y_true[starts]
+        segment_pred = y_pred[starts]
+        # Trung bình của đoạn (bằng chính score khi đoạn chỉ có một giá trị score)
+        segment_prob = np.add.reduceat(y_prob, starts) / self.segment_rows
+        segment_squared = np.add.reduceat((y_prob - y_true) ** 2, starts) / self.segment_rows
+        self.segment_positive = segment_true.astype(np.float64)
+
+        # Đoạn đầu của mỗi nhóm score bằng nhau (None khi không có score trùng)
+        group_starts = np.flatnonzero(new_group[starts])
+        self.group_starts = None if len(group_starts) == self.segments else group_starts
+
+        # Calibration theo bin xác suất (mọi dòng của một đoạn cùng bin)
+        self.bin_index = np.clip(np.digitize(y_prob[starts], self.bin_edges[1:-1]), 0, bins - 1)
+        residual = np.zeros((self.segments, bins))
+        residual[np.arange(self.segments), self.bin_index] = segment_prob - segment_true
+
+        # Cột cho một phép nhân ma trận: 4 ô nhầm lẫn (tn, fp, fn, tp), sai số bình phương,
+        # tổng (xác suất - nhãn) của từng bin
+        self.columns = np.column_stack([
+            ~segment_true & ~segment_pred, ~segment_true & segment_pred,
+            segment_true & ~segment_pred, segment_true & segment_pred,
+            segment_squared, residual
+        ]).astype(np.float64)
+        self.segment_prob = segment_prob
+
+def _weighted_metrics(prepared, weights):
+    """Metric cho từng hàng của ma trận trọng số đoạn (resamples x segments)
+
+    Trọng số là số dòng (nguyên), mỗi hàng có tổng bằng prepared.n (bootstrap lấy đúng n dòng).
+    """
+    n = prepared.n
+    sums = weights @ prepared.columns
+    tn, fp, fn, tp = sums[:, :4].T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accuracy = (tp + tn) / n
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        brier = sums[:, 4] / n
+        ece = np.abs(sums[:, 5:]).sum(axis=1) / n
+
+        # Ma trận nhầm lẫn tích lũy qua mọi ngưỡng (score giảm dần, khi hòa dòng dương đứng trước)
+        positive_w = weights * prepared.segment_positive
+        negative_w = weights - positive_w
+        tp_cum = np.cumsum(positive_w, axis=1)
+        all_cum = np.cumsum(weights, axis=1)
+        positives = tp_cum[:, -1]
+        negatives = n - positives
+        if prepared.group_starts is None:
+            # AUC: mỗi dòng âm cộng số dòng dương có score cao hơn nó
+            concordant = np.einsum("ij,ij->i", negative_w, tp_cum)
+            # Average precision: precision tại mỗi dòng dương nhân phần recall tăng thêm
+            precision_sum = np.einsum("ij,ij->i", positive_w, tp_cum / np.maximum(all_cum, 1))
+        else:
+            # Có score trùng: cặp dương/âm cùng score tính 1/2, precision lấy ở cuối nhóm
+            group_positive = np.add.reduceat(positive_w, prepared.group_starts, axis=1)
+            group_negative = np.add.reduceat(negative_w, prepared.group_starts, axis=1)
+            concordant = np.einsum("ij,ij->i", negative_w, tp_cum) \
+                - 0.5 * np.einsum("ij,ij->i", group_positive, group_negative)
+            group_ends = np.r_[prepared.group_starts[1:] - 1, prepared.segments - 1]
+            precision_sum = np.einsum("ij,ij->i", group_positive,
+                                      tp_cum[:, group_ends] / np.maximum(all_cum[:, group_ends], 1))
+        roc_auc = concordant / (positives * negatives)
+        pr_auc = precision_sum / positives
+
+    return {
+        "accuracy": accuracy, "precision": precision, "recall": recall, "f1": f1,
+        "roc_auc": roc_auc, "pr_auc": pr_auc, "brier": brier, "ece": ece
+    }
+
+def bootstrap_intervals(prepared, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE_LEVEL, seed=42):
+    """Khoảng tin cậy percentile của từng metric
+
+    Lấy n dòng có hoàn lại chỉ quyết định số dòng rút được từ mỗi đoạn, tức
+    multinomial(n, số dòng của đoạn / n): ma trận trọng số (resamples x segments) được
+    rút trực tiếp, nên chi phí theo số đoạn chứ không theo số dòng. Chia theo
+    MAX_BOOTSTRAP_CELLS khi có nhiều đoạn.
+    """
+    rng = np.random.default_rng(seed)
+    probabilities = prepared.segment_rows / prepared.n
+    chunk = max(1, min(resamples, MAX_BOOTSTRAP_CELLS // prepared.segments))
+    samples = {name: [] for name in METRICS}
+    for start in range(0, resamples, chunk):
+        size = min(chunk, resamples - start)
+        weights = rng.multinomial(prepared.n, probabilities, size=size)
+        values = _weighted_metrics(prepared, weights.astype(np.float64))
+        for name in METRICS:
+            samples[name].append(values[name])
+
+    tail = (1 - confidence) / 2 * 100
+    intervals = {}
+    for name in METRICS:
+        low, high = np.nanpercentile(np.concatenate(samples[name]), [tail, 100 - tail])
+        intervals[name] = (float(low), float(high))
+    return intervals
+
+def evaluate(y_true, y_pred, y_prob, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE_LEVEL,
+             bins=CALIBRATION_BINS, seed=42):
+    """Đánh giá đầy đủ trên tập test
+
+    Args:
+        y_true: nhãn thật (0/1)
+        y_pred: nhãn dự đoán của model (0/1)
+        y_prob: xác suất lớp dương
+        resamples: số mẫu bootstrap (0 để bỏ qua khoảng tin cậy)
+
+    Returns:
+        dict gồm metrics (số thực), confusion_matrix, calibration và intervals
+    """
+    prepared = _Prepared(y_true, y_pred, y_prob, bins)
+    segment_rows = prepared.segment_rows
+    values = _weighted_metrics(prepared, segment_rows[None, :])
+    tn, fp, fn, tp = confusion_matrix(y_true, y_pred).ravel()
+
+    counts = np.bincount(prepared.bin_index, weights=segment_rows, minlength=bins)
+    prob_sums = np.bincount(prepared.bin_index, weights=segment_rows * prepared.segment_prob, minlength=bins)
+    positive_sums = np.bincount(prepared.bin_index, weights=segment_rows * prepared.segment_positive, minlength=bins)
+    populated = counts > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_predicted = prob_sums / counts
+        fraction_positive = positive_sums / counts
+    report = {
+        "metrics": {name: float(values[name][0]) for name in METRICS},
+        "confusion_matrix": [[int(tn), int(fp)], [int(fn), int(tp)]],
+        "calibration": {
+            "bin_edges": prepared.bin_edges.tolist(),
+            "counts": counts.astype(int).tolist(),
+            # Bin rỗng được bỏ qua thay vì ghi NaN (output phải là JSON hợp lệ)
+            "mean_predicted": [float(v) if ok else None for v, ok in zip(mean_predicted, populated)],
+            "fraction_positive": [float(v) if ok else None for v, ok in zip(fraction_positive, populated)]
+        },
+        "intervals": {}
+    }
+    if resamples:
+        # Nhiều score khác nhau: bootstrap trên bản thô (điểm ước lượng ở trên vẫn chính xác)
+        if prepared.segments > BOOTSTRAP_SCORE_CELLS:
+            prepared = _Prepared(y_true, y_pred, y_prob, bins, score_cells=BOOTSTRAP_SCORE_CELLS)
+        report["intervals"] = {
+            name: {"low": low, "high": high, "confidence": confidence}
+            for name, (low, high) in bootstrap_intervals(prepared, resamples, confidence, seed).items()
+        }
+    return report
+
+def flat_metrics(report):
+    """Metric dạng phẳng cho MLflow: giá trị + cận dưới/trên của khoảng tin cậy"""
+    flat = dict(report["metrics"])
+    for name, interval in report["intervals"].items():
+        flat[f"{name}_ci_low"] = interval["low"]
+        flat[f"{name}_ci_high"] = interval["high"]
+    return flat
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""Định dạng scoring gọn cho model churn và bộ chấm điểm chỉ dùng NumPy
+
+export_model gộp StandardScaler vào model đã train rồi ghi một file .npz:
+- Logistic Regression: w = coef / scale, b = intercept - w · mean (kèm mean/scale/coef/intercept gốc)
+- Gradient Boosting: các cây được xếp thành cây nhị phân đầy đủ (feature, ngưỡng, giá trị lá),
+  ngưỡng được đổi về đơn vị gốc: t_gốc = t * scale + mean
+
+FastScorer nhận feature gốc (Geography/Gender đã mã hóa theo categories, xem encode)
+nên tiền xử lý và dự đoán là một bước vector hóa: một phép nhân ma trận cho model
+tuyến tính, hoặc mọi cây cùng đi xuống từng tầng cho Gradient Boosting.
+
+Module được copy vào image của pipeline (xem images/Dockerfile) để train_model import.
+"""
+import json
+
+import numpy as np
+
+SCORING_FORMAT_VERSION = 1
+# Sai lệch decision function tối đa cho phép khi tự kiểm tra lúc export
+EXPORT_TOLERANCE = 1e-6
+# Số dòng mỗi lần duyệt cây (ma trận vị trí rows x trees nhỏ, nằm gọn trong cache)
+TREE_BATCH_ROWS = 256
+
+def _linear_arrays(model, mean, scale):
+    coef = model.coef_[0].astype(np.float64)
+    intercept = float(model.intercept_[0])
+    weights = coef / scale
+    return {
+        "weights": weights,
+        "bias": np.array(intercept - weights @ mean),
+        "coef": coef,
+        "intercept": np.array(intercept),
+    }
+
+def _tree_arrays(model, mean, scale):
+    """Xếp các cây của GradientBoostingClassifier (nhị phân) thành cây nhị phân đầy đủ
+
+    Mỗi cây có 2^depth - 1 node trong (đánh số kiểu heap: con của i là 2i+1, 2i+2)
+    và 2^depth lá; lá nằm ở tầng nông hơn được đẩy xuống bằng node luôn đi sang trái.
+    """
+    trees = [estimator[0].tree_ for estimator in model.estimators_]
+    depth = max(tree.max_depth for tree in trees)
+    internal = 2 ** depth - 1
+    feature = np.zeros((len(trees), internal), dtype=np.int32)
+    threshold = np.full((len(trees), internal), np.inf)
+    leaf_value = np.zeros((len(trees), internal + 1))
+    for t, tree in enumerate(trees):
+        stack = [(0, 0)]
+        while stack:
+            node, position = stack.pop()
+            if position >= internal:
+                leaf_value[t, position - internal] = tree.value[node, 0, 0] * model.learning_rate
+            elif tree.children_left[node] == -1:
+                # Lá sớm: ngưỡng inf nên luôn đi trái, mang giá trị lá xuống tầng cuối
+                stack.append((node, 2 * position + 1))
+            else:
+                f = tree.feature[node]
+                feature[t, position] = f
+                threshold[t, position] = tree.threshold[node] * scale[f] + mean[f]
+                stack.append((tree.children_left[node], 2 * position + 1))
+                stack.append((tree.children_right[node], 2 * position + 2))
+    # Giá trị khởi tạo: log-odds của tỷ lệ lớp dương (init mặc định của sklearn)
+    prior = model.init_.class_prior_[1]
+    return {
+        "feature": feature,
+        "threshold": threshold,
+        "leaf_value": leaf_value,
+        "init": np.array(np.log(prior / (1 - prior))),
+    }
+
+def export_model(model, scaler, feature_names, categories, path, check_inputs=None):
+    """Ghi model + scaler thành file scoring gọn
+
+    Args:
+        model: LogisticRegression hoặc GradientBoostingClassifier đã train trên dữ liệu đã scale
+        scaler: StandardScaler đã fit (mean_, scale_)
+        feature_names: thứ tự feature
+        categories: dict {cột categorical: danh sách giá trị theo mã}
+        path: file .npz đầu ra
+        check_inputs: ma trận đã scale để đối chiếu với model.decision_function (tùy chọn)
+    """
+    mean = np.asarray(scaler.mean_, dtype=np.float64)
+    scale = np.asarray(scaler.scale_, dtype=np.float64)
+    if hasattr(model, "coef_"):
+        kind, arrays = "linear", _linear_arrays(model, mean, scale)
+    elif hasattr(model, "estimators_"):
+        kind, arrays = "tree_ensemble", _tree_arrays(model, mean, scale)
+    else:
+        raise ValueError(f"Không hỗ trợ export model {type(model).__name__}")
+
+    meta = {
+        "version": SCORING_FORMAT_VERSION,
+        "kind": kind,
+        "estimator": type(model).__name__,
+        "feature_names": list(feature_names),
+        "categories": {column: [str(c) for c in values] for column, values in categories.items()},
+    }
+    np.savez(path, meta=np.array(json.dumps(meta)), mean=mean, scale=scale, **arrays)
+
+    if check_inputs is not None:
+        check_inputs = np.asarray(check_inputs, dtype=np.float64)
+        expected = model.decision_function(check_inputs)
+        actual = FastScorer.load(path).decision_function(check_inputs * scale + mean)
+        error = float(np.max(np.abs(expected - actual), initial=0.0))
+        if error > EXPORT_TOLERANCE:
+            raise ValueError(f"Scoring artifact lệch model {error:.3g} > {EXPORT_TOLERANCE}")
+    return path
+
+class FastScorer:
+    """Chấm điểm từ file scoring gọn, chỉ cần NumPy"""
+
+    def __init__(self, arrays):
+        self.meta = json.loads(str(arrays["meta"]))
+        self.kind = self.meta["kind"]
+        self.feature_names = self.meta["feature_names"]
+        self.categories = self.meta["categories"]
+        self.arrays = {name: arrays[name] for name in arrays.files if name != "meta"}
+        if self.kind == "linear":
+            self.weights = self.arrays["weights"]
+            self.bias = float(self.arrays["bias"])
+        else:
+            self.feature = self.arrays["feature"]
+            self.threshold = self.arrays["threshold"]
+            self.leaf_value = self.arrays["leaf_value"]
+            self.init = float(self.arrays["init"])
+            self.internal = self.feature.shape[1]
+            self.depth = int(np.log2(self.internal + 1))
+            self.tree_index = np.arange(self.feature.shape[0])
+            # Chỉ số phẳng: node i của cây t nằm ở tree_roots[t] + i
+            self.tree_roots = self.tree_index * self.internal
+            self.node_feature = self.feature.ravel()
+            self.node_threshold = self.threshold.ravel()
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(arrays)
+
+    def encode(self, records):
+        """Đổi danh sách dict (giá trị gốc, Geography/Gender dạng chuỗi) thành ma trận feature gốc"""
+        lookup = {column: {value: code for code, value in enumerate(values)}
+                  for column, values in self.categories.items()}
+        rows = np.empty((len(records), len(self.feature_names)), dtype=np.float64)
+        for j, name in enumerate(self.feature_names):
+            if name in lookup:
+                rows[:, j] = [lookup[name][str(record[name])] for record in records]
+            else:
+                rows[:, j] = [record[name] for record in records]
+        return rows
+
+    def decision_function(self, X):
+        """Log-odds lớp dương cho ma trận feature gốc (rows x features)"""
+        X = np.asarray(X, dtype=np.float64)
+        if self.kind == "linear":
+            return X @ self.weights + self.bias
+        scores = np.empty(X.shape[0])
+        for start in range(0, X.shape[0], TREE_BATCH_ROWS):
+            batch = X[start:start + TREE_BATCH_ROWS]
+            # Mọi cây cùng đi xuống một tầng mỗi vòng, chỉ so sánh ở node đang đứng
+            row_offset = (np.arange(batch.shape[0]) * batch.shape[1])[:, None]
+            values = batch.ravel()
+            position = np.zeros((batch.shape[0], len(self.tree_roots)), dtype=np.intp)
+            for _ in range(self.depth):
+                node = self.tree_roots + position
+                go_right = values[row_offset + self.node_feature[node]] > self.node_threshold[node]
+                position = 2 * position + 1 + go_right
+            leaves = self.leaf_value[self.tree_index, position - self.internal]
+            scores[start:start + TREE_BATCH_ROWS] = self.init + leaves.sum(axis=1)
+        return scores
+
+    def predict_proba(self, X):
+        """Xác suất lớp dương"""
+        return 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+
+    def predict(self, X):
+        """Nhãn dự đoán (ngưỡng 0.5 như sklearn)"""
+        return (self.decision_function(X) > 0).astype(np.int64)
@@ -2,30 +2,74 @@ import kfp
 from kfp import dsl
 from kubernetes import client, config
 from kubernetes.client.models import V1Volume, V1VolumeMount, V1HostPathVolumeSource
+from step_cache import StepCache, step_key
+from build_image import image_ref
 
+# Image dựng sẵn từ images/requirements.lock (xem build_image.py), thay cho
+# packages_to_install: component không phải pip install lúc khởi động
+PIPELINE_IMAGE = image_ref()
 
-@dsl.component(
-    base_image="python:3.9",
-    packages_to_install=[
-        "pandas==2.1.4",
-        "scikit-learn==1.3.2",
-        "boto3==1.34.0"
-    ]
-)
+
+@dsl.component(base_image=PIPELINE_IMAGE, install_kfp_package=False)
 def preprocess_data(
     minio_endpoint: str,
     minio_access_key: str,
     minio_secret_key: str,
-    minio_bucket: str
+    minio_bucket: str,
+    chunk_rows: int = 100000,
+    cache_key: str = ""
 ) -> dict:
+    """Tiền xử lý churn.csv theo luồng, kết quả được đánh địa chỉ theo nội dung (ETag)
+
+    - Body S3 được đọc theo từng chunk chunk_rows dòng với dtype khai báo sẵn
+      (category, int32); mỗi chunk được chia train/test và ghi ngay thành shard
+      Parquet, nên bộ nhớ không phụ thuộc kích thước file
+    - Thống kê scaler tính trong một lần đọc: partial_fit cho cột số, đếm
+      category cho cột phân loại (mean/var của mã tính chính xác từ số đếm)
+    - Nếu đã có processed/{etag}/ cho đúng object hiện tại thì bỏ qua
+    - Nếu object chỉ được nối thêm dòng (phần đầu trùng hash với lần xử lý
+      trước) thì chỉ đọc phần mới bằng Range GET và cộng dồn thống kê
+    - Encoder và scaler đã fit được lưu (preprocessors.pkl) để serving dùng lại
+    - Cuối cùng mỗi split được ghi thành X_{split}.npy / y_{split}.npy đã scale
+      (điền dần qua memmap từ các shard) và liệt kê trong manifest.json, để
+      bước sau chỉ tải split cần dùng và đọc bằng memory map
+    """
     import pandas as pd
     import numpy as np
     from sklearn.model_selection import train_test_split
     from sklearn.preprocessing import StandardScaler, LabelEncoder
     import boto3
     from botocore.client import Config
+    from botocore.exceptions import ClientError
+    import hashlib
+    import json
     import pickle
+    import os
+    import shutil
+    import tempfile
     from io import BytesIO
+    from boto3.s3.transfer import TransferConfig
+    from numpy.lib.format import open_memmap
+    # Module trong image của pipeline (pipeline/step_cache.py)
+    from step_cache import write_entry
+    
+    source_key = 'churn.csv'
+    latest_key = 'processed/latest.json'
+    feature_names = ['CreditScore', 'Geography', 'Gender', 'Age', 'Tenure', 'Balance',
+                     'NumOfProducts', 'HasCrCard', 'IsActiveMember', 'EstimatedSalary']
+    categorical_columns = ['Geography', 'Gender']
+    numeric_columns = [c for c in feature_names if c not in categorical_columns]
+    # RowNumber, CustomerId, Surname không được đọc
+    dtypes = {
+        'CreditScore': 'int32', 'Geography': 'category', 'Gender': 'category',
+        'Age': 'int32', 'Tenure': 'int32', 'Balance': 'float64',
+        'NumOfProducts': 'int32', 'HasCrCard': 'int32', 'IsActiveMember': 'int32',
+        'EstimatedSalary': 'float64', 'Exited': 'int32'
+    }
+    read_size = 8 * 1024 * 1024
+    # Upload/download song song nhiều phần cho các file mảng lớn
+    transfer_config = TransferConfig(multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024,
+                                     max_concurrency=8, use_threads=True)
     
     # Khởi tạo MinIO client
     s3_client = boto3.client(
@@ -37,83 +81,420 @@ def preprocess_data(
         region_name='us-east-1'
     )
     
-    # Đọc dữ liệu từ MinIO
+    def object_exists(key):
+        try:
+            s3_client.head_object(Bucket=minio_bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+    
+    def load_json(key):
+        return json.loads(s3_client.get_object(Bucket=minio_bucket, Key=key)['Body'].read())
+    
+    def put_json(obj, key):
+        s3_client.put_object(Bucket=minio_bucket, Key=key, Body=json.dumps(obj).encode())
+    
+    class HashingReader:
+        """Bọc body S3: đọc theo luồng và cập nhật sha256 của các byte đã đọc"""
+        def __init__(self, body, sha=None):
+            self.body = body
+            self.sha = sha or hashlib.sha256()
+            self.last_byte = b''
+        def read(self, size=-1):
+            data = self.body.read(size if size and size > 0 else None)
+            if data:
+                self.sha.update(data)
+                self.last_byte = data[-1:]
+            return data
+        def drain(self):
+            while self.read(read_size):
+                pass
+    
+    # Định danh nội dung của object nguồn
     try:
-        response = s3_client.get_object(Bucket=minio_bucket, Key='churn.csv')
-        data = pd.read_csv(response['Body'])
+        head = s3_client.head_object(Bucket=minio_bucket, Key=source_key)
     except Exception as e:
         raise Exception(f"Không thể đọc dữ liệu từ MinIO: {str(e)}")
+    etag = head['ETag'].strip('"')
+    size = head['ContentLength']
+    prefix = f'processed/{etag}'
+    data_key = f'{prefix}/manifest.json'
+    preprocessors_key = f'{prefix}/preprocessors.pkl'
+    
+    # Cache hit: object không đổi kể từ lần xử lý có kết quả
+    if object_exists(data_key) and object_exists(preprocessors_key):
+        print(f"Dữ liệu đã được xử lý cho ETag {etag}, bỏ qua preprocessing")
+        manifest = load_json(data_key)
+        put_json({'etag': etag, 'size': size, 'sha256': manifest['source_sha256']}, latest_key)
+        result = {
+            'feature_names': manifest['feature_names'],
+            'data_path': f's3://{minio_bucket}/{data_key}',
+            'preprocessors_path': f's3://{minio_bucket}/{preprocessors_key}',
+            'source_etag': etag,
+            'num_rows': manifest['num_rows'],
+            'mode': 'cached'
+        }
+        # Ghi output vào cache bước (xem pipeline/step_cache.py)
+        if cache_key:
+            write_entry(s3_client, minio_bucket, cache_key, 'preprocess_data', result)
+        return result
     
-    # Preprocessing
-    data = data.drop(['RowNumber', 'CustomerId', 'Surname'], axis=1)
+    try:
+        latest = load_json(latest_key)
+    except ClientError:
+        latest = None
+    
+    # Trạng thái cộng dồn
+    numeric_scaler = StandardScaler()
+    category_counts = {column: {} for column in categorical_columns}
+    shards = {'train': [], 'test': []}
+    shard_rows = {'train': [], 'test': []}
+    num_rows = 0
+    mode = 'full'
+    reader = None
+    header = 0
+    
+    # Append: phần đầu object trùng với nội dung đã xử lý lần trước
+    if latest is not None and size > latest['size']:
+        previous_manifest_key = f"processed/{latest['etag']}/manifest.json"
+        previous_preprocessors_key = f"processed/{latest['etag']}/preprocessors.pkl"
+        if object_exists(previous_manifest_key) and object_exists(previous_preprocessors_key):
+            prefix_reader = HashingReader(s3_client.get_object(
+                Bucket=minio_bucket, Key=source_key, Range=f"bytes=0-{latest['size'] - 1}"
+            )['Body'])
+            prefix_reader.drain()
+            # Phần cũ phải kết thúc trọn dòng để phần mới đọc được như CSV độc lập
+            previous = load_json(previous_manifest_key)
+            if (prefix_reader.last_byte == b'\n' and prefix_reader.sha.hexdigest() == latest['sha256']
+                    and 'shard_rows' in previous):
+                state = pickle.loads(s3_client.get_object(
+                    Bucket=minio_bucket, Key=previous_preprocessors_key)['Body'].read())
+                numeric_scaler = state['numeric_scaler']
+                category_counts = state['category_counts']
+                shards = previous['shards']
+                shard_rows = previous['shard_rows']
+                num_rows = previous['num_rows']
+                reader = HashingReader(s3_client.get_object(
+                    Bucket=minio_bucket, Key=source_key, Range=f"bytes={latest['size']}-"
+                )['Body'], sha=prefix_reader.sha)
+                header = None
+                mode = 'incremental'
+                print(f"Chỉ xử lý phần nối thêm của {source_key} ({latest['etag']} -> {etag})")
+    
+    if reader is None:
+        reader = HashingReader(s3_client.get_object(Bucket=minio_bucket, Key=source_key)['Body'])
+    
+    # Đọc theo chunk, ghi shard ngay sau khi xử lý
+    chunks = pd.read_csv(
+        reader, chunksize=chunk_rows, header=header,
+        names=None if header == 0 else ['RowNumber', 'CustomerId', 'Surname'] + feature_names + ['Exited'],
+        usecols=feature_names + ['Exited'], dtype=dtypes
+    )
+    part = len(shards['train'])
+    new_rows = 0
+    for chunk in chunks:
+        numeric_scaler.partial_fit(chunk[numeric_columns])
+        for column in categorical_columns:
+            for category, count in chunk[column].value_counts().items():
+                category_counts[column][category] = category_counts[column].get(category, 0) + int(count)
+        
+        train_chunk, test_chunk = train_test_split(chunk, test_size=0.2, random_state=42 + part)
+        for split, frame in (('train', train_chunk), ('test', test_chunk)):
+            key = f'{prefix}/{split}/part-{part:05d}.parquet'
+            with BytesIO() as bio:
+                frame.to_parquet(bio, index=False)
+                bio.seek(0)
+                s3_client.upload_fileobj(bio, minio_bucket, key)
+            shards[split].append(key)
+            shard_rows[split].append(len(frame))
+        part += 1
+        new_rows += len(chunk)
+    reader.drain()
+    num_rows += new_rows
+    print(f"Đã xử lý {new_rows} dòng ({mode}), tổng {num_rows} dòng")
+    
+    # Encoder: classes sắp xếp như LabelEncoder.fit
+    encoders = {}
+    for column in categorical_columns:
+        encoder = LabelEncoder()
+        encoder.classes_ = np.array(sorted(category_counts[column]), dtype=object)
+        encoders[column] = encoder
+    
+    # Scaler đầy đủ: cột số từ partial_fit, cột phân loại từ số đếm của từng mã
+    mean = np.empty(len(feature_names))
+    var = np.empty(len(feature_names))
+    for i, column in enumerate(feature_names):
+        if column in categorical_columns:
+            counts = np.array([category_counts[column][c] for c in encoders[column].classes_], dtype=np.float64)
+            codes = np.arange(len(counts))
+            mean[i] = np.sum(codes * counts) / counts.sum()
+            var[i] = np.sum(counts * (codes - mean[i]) ** 2) / counts.sum()
+        else:
+            j = numeric_columns.index(column)
+            mean[i] = numeric_scaler.mean_[j]
+            var[i] = numeric_scaler.var_[j]
+    scaler = StandardScaler()
+    scaler.mean_ = mean
+    scaler.var_ = var
+    scale = np.sqrt(var)
+    scale[scale == 0] = 1.0
+    scaler.scale_ = scale
+    scaler.n_samples_seen_ = num_rows
+    scaler.n_features_in_ = len(feature_names)
+    scaler.feature_names_in_ = np.array(feature_names, dtype=object)
     
-    # Encode categorical variables
-    le = LabelEncoder()
-    data['Geography'] = le.fit_transform(data['Geography'])
-    data['Gender'] = le.fit_transform(data['Gender'])
+    with BytesIO() as bio:
+        pickle.dump({
+            'label_encoders': encoders,
+            'scaler': scaler,
+            'feature_names': feature_names,
+            'categorical_columns': categorical_columns,
+            # Trạng thái để cộng dồn khi dữ liệu được nối thêm
+            'numeric_scaler': numeric_scaler,
+            'category_counts': category_counts
+        }, bio)
+        bio.seek(0)
+        s3_client.upload_fileobj(bio, minio_bucket, preprocessors_key)
     
-    # Prepare features and target
-    y = data['Exited']
-    X = data.drop('Exited', axis=1)
+    # Mảng đã encode + scale cho từng split, điền dần từng shard vào memmap
+    workdir = tempfile.mkdtemp()
+    arrays = {}
+    try:
+        for split in ('train', 'test'):
+            rows = sum(shard_rows[split])
+            X_path = os.path.join(workdir, f'X_{split}.npy')
+            y_path = os.path.join(workdir, f'y_{split}.npy')
+            X = open_memmap(X_path, mode='w+', dtype=np.float64, shape=(rows, len(feature_names)))
+            y = open_memmap(y_path, mode='w+', dtype=np.int32, shape=(rows,))
+            offset = 0
+            for key in shards[split]:
+                frame = pd.read_parquet(BytesIO(s3_client.get_object(Bucket=minio_bucket, Key=key)['Body'].read()))
+                for column in categorical_columns:
+                    frame[column] = encoders[column].transform(frame[column].astype(object))
+                X[offset:offset + len(frame)] = scaler.transform(frame[feature_names])
+                y[offset:offset + len(frame)] = frame['Exited'].to_numpy()
+                offset += len(frame)
+            X.flush()
+            y.flush()
+            del X, y
+            
+            arrays[split] = {'X': f'{prefix}/arrays/X_{split}.npy', 'y': f'{prefix}/arrays/y_{split}.npy', 'rows': rows}
+            s3_client.upload_file(X_path, minio_bucket, arrays[split]['X'], Config=transfer_config)
+            s3_client.upload_file(y_path, minio_bucket, arrays[split]['y'], Config=transfer_config)
+            os.remove(X_path)
+            os.remove(y_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    source_sha256 = reader.sha.hexdigest()
+    put_json({
+        'feature_names': feature_names,
+        'target': 'Exited',
+        'arrays': arrays,
+        'shards': shards,
+        'shard_rows': shard_rows,
+        'num_rows': num_rows,
+        'source_etag': etag,
+        'source_sha256': source_sha256
+    }, data_key)
+    put_json({'etag': etag, 'size': size, 'sha256': source_sha256}, latest_key)
+    
+    result = {
+        'feature_names': feature_names,
+        'data_path': f's3://{minio_bucket}/{data_key}',
+        'preprocessors_path': f's3://{minio_bucket}/{preprocessors_key}',
+        'source_etag': etag,
+        'num_rows': num_rows,
+        'mode': mode
+    }
+    # Ghi output vào cache bước (xem pipeline/step_cache.py)
+    if cache_key:
+        write_entry(s3_client, minio_bucket, cache_key, 'preprocess_data', result)
+    return result
+
+@dsl.component(base_image=PIPELINE_IMAGE, install_kfp_package=False)
+def tune_hyperparameters(
+    preprocessed_data: dict,
+    minio_endpoint: str,
+    minio_access_key: str,
+    minio_secret_key: str,
+    minio_bucket: str,
+    mlflow_tracking_uri: str = "http://mlflow.kubeflow.svc.cluster.local:5000",
+    scoring: str = "f1",
+    cv: int = 3,
+    halving_factor: int = 3,
+    n_jobs: int = -1,
+    cache_key: str = ""
+) -> dict:
+    """Tìm siêu tham số bằng successive halving trên process pool local
+
+    Các ứng viên (LogisticRegression và GradientBoosting) được đánh giá song
+    song bằng joblib (process) trên X_train/y_train đọc bằng memory map từ
+    artifact .npy; mỗi vòng chỉ giữ 1/halving_factor ứng viên tốt nhất và tăng
+    số dòng huấn luyện. Chỉ tham số tốt nhất và bản tóm tắt gọn được log vào
+    MLflow.
+    """
+    import json
+    import os
+    import shutil
+    import tempfile
+    import time
+    import boto3
+    from botocore.client import Config
+    from boto3.s3.transfer import TransferConfig
+    import mlflow
+    import numpy as np
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import HalvingGridSearchCV
+    from sklearn.pipeline import Pipeline
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.ensemble import GradientBoostingClassifier
+    # Module trong image của pipeline (pipeline/step_cache.py)
+    from step_cache import write_entry
     
-    # Scale features
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    # Configure MinIO for MLflow
+    os.environ["AWS_ACCESS_KEY_ID"] = minio_access_key
+    os.environ["AWS_SECRET_ACCESS_KEY"] = minio_secret_key
+    os.environ["MLFLOW_S3_ENDPOINT_URL"] = minio_endpoint
     
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_scaled, y, test_size=0.2, random_state=42
+    # Khởi tạo MinIO client
+    s3_client = boto3.client(
+        's3',
+        endpoint_url=minio_endpoint,
+        aws_access_key_id=minio_access_key,
+        aws_secret_access_key=minio_secret_key,
+        config=Config(signature_version='s3v4'),
+        region_name='us-east-1'
     )
     
-    # Lưu dữ liệu đã xử lý vào MinIO
-    train_data = {
-        'X_train': X_train,
-        'y_train': y_train,
-        'X_test': X_test,
-        'y_test': y_test,
-        'feature_names': X.columns.tolist()
+    # Tải X_train/y_train một lần, các worker dùng chung qua memory map
+    bucket = preprocessed_data['data_path'].split('/')[2]
+    manifest_key = preprocessed_data['data_path'].split('/', 3)[3]
+    manifest = json.loads(s3_client.get_object(Bucket=bucket, Key=manifest_key)['Body'].read())
+    transfer_config = TransferConfig(multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024,
+                                     max_concurrency=8, use_threads=True)
+    workdir = tempfile.mkdtemp()
+    arrays = {}
+    for name in ('X', 'y'):
+        path = os.path.join(workdir, f'{name}_train.npy')
+        s3_client.download_file(bucket, manifest['arrays']['train'][name], path, Config=transfer_config)
+        arrays[name] = np.load(path, mmap_mode='r')
+    
+    # Không gian tìm kiếm; tên estimator khớp với train_model
+    estimators = {
+        'logistic_regression': LogisticRegression(max_iter=1000),
+        'gradient_boosting': GradientBoostingClassifier(random_state=42)
     }
+    param_grid = [
+        {
+            'model': [estimators['logistic_regression']],
+            'model__C': [0.01, 0.1, 1.0, 10.0],
+            'model__solver': ['lbfgs', 'liblinear'],
+            'model__class_weight': [None, 'balanced']
+        },
+        {
+            'model': [estimators['gradient_boosting']],
+            'model__n_estimators': [100, 200],
+            'model__learning_rate': [0.05, 0.1],
+            'model__max_depth': [2, 3]
+        }
+    ]
     
-    # Serialize data
-    with BytesIO() as bio:
-        pickle.dump(train_data, bio)
-        bio.seek(0)
-        s3_client.upload_fileobj(bio, minio_bucket, 'processed_data.pkl')
+    search = HalvingGridSearchCV(
+        Pipeline([('model', estimators['logistic_regression'])]),
+        param_grid,
+        factor=halving_factor,
+        cv=cv,
+        scoring=scoring,
+        n_jobs=n_jobs,
+        random_state=42,
+        refit=False
+    )
+    start_time = time.time()
+    search.fit(arrays['X'], arrays['y'])
+    elapsed = time.time() - start_time
+    del arrays
+    shutil.rmtree(workdir, ignore_errors=True)
+    
+    def describe(params):
+        """Tách tên estimator và tham số (bỏ tiền tố model__) để JSON hóa"""
+        estimator = params['model']
+        name = next(n for n, e in estimators.items() if type(e) is type(estimator))
+        return name, {k.split('__', 1)[1]: v for k, v in params.items() if k != 'model'}
+    
+    best_estimator, best_params = describe(search.best_params_)
+    results = search.cv_results_
+    final_iteration = results['iter'] == results['iter'].max()
+    top = np.argsort(-np.where(final_iteration, results['mean_test_score'], -np.inf))[:5]
+    summary = {
+        'scoring': scoring,
+        'elapsed_seconds': round(elapsed, 2),
+        'n_candidates': [int(n) for n in search.n_candidates_],
+        'n_resources': [int(n) for n in search.n_resources_],
+        'best': {'estimator': best_estimator, 'params': best_params, 'score': float(search.best_score_)},
+        'top_candidates': [
+            dict(zip(('estimator', 'params'), describe(results['params'][i])),
+                 score=float(results['mean_test_score'][i]), std=float(results['std_test_score'][i]))
+            for i in top if final_iteration[i]
+        ]
+    }
+    print(f"Sweep {sum(summary['n_candidates'])} lần đánh giá trong {elapsed:.1f}s, "
+          f"tốt nhất: {best_estimator} {best_params} ({scoring}={search.best_score_:.4f})")
     
-    return {
-        'feature_names': X.columns.tolist(),
-        'data_path': f's3://{minio_bucket}/processed_data.pkl'
+    # Chỉ log tham số tốt nhất và bản tóm tắt
+    mlflow.set_tracking_uri(mlflow_tracking_uri)
+    mlflow.set_experiment("bank-churn-prediction2")
+    with mlflow.start_run(run_name="hyperparameter-sweep") as run:
+        mlflow.log_params({'estimator': best_estimator, **best_params})
+        mlflow.log_metrics({f'best_cv_{scoring}': float(search.best_score_), 'sweep_seconds': elapsed})
+        mlflow.log_dict(summary, "sweep_summary.json")
+    
+    result = {
+        'estimator': best_estimator,
+        'params': best_params,
+        'cv_score': float(search.best_score_),
+        'scoring': scoring,
+        'sweep_run_id': run.info.run_id
     }
+    # Ghi output vào cache bước (xem pipeline/step_cache.py)
+    if cache_key:
+        write_entry(s3_client, minio_bucket, cache_key, 'tune_hyperparameters', result)
+    return result
 
-@dsl.component(
-    base_image="python:3.9",
-    packages_to_install=[
-        "pandas==2.1.4",
-        "scikit-learn==1.3.2",
-        "boto3==1.34.0",
-        "mlflow==2.10.2",
-        "numpy==1.26.4"
-    ]
-)
+@dsl.component(base_image=PIPELINE_IMAGE, install_kfp_package=False)
 def train_model(
     preprocessed_data: dict,
+    tuning_result: dict,
     minio_endpoint: str,
     minio_access_key: str,
     minio_secret_key: str,
     minio_bucket: str,
-    mlflow_tracking_uri: str = "http://mlflow.kubeflow.svc.cluster.local:5000"
+    mlflow_tracking_uri: str = "http://mlflow.kubeflow.svc.cluster.local:5000",
+    cache_key: str = ""
 ) -> dict:
     import pickle
+    import json
     from sklearn.linear_model import LogisticRegression
+    from sklearn.ensemble import GradientBoostingClassifier
     import boto3
     from botocore.client import Config
+    from boto3.s3.transfer import TransferConfig
     from io import BytesIO
     import os
+    import shutil
+    import tempfile
     import mlflow
     import mlflow.sklearn
     import numpy as np
     import pandas as pd
     from mlflow.models.signature import infer_signature
+    from sklearn.pipeline import Pipeline
+    # Module trong image của pipeline (pipeline/fast_scorer.py, pipeline/serving_transform.py,
+    # pipeline/step_cache.py)
+    from fast_scorer import export_model
+    import serving_transform
+    from serving_transform import RawFeatureTransformer
+    from step_cache import write_entry
     
     # Configure MinIO for MLflow
     os.environ["AWS_ACCESS_KEY_ID"] = minio_access_key
@@ -130,28 +511,53 @@ def train_model(
         region_name='us-east-1'
     )
     
-    # Đọc dữ liệu đã xử lý
-    bucket = preprocessed_data['data_path'].split('/')[2]
-    key = preprocessed_data['data_path'].split('/')[3]
+    def load_split(split):
+        """Tải X/y của split (multipart song song) và đọc bằng memory map"""
+        bucket = preprocessed_data['data_path'].split('/')[2]
+        manifest_key = preprocessed_data['data_path'].split('/', 3)[3]
+        manifest = json.loads(s3_client.get_object(Bucket=bucket, Key=manifest_key)['Body'].read())
+        transfer_config = TransferConfig(multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024,
+                                         max_concurrency=8, use_threads=True)
+        loaded = []
+        for name in ('X', 'y'):
+            path = os.path.join(workdir, f'{name}_{split}.npy')
+            s3_client.download_file(bucket, manifest['arrays'][split][name], path, Config=transfer_config)
+            loaded.append(np.load(path, mmap_mode='r'))
+        return loaded
+    
+    # Đọc dữ liệu đã xử lý (chỉ split train)
+    workdir = tempfile.mkdtemp()
+    X_train, y_train = load_split('train')
     
-    response = s3_client.get_object(Bucket=bucket, Key=key)
-    train_data = pickle.loads(response['Body'].read())
-    
-    # Create a DataFrame for the features (helps with JSON compatibility)
     feature_names = preprocessed_data['feature_names']
-    X_train_df = pd.DataFrame(train_data['X_train'], columns=feature_names)
     
-    # Train model
-    model = LogisticRegression(max_iter=1000)
-    model.fit(X_train_df, train_data['y_train'])
+    # Encoder + scaler đã fit ở preprocess_data, dùng cho tiền xử lý phía serving
+    preprocessors = pickle.loads(s3_client.get_object(
+        Bucket=minio_bucket, Key=preprocessed_data['preprocessors_path'].split('/', 3)[3])['Body'].read())
+    transformer = RawFeatureTransformer.from_preprocessors(preprocessors)
     
-    # Create a sample input for inference
-    sample_input = X_train_df.iloc[:1]
+    # Train model với tham số tốt nhất từ tune_hyperparameters
+    estimators = {
+        'logistic_regression': lambda params: LogisticRegression(max_iter=1000, **params),
+        'gradient_boosting': lambda params: GradientBoostingClassifier(random_state=42, **params)
+    }
+    model = estimators[tuning_result['estimator']](tuning_result['params'])
+    model.fit(X_train, y_train)
+    model_params = {'estimator': tuning_result['estimator'], **tuning_result['params']}
+    
+    # Model phục vụ: nhận feature gốc, tự mã hóa + scale theo batch rồi mới dự đoán
+    serving_model = Pipeline([('features', transformer), ('model', model)])
+    
+    # Feature gốc của một phần tập train (khôi phục từ dữ liệu đã scale) cho signature/input example
+    raw_sample = pd.DataFrame(transformer.inverse_transform(X_train[:1000]).round(6), columns=feature_names)
+    predictions = serving_model.predict(raw_sample)
+    if not np.array_equal(predictions, model.predict(X_train[:1000])):
+        raise ValueError("Pipeline phục vụ cho kết quả khác model trên dữ liệu đã scale")
+    sample_input = raw_sample.iloc[:1]
     
     # Infer the model signature from inputs
     # This helps MLServer understand the expected input format
-    predictions = model.predict(X_train_df)
-    signature = infer_signature(X_train_df, predictions)
+    signature = infer_signature(raw_sample, predictions)
     
     # Set up MLflow
     mlflow.set_tracking_uri(mlflow_tracking_uri)
@@ -159,14 +565,12 @@ def train_model(
     
     # Log model with MLflow
     with mlflow.start_run() as run:
-        mlflow.log_params({
-            'max_iter': 1000,
-            'solver': 'lbfgs'
-        })
+        mlflow.log_params(model_params)
+        mlflow.set_tag('sweep_run_id', tuning_result['sweep_run_id'])
         
         # Log the model using MLflow with signature and input example
         mlflow.sklearn.log_model(
-            model, 
+            serving_model, 
             "model",
             signature=signature,
             input_example=sample_input,
@@ -174,58 +578,86 @@ def train_model(
                 "scikit-learn==1.3.2",
                 "pandas==2.1.4",
                 "numpy==1.26.4"
-            ]
+            ],
+            # RawFeatureTransformer được import khi MLServer load model
+            code_paths=[serving_transform.__file__],
+            # Ghi rõ: MLflow mới mặc định dùng skops, vốn từ chối RawFeatureTransformer và Tree
+            # của GradientBoosting (chạy local_runner.py với mlflow chưa pin)
+            serialization_format="cloudpickle"
         )
         model_uri = f"runs:/{run.info.run_id}/model"
         
-        # Save model to MinIO as well (for compatibility with evaluate_model)
+        # Save model to MinIO as well (for compatibility with evaluate_model, nhận dữ liệu đã scale).
+        # Khóa theo run để output đã cache luôn trỏ tới đúng model của run đó
+        model_key = f'models/{run.info.run_id}/model.pkl'
         with BytesIO() as bio:
             pickle.dump(model, bio)
             bio.seek(0)
-            s3_client.upload_fileobj(bio, minio_bucket, 'model.pkl')
+            s3_client.upload_fileobj(bio, minio_bucket, model_key)
             
         # Also save the schema information for reference
         schema_info = {
             "feature_names": feature_names,
+            # Loại feature cho drift detection (categorical dùng chi-square/JS thay vì KS)
+            "feature_types": {
+                name: ("categorical" if name in ("Geography", "Gender", "NumOfProducts", "HasCrCard", "IsActiveMember")
+                       else "continuous")
+                for name in feature_names
+            },
             "sample_input_json": sample_input.to_dict(orient="split"),
             "signature": str(signature)
         }
         
         mlflow.log_dict(schema_info, "model_schema.json")
+        
+        # File scoring gọn (scaler gộp vào model, chấm điểm chỉ cần NumPy), tự đối chiếu với model
+        scoring_file = os.path.join(workdir, 'scoring.npz')
+        export_model(
+            model, preprocessors['scaler'], feature_names,
+            {column: list(encoder.classes_) for column, encoder in preprocessors['label_encoders'].items()},
+            scoring_file, check_inputs=X_train[:5000]
+        )
+        mlflow.log_artifact(scoring_file, artifact_path="scoring")
+        scoring_key = f'scoring/{run.info.run_id}/scoring.npz'
+        s3_client.upload_file(scoring_file, minio_bucket, scoring_key)
+    shutil.rmtree(workdir, ignore_errors=True)
     
-    return {
-        'model_path': f's3://{minio_bucket}/model.pkl',
+    result = {
+        'model_path': f's3://{minio_bucket}/{model_key}',
         'mlflow_model_uri': model_uri,
         'mlflow_run_id': run.info.run_id,
+        'scoring_path': f's3://{minio_bucket}/{scoring_key}',
         'feature_names': preprocessed_data['feature_names'],
-        'model_params': {
-            'max_iter': 1000,
-            'solver': 'lbfgs'
-        }
+        'model_params': model_params
     }
+    # Ghi output vào cache bước (xem pipeline/step_cache.py)
+    if cache_key:
+        write_entry(s3_client, minio_bucket, cache_key, 'train_model', result)
+    return result
 
-@dsl.component(
-    base_image="python:3.9",
-    packages_to_install=[
-        "pandas==2.1.4",
-        "scikit-learn==1.3.2",
-        "boto3==1.34.0"
-    ]
-)
+@dsl.component(base_image=PIPELINE_IMAGE, install_kfp_package=False)
 def evaluate_model(
     model_info: dict,
     preprocessed_data: dict,
     minio_endpoint: str,
     minio_access_key: str,
     minio_secret_key: str,
-    minio_bucket: str
+    minio_bucket: str,
+    bootstrap_resamples: int = 1000,
+    cache_key: str = ""
 ) -> dict:
     import pickle
-    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+    import json
     import boto3
     from botocore.client import Config
-    from io import BytesIO
+    from boto3.s3.transfer import TransferConfig
+    import os
+    import shutil
+    import tempfile
     import numpy as np
+    # Module trong image của pipeline (pipeline/evaluation.py, pipeline/step_cache.py)
+    from evaluation import evaluate, flat_metrics
+    from step_cache import write_entry
     
     # Khởi tạo MinIO client
     s3_client = boto3.client(
@@ -239,56 +671,71 @@ def evaluate_model(
     
     # Đọc model
     bucket = model_info['model_path'].split('/')[2]
-    key = model_info['model_path'].split('/')[3]
+    key = model_info['model_path'].split('/', 3)[3]
     response = s3_client.get_object(Bucket=bucket, Key=key)
     model = pickle.loads(response['Body'].read())
     
-    # Đọc dữ liệu test
-    bucket = preprocessed_data['data_path'].split('/')[2]
-    key = preprocessed_data['data_path'].split('/')[3]
-    response = s3_client.get_object(Bucket=bucket, Key=key)
-    test_data = pickle.loads(response['Body'].read())
+    def load_split(split):
+        """Tải X/y của split (multipart song song) và đọc bằng memory map"""
+        bucket = preprocessed_data['data_path'].split('/')[2]
+        manifest_key = preprocessed_data['data_path'].split('/', 3)[3]
+        manifest = json.loads(s3_client.get_object(Bucket=bucket, Key=manifest_key)['Body'].read())
+        transfer_config = TransferConfig(multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024,
+                                         max_concurrency=8, use_threads=True)
+        loaded = []
+        for name in ('X', 'y'):
+            path = os.path.join(workdir, f'{name}_{split}.npy')
+            s3_client.download_file(bucket, manifest['arrays'][split][name], path, Config=transfer_config)
+            loaded.append(np.load(path, mmap_mode='r'))
+        return loaded
+    
+    # Đọc dữ liệu test (chỉ split test)
+    workdir = tempfile.mkdtemp()
+    X_test, y_test = load_split('test')
     
     # Make predictions
-    y_pred = model.predict(test_data['X_test'])
-    
-    # Calculate metrics
-    metrics = {
-        'accuracy': float(accuracy_score(test_data['y_test'], y_pred)),
-        'precision': float(precision_score(test_data['y_test'], y_pred)),
-        'recall': float(recall_score(test_data['y_test'], y_pred)),
-        'f1': float(f1_score(test_data['y_test'], y_pred))
-    }
+    y_pred = model.predict(X_test)
+    y_prob = model.predict_proba(X_test)[:, 1]
+    
+    # Ma trận nhầm lẫn, metric (kể cả ROC-AUC, PR-AUC, calibration) và khoảng tin cậy bootstrap
+    evaluation = evaluate(y_test, y_pred, y_prob, resamples=bootstrap_resamples)
+    metrics = flat_metrics(evaluation)
     
-    # Get feature importance
+    # Get feature importance (hệ số cho model tuyến tính, importance cho model cây)
+    importance = model.coef_[0] if hasattr(model, 'coef_') else model.feature_importances_
     feature_importance = dict(zip(
         model_info['feature_names'],
-        model.coef_[0].tolist()
+        importance.tolist()
     ))
+    shutil.rmtree(workdir, ignore_errors=True)
     
-    return {
+    result = {
         'metrics': metrics,
+        'evaluation': {key: evaluation[key] for key in ('confusion_matrix', 'calibration', 'intervals')},
         'feature_importance': feature_importance,
         'model_params': model_info['model_params']
     }
+    # Ghi output vào cache bước (xem pipeline/step_cache.py)
+    if cache_key:
+        write_entry(s3_client, minio_bucket, cache_key, 'evaluate_model', result)
+    return result
 
-@dsl.component(
-    base_image="python:3.9",
-    packages_to_install=[
-        "mlflow==2.10.2",
-        "boto3==1.34.0"
-    ]
-)
+@dsl.component(base_image=PIPELINE_IMAGE, install_kfp_package=False)
 def log_to_mlflow(
     results: dict,
     mlflow_tracking_uri: str,
     minio_endpoint: str,
     minio_access_key: str,
     minio_secret_key: str,
-    minio_bucket: str
+    minio_bucket: str,
+    cache_key: str = ""
 ) -> None:
     import mlflow
     import os
+    import boto3
+    from botocore.client import Config
+    # Module trong image của pipeline (pipeline/step_cache.py)
+    from step_cache import write_entry
     
     # Configure MinIO for MLflow
     os.environ["AWS_ACCESS_KEY_ID"] = minio_access_key
@@ -311,64 +758,165 @@ def log_to_mlflow(
         
         # Log feature importance
         mlflow.log_dict(results["feature_importance"], "feature_importance.json")
+        
+        # Ma trận nhầm lẫn, calibration và khoảng tin cậy
+        if "evaluation" in results:
+            mlflow.log_dict(results["evaluation"], "evaluation.json")
 
-@dsl.pipeline(
-    name="Bank Churn Prediction Pipeline",
-    description="Predicts customer churn using Logistic Regression with MinIO storage"
-)
-def churn_pipeline():
-    # MinIO configuration
-    minio_endpoint = "http://minio-service.kubeflow.svc.cluster.local:9000"
-    minio_access_key = "minio"
-    minio_secret_key = "minio123"
-    minio_bucket = "mlflow-artifacts"
-    
-    # Preprocess data
-    preprocess = preprocess_data(
-        minio_endpoint=minio_endpoint,
-        minio_access_key=minio_access_key,
-        minio_secret_key=minio_secret_key,
-        minio_bucket=minio_bucket
-    )
-    
-    # Train model
-    train = train_model(
-        preprocessed_data=preprocess.output,
-        minio_endpoint=minio_endpoint,
-        minio_access_key=minio_access_key,
-        minio_secret_key=minio_secret_key,
-        minio_bucket=minio_bucket
-    )
-    
-    # Evaluate model
-    evaluate = evaluate_model(
-        model_info=train.output,
-        preprocessed_data=preprocess.output,
-        minio_endpoint=minio_endpoint,
-        minio_access_key=minio_access_key,
-        minio_secret_key=minio_secret_key,
-        minio_bucket=minio_bucket
-    )
-    
-    # Log to MLflow
-    log_mlflow = log_to_mlflow(
-        results=evaluate.output,
-        mlflow_tracking_uri="http://mlflow.kubeflow.svc.cluster.local:5000",
-        minio_endpoint=minio_endpoint,
-        minio_access_key=minio_access_key,
-        minio_secret_key=minio_secret_key,
-        minio_bucket=minio_bucket
+    # Ghi output vào cache bước (xem pipeline/step_cache.py)
+    if cache_key:
+        s3_client = boto3.client(
+            's3',
+            endpoint_url=minio_endpoint,
+            aws_access_key_id=minio_access_key,
+            aws_secret_access_key=minio_secret_key,
+            config=Config(signature_version='s3v4'),
+            region_name='us-east-1'
+        )
+        write_entry(s3_client, minio_bucket, cache_key, 'log_to_mlflow', None)
+
+# MinIO / MLflow configuration
+MINIO_ENDPOINT = "http://minio-service.kubeflow.svc.cluster.local:9000"
+MINIO_ACCESS_KEY = "minio"
+MINIO_SECRET_KEY = "minio123"
+MINIO_BUCKET = "mlflow-artifacts"
+MLFLOW_TRACKING_URI = "http://mlflow.kubeflow.svc.cluster.local:5000"
+
+STEPS = ["preprocess", "tune", "train", "evaluate", "log_mlflow"]
+STEP_UPSTREAM = {
+    "preprocess": [],
+    "tune": ["preprocess"],
+    "train": ["preprocess", "tune"],
+    "evaluate": ["preprocess", "train"],
+    "log_mlflow": ["evaluate"]
+}
+STEP_COMPONENTS = {
+    "preprocess": preprocess_data,
+    "tune": tune_hyperparameters,
+    "train": train_model,
+    "evaluate": evaluate_model,
+    "log_mlflow": log_to_mlflow
+}
+
+def plan_cache(s3_client, bucket=MINIO_BUCKET):
+    """Tính khóa cache cho từng bước và tra output đã cache trong MinIO
+
+    Returns:
+        (cache_keys, cached): dict {bước: khóa} và dict {bước: output đã cache}
+    """
+    cache = StepCache(s3_client, bucket)
+    params = {
+        "preprocess": {"chunk_rows": 100000},
+        "tune": {"mlflow_tracking_uri": MLFLOW_TRACKING_URI, "scoring": "f1", "cv": 3, "halving_factor": 3},
+        "train": {"mlflow_tracking_uri": MLFLOW_TRACKING_URI},
+        "evaluate": {"bootstrap_resamples": 1000},
+        "log_mlflow": {"mlflow_tracking_uri": MLFLOW_TRACKING_URI}
+    }
+    input_etags = {"preprocess": {"churn.csv": cache.object_etag("churn.csv")}}
+
+    cache_keys, cached = {}, {}
+    for step in STEPS:
+        cache_keys[step] = step_key(
+            STEP_COMPONENTS[step], params[step],
+            upstream_keys=[cache_keys[up] for up in STEP_UPSTREAM[step]],
+            input_etags=input_etags.get(step)
+        )
+        entry = cache.lookup(cache_keys[step])
+        # Chỉ bỏ qua bước khi mọi bước phía trên cũng được bỏ qua
+        if entry is not None and all(up in cached for up in STEP_UPSTREAM[step]):
+            cached[step] = entry["output"]
+    cache.save_index()
+    return cache_keys, cached
+
+def build_churn_pipeline(cache_keys=None, cached=None):
+    """Dựng churn_pipeline; bước có trong cached không được chạy, output cache
+    được truyền cho bước sau như hằng số"""
+    cache_keys = cache_keys or {}
+    cached = cached or {}
+
+    @dsl.pipeline(
+        name="Bank Churn Prediction Pipeline",
+        description="Predicts customer churn with a tuned classifier (Logistic Regression / Gradient Boosting) with MinIO storage"
     )
-    
-    # Set dependencies
-    train.after(preprocess)
-    evaluate.after(train)
-    log_mlflow.after(evaluate)
+    def churn_pipeline():
+        minio = dict(
+            minio_endpoint=MINIO_ENDPOINT,
+            minio_access_key=MINIO_ACCESS_KEY,
+            minio_secret_key=MINIO_SECRET_KEY,
+            minio_bucket=MINIO_BUCKET
+        )
+        tasks = {}
+
+        def output(step):
+            return cached[step] if step in cached else tasks[step].output
+
+        def add(step, component, **kwargs):
+            if step in cached:
+                return
+            task = component(**kwargs, **minio, cache_key=cache_keys.get(step, ""))
+            for up in STEP_UPSTREAM[step]:
+                if up in tasks:
+                    task.after(tasks[up])
+            tasks[step] = task
+
+        # Preprocess data
+        add("preprocess", preprocess_data)
+
+        # Hyperparameter sweep (successive halving, process pool)
+        add("tune", tune_hyperparameters,
+            preprocessed_data=output("preprocess"),
+            mlflow_tracking_uri=MLFLOW_TRACKING_URI)
+
+        # Train model
+        add("train", train_model,
+            preprocessed_data=output("preprocess"),
+            tuning_result=output("tune"),
+            mlflow_tracking_uri=MLFLOW_TRACKING_URI)
+
+        # Evaluate model
+        add("evaluate", evaluate_model,
+            model_info=output("train"),
+            preprocessed_data=output("preprocess"))
+
+        # Log to MLflow
+        add("log_mlflow", log_to_mlflow,
+            results=output("evaluate"),
+            mlflow_tracking_uri=MLFLOW_TRACKING_URI)
+
+    return churn_pipeline
+
+churn_pipeline = build_churn_pipeline()
 
 if __name__ == "__main__":
-    client = kfp.Client(host="http://localhost:8080")
-    client.create_run_from_pipeline_func(
-        churn_pipeline,
-        arguments={},
-        namespace="kubeflow"
-    )
\ No newline at end of file
+    import argparse
+    import boto3
+    from botocore.client import Config
+
+    parser = argparse.ArgumentParser(description='Submit churn pipeline với cache theo nội dung')
+    parser.add_argument('--host', default="http://localhost:8080", help='Kubeflow Pipelines API')
+    parser.add_argument('--minio-endpoint', default="http://localhost:9000", help='MinIO endpoint để tra cache')
+    parser.add_argument('--no-cache', action='store_true', help='Chạy lại mọi bước')
+    args = parser.parse_args()
+
+    s3_client = boto3.client(
+        's3',
+        endpoint_url=args.minio_endpoint,
+        aws_access_key_id=MINIO_ACCESS_KEY,
+        aws_secret_access_key=MINIO_SECRET_KEY,
+        config=Config(signature_version='s3v4'),
+        region_name='us-east-1'
+    )
+    cache_keys, cached = plan_cache(s3_client)
+    if args.no_cache:
+        cached = {}
+    for step in STEPS:
+        print(f"{step:<12} {cache_keys[step][:12]} {'cached' if step in cached else 'run'}")
+    if len(cached) == len(STEPS):
+        print("Mọi bước đều đã có trong cache, không cần submit")
+    else:
+        client = kfp.Client(host=args.host)
+        client.create_run_from_pipeline_func(
+            build_churn_pipeline(cache_keys, cached),
+            arguments={},
+            namespace="kubeflow"
+        )
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""Chạy churn_pipeline trên một máy, không cần Kubeflow/MinIO
+
+Các hàm component (python_func) được gọi trực tiếp theo đồ thị STEPS/STEP_UPSTREAM
+của kubeflow_pipeline_basic: bước nào có đủ output phía trên thì được đưa vào
+process pool, nên các bước độc lập chạy song song. Mỗi bước chạy trong một process
+mới (đo được bộ nhớ đỉnh riêng), boto3.client trong process đó được thay bằng
+LocalS3Client lưu object vào thư mục local, MLflow ghi vào file store local.
+
+    python local_runner.py --root /tmp/churn-local --report run.json
+    python local_runner.py --root /tmp/churn-local --no-cache --compare run.json
+"""
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from botocore.exceptions import ClientError
+
+from process_memory import peak_rss_mb
+
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(PIPELINE_DIR, "..", "dataset", "churn.csv")
+LOCAL_CREDENTIALS = dict(minio_endpoint="local", minio_access_key="local", minio_secret_key="local")
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+def _client_error(code, operation):
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+class LocalS3Client:
+    """Thay thế boto3 S3 client cho các lệnh component dùng, object = file trong root/bucket/key"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def _existing_path(self, bucket, key, operation):
+        path = self._path(bucket, key)
+        if not os.path.isfile(path):
+            raise _client_error("404" if operation == "HeadObject" else "NoSuchKey", operation)
+        return path
+
+    def head_object(self, Bucket, Key, **kwargs):
+        path = self._existing_path(Bucket, Key, "HeadObject")
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+                digest.update(block)
+        return {"ETag": f'"{digest.hexdigest()}"', "ContentLength": os.path.getsize(path)}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        path = self._existing_path(Bucket, Key, "GetObject")
+        if Range is None:
+            return {"Body": open(path, "rb"), "ContentLength": os.path.getsize(path)}
+        # Range dạng "bytes=start-end" hoặc "bytes=start-"
+        start, _, end = Range.split("=", 1)[1].partition("-")
+        with open(path, "rb") as f:
+            f.seek(int(start))
+            data = f.read(int(end) - int(start) + 1) if end else f.read()
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            if isinstance(Body, (bytes, bytearray)):
+                f.write(Body)
+            else:
+                shutil.copyfileobj(Body, f, COPY_CHUNK_SIZE)
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, **kwargs):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj)
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(Filename, path)
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        shutil.copyfile(self._existing_path(Bucket, Key, "HeadObject"), Filename)
+
+    def download_fileobj(self, Bucket, Key, Fileobj, **kwargs):
+        with open(self._existing_path(Bucket, Key, "HeadObject"), "rb") as f:
+            shutil.copyfileobj(f, Fileobj, COPY_CHUNK_SIZE)
+
+def _init_worker(root):
+    """Chạy trong process con: mọi boto3.client('s3', ...) trỏ vào thư mục local"""
+    import boto3
+    boto3.client = lambda *args, **kwargs: LocalS3Client(root)
+
+def _run_step(step, kwargs):
+    """Chạy một bước, trả về output, thời gian và bộ nhớ đỉnh của process"""
+    import kubeflow_pipeline_basic as pipeline
+
+    component = pipeline.STEP_COMPONENTS[step]
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+    output = component.python_func(**kwargs)
+    return {
+        "output": output,
+        "seconds": time.perf_counter() - start_time,
+        "cpu_seconds": time.process_time() - start_cpu,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def step_arguments(step, outputs, bucket, tracking_uri, cache_key):
+    """Tham số của một bước, giống cách build_churn_pipeline nối các bước"""
+    kwargs = dict(LOCAL_CREDENTIALS, minio_bucket=bucket, cache_key=cache_key)
+    if step == "tune":
+        kwargs.update(preprocessed_data=outputs["preprocess"], mlflow_tracking_uri=tracking_uri)
+    elif step == "train":
+        kwargs.update(preprocessed_data=outputs["preprocess"], tuning_result=outputs["tune"],
+                      mlflow_tracking_uri=tracking_uri)
+    elif step == "evaluate":
+        kwargs.update(model_info=outputs["train"], preprocessed_data=outputs["preprocess"])
+    elif step == "log_mlflow":
+        kwargs.update(results=outputs["evaluate"], mlflow_tracking_uri=tracking_uri)
+    return kwargs
+
+def run_local(root, dataset=DEFAULT_DATASET, bucket="mlflow-artifacts", workers=None, use_cache=True):
+    """Chạy cả pipeline, trả về dict {bước: thống kê}"""
+    import kubeflow_pipeline_basic as pipeline
+
+    root = os.path.abspath(root)
+    s3_client = LocalS3Client(root)
+    try:
+        s3_client.head_object(Bucket=bucket, Key="churn.csv")
+    except ClientError:
+        s3_client.upload_file(dataset, bucket, "churn.csv")
+    tracking_uri = "file://" + os.path.join(root, "mlruns")
+    # File store của MLflow bản mới cần bật rõ ràng
+    os.environ.setdefault("MLFLOW_ALLOW_FILE_STORE", "true")
+
+    cache_keys, cached = pipeline.plan_cache(s3_client, bucket)
+    if not use_cache:
+        cached = {}
+    outputs = dict(cached)
+    stats = {step: {"status": "cached", "seconds": 0.0} for step in cached}
+    pending = [step for step in pipeline.STEPS if step not in cached]
+
+    # Process mới cho mỗi bước (spawn, max_tasks_per_child=1) để bộ nhớ đỉnh là của riêng bước đó
+    executor = ProcessPoolExecutor(
+        max_workers=workers or len(pending) or 1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker, initargs=(root,),
+        max_tasks_per_child=1
+    )
+    running = {}
+    start_time = time.perf_counter()
+    with executor:
+        while pending or running:
+            for step in [s for s in pending if all(up in outputs for up in pipeline.STEP_UPSTREAM[s])]:
+                pending.remove(step)
+                kwargs = step_arguments(step, outputs, bucket, tracking_uri, cache_keys[step])
+                running[executor.submit(_run_step, step, kwargs)] = step
+                print(f"[{time.perf_counter() - start_time:7.1f}s] start {step}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                result = future.result()
+                outputs[step] = result.pop("output")
+                stats[step] = dict(result, status="ran")
+                print(f"[{time.perf_counter() - start_time:7.1f}s] done  {step} "
+                      f"({result['seconds']:.1f}s, {result['peak_rss_mb']:.0f} MB)")
+    stats["total"] = {"status": "ran", "seconds": time.perf_counter() - start_time}
+    return stats
+
+def compare(stats, baseline, tolerance):
+    """Danh sách bước chậm hơn baseline quá tolerance (tỷ lệ)"""
+    regressions = []
+    for step, base in baseline.items():
+        current = stats.get(step)
+        if not current or current["status"] != "ran" or base["status"] != "ran":
+            continue
+        for metric in ("seconds", "peak_rss_mb"):
+            if metric in base and base[metric] > 0 and current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{step}.{metric}: {base[metric]:.2f} -> {current[metric]:.2f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Chạy churn_pipeline local')
+    parser.add_argument('--root', default='./churn-local', help='Thư mục chứa object và mlruns')
+    parser.add_argument('--dataset', default=DEFAULT_DATASET, help='File churn.csv nạp vào bucket nếu chưa có')
+    parser.add_argument('--bucket', default='mlflow-artifacts', help='Tên bucket')
+    parser.add_argument('--workers', type=int, default=None, help='Số process tối đa')
+    parser.add_argument('--no-cache', action='store_true', help='Chạy lại mọi bước')
+    parser.add_argument('--report', help='Ghi thống kê từng bước ra file JSON')
+    parser.add_argument('--compare', help='File JSON của lần chạy trước để kiểm tra hồi quy')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Mức chậm/tốn bộ nhớ hơn cho phép')
+    args = parser.parse_args()
+
+    sys.path.insert(0, PIPELINE_DIR)
+    stats = run_local(args.root, args.dataset, args.bucket, args.workers, use_cache=not args.no_cache)
+
+    print(f"\n{'step':<12} {'status':>7} {'seconds':>8} {'cpu_s':>7} {'peak_mb':>8}")
+    for step, row in stats.items():
+        print(f"{step:<12} {row['status']:>7} {row['seconds']:>8.2f} "
+              f"{row.get('cpu_seconds', 0):>7.2f} {row.get('peak_rss_mb', 0):>8.0f}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(stats, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(stats, json.load(f), args.tolerance)
+        if regressions:
+            print("Hồi quy so với baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("Không có hồi quy so với baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+"""Đo bộ nhớ của process hiện tại (chỉ dùng thư viện chuẩn, import nhẹ cho process đo)"""
+import resource
+
+def peak_rss_mb():
+    """Bộ nhớ đỉnh của process (MB)
+
+    Dùng VmHWM vì ru_maxrss được giữ qua fork + exec nên process con luôn báo ít nhất
+    bằng process cha; ru_maxrss (KB trên Linux) chỉ là phương án dự phòng.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Tiền xử lý phía serving: feature gốc -> feature đã scale, giống hệt preprocess_data
+
+train_model log một sklearn Pipeline (RawFeatureTransformer + model) nên client gửi
+dòng gốc (CreditScore=650, Geography=0/1/2 hoặc "France", ...) và server tự scale.
+Transformer không gọi lại LabelEncoder/StandardScaler lúc predict: các hằng số
+được tính sẵn khi fit (mean, 1/scale, bảng mã category) và mỗi batch chỉ là một
+phép trừ + nhân vector hóa vào một buffer.
+
+Module được copy vào image của pipeline và log kèm model (code_paths) để MLServer import.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+
+class RawFeatureTransformer(BaseEstimator, TransformerMixin):
+    """Mã hóa category + StandardScaler đã fit, áp dụng cho feature gốc
+
+    Args:
+        feature_names: thứ tự feature của model
+        categories: dict {cột categorical: danh sách giá trị theo mã (LabelEncoder.classes_)}
+        mean, scale: mean_/scale_ của StandardScaler (theo feature_names)
+    """
+
+    def __init__(self, feature_names, categories, mean, scale):
+        self.feature_names = feature_names
+        self.categories = categories
+        self.mean = mean
+        self.scale = scale
+
+    @classmethod
+    def from_preprocessors(cls, preprocessors):
+        """Tạo từ preprocessors.pkl của preprocess_data"""
+        scaler = preprocessors['scaler']
+        return cls(
+            feature_names=list(preprocessors['feature_names']),
+            categories={column: [str(c) for c in encoder.classes_]
+                        for column, encoder in preprocessors['label_encoders'].items()},
+            mean=np.asarray(scaler.mean_, dtype=np.float64).tolist(),
+            scale=np.asarray(scaler.scale_, dtype=np.float64).tolist()
+        ).fit()
+
+    def fit(self, X=None, y=None):
+        """Tính sẵn hằng số cho transform; không học gì từ X"""
+        self.mean_ = np.asarray(self.mean, dtype=np.float64)
+        self.inv_scale_ = 1.0 / np.asarray(self.scale, dtype=np.float64)
+        self.n_features_in_ = len(self.feature_names)
+        return self
+
+    def _encode_categories(self, frame):
+        """Cột categorical dạng chuỗi -> mã; cột đã là số được giữ nguyên"""
+        for column, values in self.categories.items():
+            if not pd.api.types.is_numeric_dtype(frame[column]):
+                codes = pd.Categorical(frame[column].astype(str), categories=values).codes
+                if (codes < 0).any():
+                    unknown = sorted(set(frame[column].astype(str)) - set(values))
+                    raise ValueError(f"Giá trị {column} không hợp lệ: {unknown}")
+                frame[column] = codes
+        return frame
+
+    def transform(self, X):
+        """Feature gốc (DataFrame hoặc ma trận theo feature_names) -> ma trận đã scale"""
+        if isinstance(X, pd.DataFrame):
+            frame = X[self.feature_names]
+            if not all(pd.api.types.is_numeric_dtype(frame[c]) for c in self.categories):
+                frame = self._encode_categories(frame.copy())
+            X = frame.to_numpy(dtype=np.float64)
+        else:
+            X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Cần {self.n_features_in_} feature theo thứ tự {self.feature_names}")
+        # Một buffer, trừ rồi nhân tại chỗ
+        out = np.subtract(X, self.mean_)
+        out *= self.inv_scale_
+        return out
+
+    def inverse_transform(self, X):
+        """Ma trận đã scale -> feature gốc (category ở dạng mã)"""
+        return np.asarray(X, dtype=np.float64) / self.inv_scale_ + self.mean_
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(self.feature_names, dtype=object)
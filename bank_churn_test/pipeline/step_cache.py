@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""Cache kết quả từng bước của churn_pipeline theo nội dung
+
+Khóa của một bước = sha256(mã nguồn component + package, phần chung của image
+(Dockerfile, requirements.lock) + các module của image mà component import,
+tham số, khóa các bước phía trên, ETag các object đầu vào). Mỗi component nhận
+cache_key và khi chạy xong ghi output vào
+s3://{bucket}/pipeline-cache/entries/{key}.json; pipeline-cache/index.json
+gom các entry đã biết để lúc submit chỉ cần một lần đọc. Khi khóa khớp và các
+artifact mà output trỏ tới vẫn còn, bước đó không được đưa vào pipeline nữa:
+output đã cache được truyền thẳng cho bước sau như hằng số.
+"""
+import hashlib
+import inspect
+import json
+import time
+
+from botocore.exceptions import ClientError
+
+CACHE_PREFIX = "pipeline-cache"
+INDEX_KEY = f"{CACHE_PREFIX}/index.json"
+
+def entry_key(cache_key):
+    """Object chứa output đã cache của một bước"""
+    return f"{CACHE_PREFIX}/entries/{cache_key}.json"
+
+def write_entry(s3_client, bucket, cache_key, step, output):
+    """Ghi output của một bước vào cache; gọi từ component khi bước chạy xong"""
+    s3_client.put_object(
+        Bucket=bucket, Key=entry_key(cache_key),
+        Body=json.dumps({"step": step, "output": output, "created_at": time.time()}).encode()
+    )
+
+def component_fingerprint(component):
+    """Hash của những gì quyết định hành vi component: image, lệnh cài package, mã nguồn
+
+    Không dùng tag image (hash mọi module trong image): chỉ phần chung của image và
+    các module mà component thật sự import, để sửa một module chỉ đổi khóa của bước dùng nó.
+    """
+    # Import ở đây: step_cache.py cũng được copy vào image (write_entry), còn build_image thì không
+    from build_image import base_digest, module_digests
+
+    spec = getattr(component, "component_spec", None)
+    container = getattr(getattr(spec, "implementation", None), "container", None)
+    payload = {"image": base_digest(), "modules": module_digests(component)}
+    if container is not None:
+        # Lệnh của lightweight component chứa cả packages_to_install lẫn mã nguồn hàm
+        payload.update({"command": container.command, "args": container.args})
+    else:
+        payload["source"] = inspect.getsource(getattr(component, "python_func", component))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def step_key(component, params=None, upstream_keys=None, input_etags=None):
+    """Khóa cache của một bước"""
+    payload = {
+        "component": component_fingerprint(component),
+        "params": params or {},
+        "upstream": upstream_keys or [],
+        "inputs": input_etags or {}
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def _s3_paths(value):
+    """Các đường dẫn s3:// xuất hiện trong output"""
+    if isinstance(value, str):
+        return [value] if value.startswith("s3://") else []
+    if isinstance(value, dict):
+        return [p for v in value.values() for p in _s3_paths(v)]
+    if isinstance(value, (list, tuple)):
+        return [p for v in value for p in _s3_paths(v)]
+    return []
+
+class StepCache:
+    """Tra cứu/ghi index cache trên MinIO"""
+
+    def __init__(self, s3_client, bucket):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.index = self._load_index()
+        self._dirty = False
+
+    def _load_index(self):
+        try:
+            body = self.s3_client.get_object(Bucket=self.bucket, Key=INDEX_KEY)["Body"].read()
+            return json.loads(body)
+        except ClientError:
+            return {}
+
+    def _exists(self, key):
+        try:
+            self.s3_client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    def object_etag(self, key):
+        """ETag của object đầu vào (None nếu chưa có)"""
+        try:
+            return self.s3_client.head_object(Bucket=self.bucket, Key=key)["ETag"].strip('"')
+        except ClientError:
+            return None
+
+    def lookup(self, cache_key):
+        """Output đã cache của bước, hoặc None nếu chưa có/artifact đã bị xóa"""
+        entry = self.index.get(cache_key)
+        if entry is None:
+            try:
+                body = self.s3_client.get_object(Bucket=self.bucket, Key=entry_key(cache_key))["Body"].read()
+            except ClientError:
+                return None
+            entry = json.loads(body)
+            self.index[cache_key] = entry
+            self._dirty = True
+
+        for path in _s3_paths(entry["output"]):
+            bucket, key = path[len("s3://"):].split("/", 1)
+            if bucket == self.bucket and not self._exists(key):
+                self.index.pop(cache_key, None)
+                self._dirty = True
+                return None
+        return entry
+
+    def save_index(self):
+        """Ghi lại index nếu có entry mới được phát hiện"""
+        if self._dirty:
+            self.s3_client.put_object(Bucket=self.bucket, Key=INDEX_KEY,
+                                      Body=json.dumps(self.index).encode())
+            self._dirty = False
@@ -0,0 +1,120 @@
+from pyspark.sql.functions import avg, col, date_trunc, lit, max, min, rand, round as spark_round
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import time
+
+from spark_session import PROFILES, create_spark_session
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# MinIO configuration
+MINIO_BUCKET = "stock-data"
+
+# Each profile writes its own copy of the synthetic bars here (overwritten on every run)
+BENCHMARK_PATH = f"s3a://{MINIO_BUCKET}/benchmark/spark-profiles"
+BENCHMARK_ROWS = 5_000_000
+# First synthetic bar: 2025-04-30T00:00:00Z, one bar per minute like the Alpaca data
+START_EPOCH_SECONDS = 1745971200
+
+def synthetic_bars(spark, rows):
+    """
+    Minute bars with the schema written by spark-batch-processor.py
+    """
+    close = 90000 + rand(seed=1) * 10000
+    return spark.range(rows).select(
+        lit("BTC/USD").alias("symbol"),
+        (lit(START_EPOCH_SECONDS) + col("id") * 60).cast("timestamp").alias("timestamp"),
+        spark_round(close - rand(seed=2) * 50, 4).alias("open"),
+        spark_round(close + rand(seed=3) * 50, 4).alias("high"),
+        spark_round(close - rand(seed=4) * 50, 4).alias("low"),
+        spark_round(close, 4).alias("close"),
+        rand(seed=5).alias("volume"),
+        spark_round(close + rand(seed=6) * 10 - 5, 4).alias("vwap"),
+        (rand(seed=7) * 20).cast("long").alias("trades")
+    )
+
+def probe(profile, rows, master):
+    """
+    Run in a fresh process: write, full-scan and selective read timings for one profile, printed as JSON
+    """
+    spark = create_spark_session(f"SparkProfileBenchmark-{profile}", profile=profile, master=master)
+    path = f"{BENCHMARK_PATH}/{profile}"
+    try:
+        # Materialize the input first so the write timing covers only the Delta write to MinIO
+        bars = synthetic_bars(spark, rows).cache()
+        bars.count()
+
+        start_time = time.perf_counter()
+        bars.write.format("delta").mode("overwrite").save(path)
+        write_seconds = time.perf_counter() - start_time
+        detail = spark.sql(f"DESCRIBE DETAIL delta.`{path}`").collect()[0]
+        bars.unpersist()
+
+        # Full scan with aggregation, the daily statistics of read_delta_table.py
+        start_time = time.perf_counter()
+        (spark.read.format("delta").load(path)
+            .groupBy(date_trunc("day", col("timestamp")).alias("date"))
+            .agg(avg("vwap"), max("high"), min("low"))
+            .collect())
+        scan_seconds = time.perf_counter() - start_time
+
+        # Selective read of one day into pandas (Arrow)
+        start_time = time.perf_counter()
+        day = (spark.read.format("delta").load(path)
+            .filter(col("timestamp") < (lit(START_EPOCH_SECONDS) + 86400).cast("timestamp"))
+            .toPandas())
+        pandas_seconds = time.perf_counter() - start_time
+
+        print(json.dumps({
+            "profile": profile,
+            "rows": rows,
+            "bytes": int(detail["sizeInBytes"]),
+            "files": int(detail["numFiles"]),
+            "write_seconds": write_seconds,
+            "scan_seconds": scan_seconds,
+            "pandas_rows": len(day),
+            "pandas_seconds": pandas_seconds
+        }))
+    finally:
+        spark.stop()
+
+def run_probe(profile, rows, master):
+    # S3A settings are fixed once the filesystem exists in the JVM, so each profile gets its own process
+    result = subprocess.run(
+        [sys.executable, __file__, "--probe", profile, "--rows", str(rows), "--master", master],
+        check=True, capture_output=True, text=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Write/read throughput against MinIO for each Spark profile")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--rows", type=int, default=BENCHMARK_ROWS, help="Synthetic minute bars per profile")
+    parser.add_argument("--master", default="local[*]", help="Spark master")
+    parser.add_argument("--probe", choices=list(PROFILES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe, args.rows, args.master)
+        return
+
+    results = []
+    for profile in args.profiles:
+        logger.info(f"Benchmarking profile '{profile}' with {args.rows} rows...")
+        results.append(run_probe(profile, args.rows, args.master))
+
+    logger.info(f"{'profile':<18} {'files':>6} {'MB':>8} {'write s':>8} {'write MB/s':>11} "
+                f"{'scan s':>7} {'scan rows/s':>12} {'1 day -> pandas s':>18}")
+    for r in results:
+        megabytes = r["bytes"] / 1024 / 1024
+        logger.info(f"{r['profile']:<18} {r['files']:>6} {megabytes:>8.1f} {r['write_seconds']:>8.2f} "
+                    f"{megabytes / r['write_seconds']:>11.1f} {r['scan_seconds']:>7.2f} "
+                    f"{r['rows'] / r['scan_seconds']:>12,.0f} {r['pandas_seconds']:>18.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+from pyspark.sql import Row
+from pyspark.sql.functions import avg, col, date_trunc, lit, max as spark_max, min as spark_min, to_timestamp
+from pyspark.sql.types import TimestampType
+from delta.tables import DeltaTable
+from datetime import datetime
+import argparse
+import logging
+import time
+
+from spark_session import create_spark_session
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# MinIO configuration
+MINIO_BUCKET = "stock-data"
+
+# Tables to maintain: the streaming table gets small files every micro-batch
+DELTA_TABLES = [
+    f"s3a://{MINIO_BUCKET}/bitcoin_prices_delta_rt",
+    f"s3a://{MINIO_BUCKET}/bitcoin_prices_delta",
+]
+# One row per table and run: file counts and scan times before/after
+MAINTENANCE_LOG_PATH = f"s3a://{MINIO_BUCKET}/maintenance/delta_maintenance_log"
+
+# Bin-packing: files smaller than OPTIMIZE_MIN_FILE_SIZE are packed into files of up to
+# OPTIMIZE_MAX_FILE_SIZE; files already compacted are left alone on the next run
+OPTIMIZE_MAX_FILE_SIZE = 128 * 1024 * 1024
+OPTIMIZE_MIN_FILE_SIZE = 96 * 1024 * 1024
+ZORDER_COLUMNS = ["timestamp"]
+# Delta's default retention (7 days); shorter windows can delete files that a running stream
+# or time-travel query still reads, so they are refused
+VACUUM_RETENTION_HOURS = 168
+MIN_VACUUM_RETENTION_HOURS = 168
+
+# Schedule: compaction only rewrites small files and is cheap to repeat; Z-order rewrites the
+# whole (unpartitioned) table, so it and VACUUM run less often
+COMPACTION_INTERVAL_HOURS = 1
+ZORDER_INTERVAL_HOURS = 24
+# Each scan is timed this many times and the fastest kept, so the first run's warm-up
+# (JVM, S3 connections) does not count as a maintenance speed-up
+SCAN_REPEATS = 2
+
+def table_stats(spark, path):
+    """
+    Active file count and size of a Delta table
+    """
+    detail = spark.sql(f"DESCRIBE DETAIL delta.`{path}`").collect()[0]
+    return {"files": int(detail["numFiles"]), "bytes": int(detail["sizeInBytes"])}
+
+def event_time():
+    """
+    The bar time as a timestamp: tables written before spark-consumer.py parsed it hold a string
+    """
+    return to_timestamp(col("timestamp"))
+
+def has_timestamp_column(spark, path):
+    return isinstance(spark.read.format("delta").load(path).schema["timestamp"].dataType, TimestampType)
+
+def latest_timestamp(spark, path):
+    return spark.read.format("delta").load(path).agg(spark_max(event_time())).collect()[0][0]
+
+def scan_seconds(spark, path, since):
+    """
+    Time the aggregates read_delta_table.py runs: daily stats over the whole table and hourly
+    stats of the last day (a timestamp filter that benefits from data skipping)
+    """
+    best = None
+    for _ in range(SCAN_REPEATS):
+        start_time = time.perf_counter()
+        df = spark.read.format("delta").load(path)
+        (df.groupBy(date_trunc("day", event_time()).alias("date"))
+            .agg(avg("vwap"), spark_max("high"), spark_min("low"))
+            .collect())
+        (df.filter(event_time() >= lit(since))
+            .groupBy(date_trunc("hour", event_time()).alias("hour"))
+            .agg(avg("vwap"), spark_max("high"), spark_min("low"))
+            .collect())
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def optimize_table(spark, path, zorder_columns=None):
+    """
+    OPTIMIZE a Delta table: bin-packing, or Z-order by zorder_columns (which also bin-packs)
+
+    Returns the numbers of files removed and added.
+    """
+    optimizer = DeltaTable.forPath(spark, path).optimize()
+    if zorder_columns:
+        result = optimizer.executeZOrderBy(*zorder_columns)
+    else:
+        result = optimizer.executeCompaction()
+    metrics = result.select("metrics.numFilesRemoved", "metrics.numFilesAdded").collect()[0]
+    return {"files_removed": int(metrics["numFilesRemoved"]), "files_added": int(metrics["numFilesAdded"])}
+
+def vacuum_table(spark, path, retention_hours=VACUUM_RETENTION_HOURS):
+    """
+    Delete files no longer referenced by the table and older than the retention window
+    """
+    if retention_hours < MIN_VACUUM_RETENTION_HOURS:
+        raise ValueError(f"VACUUM retention {retention_hours}h is shorter than the safe minimum "
+                         f"{MIN_VACUUM_RETENTION_HOURS}h")
+    DeltaTable.forPath(spark, path).vacuum(retention_hours)
+
+def maintain_table(spark, path, zorder=False, vacuum=False, retention_hours=VACUUM_RETENTION_HOURS):
+    """
+    Compact (or Z-order) one table, optionally vacuum it, and measure files and scan time around it
+    """
+    if not DeltaTable.isDeltaTable(spark, path):
+        logger.warning(f"Skipping {path}: not a Delta table")
+        return None
+
+    if zorder and not has_timestamp_column(spark, path):
+        # Z-order and min/max skipping on the string column do not follow time order reliably
+        logger.warning(f"{path}: 'timestamp' is not a timestamp column, compacting instead of Z-ordering; "
+                       f"rewrite the table with the column cast to timestamp to enable Z-order")
+        zorder = False
+    operation = "zorder" if zorder else "compaction"
+    since = latest_timestamp(spark, path)
+    since = since.replace(hour=0, minute=0, second=0, microsecond=0) if since else datetime(1970, 1, 1)
+    before = table_stats(spark, path)
+    before_seconds = scan_seconds(spark, path, since)
+    logger.info(f"{path}: {before['files']} files, {before['bytes'] / 1024 / 1024:.1f} MB, "
+                f"scan {before_seconds:.2f}s before {operation}")
+
+    start_time = time.perf_counter()
+    optimized = optimize_table(spark, path, ZORDER_COLUMNS if zorder else None)
+    optimize_seconds = time.perf_counter() - start_time
+    if vacuum:
+        vacuum_table(spark, path, retention_hours)
+
+    after = table_stats(spark, path)
+    after_seconds = scan_seconds(spark, path, since)
+    logger.info(f"{path}: {operation} removed {optimized['files_removed']} and added "
+                f"{optimized['files_added']} files in {optimize_seconds:.1f}s; "
+                f"{after['files']} files, scan {after_seconds:.2f}s after "
+                f"({before_seconds / after_seconds:.1f}x)")
+
+    return Row(
+        table_path=path,
+        run_at=datetime.now(),
+        operation=operation,
+        vacuumed=vacuum,
+        files_before=before["files"],
+        files_after=after["files"],
+        bytes_before=before["bytes"],
+        bytes_after=after["bytes"],
+        files_removed=optimized["files_removed"],
+        files_added=optimized["files_added"],
+        optimize_seconds=optimize_seconds,
+        scan_seconds_before=before_seconds,
+        scan_seconds_after=after_seconds
+    )
+
+def run_maintenance(spark, tables=DELTA_TABLES, zorder=False, vacuum=False,
+                    retention_hours=VACUUM_RETENTION_HOURS):
+    """
+    Maintain every table and append the measurements to the maintenance log table
+    """
+    results = []
+    for path in tables:
+        try:
+            row = maintain_table(spark, path, zorder, vacuum, retention_hours)
+            if row is not None:
+                results.append(row)
+        except Exception as e:
+            logger.error(f"Error maintaining {path}: {e}")
+    if results:
+        spark.createDataFrame(results).write.format("delta").mode("append").save(MAINTENANCE_LOG_PATH)
+        logger.info(f"Recorded {len(results)} maintenance runs in {MAINTENANCE_LOG_PATH}")
+    return results
+
+def run_schedule(spark, tables, retention_hours):
+    """
+    Compact every COMPACTION_INTERVAL_HOURS; Z-order and vacuum every ZORDER_INTERVAL_HOURS
+    """
+    last_zorder = None
+    while True:
+        started = time.monotonic()
+        full = last_zorder is None or started - last_zorder >= ZORDER_INTERVAL_HOURS * 3600
+        run_maintenance(spark, tables, zorder=full, vacuum=full, retention_hours=retention_hours)
+        if full:
+            last_zorder = started
+        time.sleep(max(0.0, COMPACTION_INTERVAL_HOURS * 3600 - (time.monotonic() - started)))
+
+def main():
+    parser = argparse.ArgumentParser(description="OPTIMIZE / Z-order / VACUUM the Bitcoin Delta tables")
+    parser.add_argument("--tables", nargs="+", default=DELTA_TABLES, help="Delta table paths")
+    parser.add_argument("--zorder", action="store_true", help=f"Z-order by {ZORDER_COLUMNS} instead of bin-packing")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM after optimizing")
+    parser.add_argument("--retention-hours", type=int, default=VACUUM_RETENTION_HOURS,
+                        help=f"VACUUM retention (at least {MIN_VACUUM_RETENTION_HOURS})")
+    parser.add_argument("--schedule", action="store_true",
+                        help=f"Run forever: compaction every {COMPACTION_INTERVAL_HOURS}h, "
+                             f"Z-order + VACUUM every {ZORDER_INTERVAL_HOURS}h")
+    args = parser.parse_args()
+
+    spark = create_spark_session(
+        "BitcoinDeltaMaintenance", profile="batch-write",
+        overrides={"spark.databricks.delta.optimize.maxFileSize": str(OPTIMIZE_MAX_FILE_SIZE),
+                   "spark.databricks.delta.optimize.minFileSize": str(OPTIMIZE_MIN_FILE_SIZE)}
+    )
+    try:
+        if args.schedule:
+            run_schedule(spark, args.tables, args.retention_hours)
+        else:
+            run_maintenance(spark, args.tables, args.zorder, args.vacuum, args.retention_hours)
+    finally:
+        spark.stop()
+        logger.info("Spark session stopped")
+
+if __name__ == "__main__":
+    main()
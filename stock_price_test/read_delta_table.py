@@ -1,41 +1,18 @@
-from pyspark.sql import SparkSession
 from pyspark.sql.functions import col, date_trunc, avg, max, min
 import logging
 
+from spark_session import create_spark_session
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # MinIO configuration
-MINIO_ENDPOINT = "http://localhost:9000"
-MINIO_ACCESS_KEY = "minio"
-MINIO_SECRET_KEY = "minio123"
 MINIO_BUCKET = "stock-data"
 
 # Delta Lake path
 DELTA_PATH = f"s3a://{MINIO_BUCKET}/bitcoin_prices_delta"
 
-def create_spark_session():
-    """
-    Create and configure Spark session with necessary dependencies for Delta Lake and MinIO
-    """
-    spark = (SparkSession.builder
-        .appName("BitcoinPriceDeltaReader")
-        .config("spark.jars.packages", 
-                "io.delta:delta-spark_2.12:3.3.0,"
-                "org.apache.hadoop:hadoop-aws:3.3.2")
-        .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-        .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-        .config("spark.hadoop.fs.s3a.endpoint", MINIO_ENDPOINT)
-        .config("spark.hadoop.fs.s3a.access.key", MINIO_ACCESS_KEY)
-        .config("spark.hadoop.fs.s3a.secret.key", MINIO_SECRET_KEY)
-        .config("spark.hadoop.fs.s3a.path.style.access", "true")
-        .config("spark.hadoop.fs.s3a.impl", "org.apache.hadoop.fs.s3a.S3AFileSystem")
-        .config("spark.hadoop.fs.s3a.connection.ssl.enabled", "false")
-        .getOrCreate())
-    
-    return spark
-
 def read_bitcoin_data():
     """
     Read Bitcoin price data from Delta Lake format in MinIO
@@ -43,7 +20,7 @@ def read_bitcoin_data():
     logger.info(f"Starting to read Bitcoin price data from {DELTA_PATH}...")
     
     # Create Spark session
-    spark = create_spark_session()
+    spark = create_spark_session("BitcoinPriceDeltaReader", profile="interactive-read")
     logger.info("Spark session created")
     
     try:
@@ -0,0 +1,193 @@
+from pyspark.sql.functions import col, current_timestamp, lit, rand, struct, to_date
+import argparse
+import logging
+import tempfile
+import time
+
+from spark_session import create_spark_session
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# MinIO configuration
+MINIO_BUCKET = "stock-data"
+
+# Delta Lake paths: bars written by spark-batch-processor.py, predictions written by this job
+DELTA_PATH = f"s3a://{MINIO_BUCKET}/bitcoin_prices_delta"
+PREDICTIONS_PATH = f"s3a://{MINIO_BUCKET}/bitcoin_predictions_delta"
+
+# Used when the model has no signature
+FEATURE_COLUMNS = ["open", "high", "low", "close", "volume", "vwap", "trades"]
+
+# Rows per Arrow record batch handed to the pandas UDF
+ARROW_BATCH_SIZE = 10000
+BENCHMARK_ROWS = 2_000_000
+BENCHMARK_BATCH_SIZES = [1000, 5000, 10000, 50000]
+
+def create_inference_session(master=None, arrow_batch_size=ARROW_BATCH_SIZE):
+    """
+    Batch-write session whose pandas UDFs receive arrow_batch_size rows per Arrow batch
+    """
+    return create_spark_session("BitcoinPriceBatchInference", profile="batch-write", master=master,
+                                overrides={"spark.sql.execution.arrow.maxRecordsPerBatch": str(arrow_batch_size)})
+
+def model_feature_columns(model_uri):
+    """
+    Input columns from the model signature, FEATURE_COLUMNS if the model has none
+    """
+    from mlflow.models import get_model_info
+
+    signature = get_model_info(model_uri).signature
+    if signature is None or signature.inputs is None or not signature.inputs.has_input_names():
+        return FEATURE_COLUMNS
+    return signature.inputs.input_names()
+
+def load_model_udf(spark, model_uri):
+    """
+    Wrap the MLflow model as a Spark pandas UDF
+
+    The model is loaded once per Python worker and called on pandas batches of
+    spark.sql.execution.arrow.maxRecordsPerBatch rows, read when the query runs.
+    """
+    import mlflow.pyfunc
+
+    return mlflow.pyfunc.spark_udf(spark, model_uri, result_type="double", env_manager="local")
+
+def score(df, model_udf, feature_columns, model_uri, partitions=None):
+    """
+    Add prediction columns to a DataFrame of bars, one UDF call per partition batch
+    """
+    if partitions:
+        df = df.repartition(partitions)
+    return (df
+        .withColumn("prediction", model_udf(struct(*feature_columns)))
+        .withColumn("model_uri", lit(model_uri))
+        .withColumn("scored_at", current_timestamp()))
+
+def run_batch_inference(model_uri, input_path=DELTA_PATH, output_path=PREDICTIONS_PATH,
+                        arrow_batch_size=ARROW_BATCH_SIZE, partitions=None, master=None):
+    """
+    Score a Delta table with an MLflow model and write the predictions as a new Delta table
+    """
+    logger.info(f"Starting batch inference of {input_path} with {model_uri}...")
+
+    spark = create_inference_session(master, arrow_batch_size)
+    logger.info("Spark session created")
+
+    try:
+        feature_columns = model_feature_columns(model_uri)
+        model_udf = load_model_udf(spark, model_uri)
+        logger.info(f"Model loaded as pandas UDF, features: {feature_columns}")
+
+        # Each input partition is scored by its own task; --partitions rebalances small or skewed tables
+        df = spark.read.format("delta").load(input_path)
+        predictions = score(df, model_udf, feature_columns, model_uri, partitions)
+        partitions = predictions.rdd.getNumPartitions()
+
+        # Partitioned by trading date so readers can prune by day
+        start_time = time.perf_counter()
+        (predictions
+            .withColumn("date", to_date(col("timestamp")))
+            .write
+            .format("delta")
+            .mode("overwrite")
+            .partitionBy("date")
+            .save(output_path))
+        elapsed = time.perf_counter() - start_time
+
+        count = spark.read.format("delta").load(output_path).count()
+        logger.info(f"Wrote {count} predictions to {output_path} in {elapsed:.1f}s "
+                    f"({count / elapsed:,.0f} rows/s, {partitions} partitions, "
+                    f"Arrow batch size {arrow_batch_size})")
+
+    except Exception as e:
+        logger.error(f"Error in batch inference: {e}")
+        raise
+    finally:
+        spark.stop()
+        logger.info("Spark session stopped")
+
+def train_benchmark_model(path):
+    """
+    Save a small sklearn model over FEATURE_COLUMNS as an MLflow model for the benchmark
+    """
+    import numpy as np
+    import pandas as pd
+    import mlflow.sklearn
+    from mlflow.models import infer_signature
+    from sklearn.linear_model import Ridge
+
+    rng = np.random.default_rng(42)
+    X = pd.DataFrame(rng.random((1000, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    y = X["close"] * 1.01 + rng.normal(0, 0.01, len(X))
+    model = Ridge().fit(X, y)
+    mlflow.sklearn.save_model(model, path, signature=infer_signature(X, model.predict(X)))
+    return path
+
+def benchmark(model_uri=None, rows=BENCHMARK_ROWS, batch_sizes=BENCHMARK_BATCH_SIZES,
+              partitions=None, master="local[*]"):
+    """
+    Throughput of the scoring UDF for each Arrow batch size on a local-mode session
+
+    Bars are generated in Spark and results go to the noop sink, so the timing
+    covers Arrow transfer and model calls rather than MinIO I/O.
+    """
+    spark = create_inference_session(master)
+    try:
+        model_uri = model_uri or train_benchmark_model(tempfile.mkdtemp() + "/model")
+        feature_columns = model_feature_columns(model_uri)
+        model_udf = load_model_udf(spark, model_uri)
+        partitions = partitions or spark.sparkContext.defaultParallelism
+
+        bars = spark.range(rows).select(
+            col("id").cast("timestamp").alias("timestamp"),
+            *[(rand(seed=i) * 100000).alias(name) for i, name in enumerate(feature_columns)]
+        ).repartition(partitions).cache()
+        bars.count()
+
+        # Warm-up so the first batch size does not pay for starting Python workers and loading the model
+        score(bars, model_udf, feature_columns, model_uri).write.format("noop").mode("overwrite").save()
+
+        results = []
+        for batch_size in batch_sizes:
+            spark.conf.set("spark.sql.execution.arrow.maxRecordsPerBatch", str(batch_size))
+            start_time = time.perf_counter()
+            score(bars, model_udf, feature_columns, model_uri).write.format("noop").mode("overwrite").save()
+            elapsed = time.perf_counter() - start_time
+            results.append((batch_size, elapsed))
+            logger.info(f"Arrow batch size {batch_size}: {elapsed:.2f}s, {rows / elapsed:,.0f} rows/s")
+
+        logger.info(f"{'batch size':>10} {'seconds':>8} {'rows/s':>12}  ({rows} rows, {partitions} partitions)")
+        for batch_size, elapsed in results:
+            logger.info(f"{batch_size:>10} {elapsed:>8.2f} {rows / elapsed:>12,.0f}")
+        return results
+    finally:
+        spark.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the Bitcoin Delta table with an MLflow model on Spark")
+    parser.add_argument("--model-uri", help="MLflow model URI (required unless --benchmark)")
+    parser.add_argument("--input-path", default=DELTA_PATH, help="Delta table to score")
+    parser.add_argument("--output-path", default=PREDICTIONS_PATH, help="Delta table for predictions")
+    parser.add_argument("--arrow-batch-size", type=int, default=ARROW_BATCH_SIZE,
+                        help="Rows per Arrow batch passed to the model")
+    parser.add_argument("--partitions", type=int, help="Repartition the input to this many partitions")
+    parser.add_argument("--master", help="Spark master, e.g. local[*] (defaults to spark-submit's)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Measure throughput per Arrow batch size on a local-mode session")
+    parser.add_argument("--benchmark-rows", type=int, default=BENCHMARK_ROWS)
+    parser.add_argument("--benchmark-batch-sizes", type=int, nargs="+", default=BENCHMARK_BATCH_SIZES)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.model_uri, args.benchmark_rows, args.benchmark_batch_sizes,
+                  args.partitions, args.master or "local[*]")
+    elif args.model_uri:
+        run_batch_inference(args.model_uri, args.input_path, args.output_path,
+                            args.arrow_batch_size, args.partitions, args.master)
+    else:
+        parser.error("--model-uri is required")
+
+if __name__ == "__main__":
+    main()
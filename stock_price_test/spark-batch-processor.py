@@ -1,8 +1,9 @@
-from pyspark.sql import SparkSession
 from pyspark.sql.functions import explode, col, to_timestamp, lit
 import logging
 import os
 
+from spark_session import create_spark_session
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -11,35 +12,11 @@ logger = logging.getLogger(__name__)
 INPUT_JSON_PATH = "/home/hoangbaoan/repos/mlops_bigdata_2025II/stock_price_test/stock_price2.json"
 
 # MinIO configuration
-MINIO_ENDPOINT = "http://localhost:9000"
-MINIO_ACCESS_KEY = "minio"
-MINIO_SECRET_KEY = "minio123"
 MINIO_BUCKET = "stock-data"
 
 # Delta Lake output path
 DELTA_PATH = f"s3a://{MINIO_BUCKET}/bitcoin_prices_delta"
 
-def create_spark_session():
-    """
-    Create and configure Spark session with necessary dependencies for Delta Lake and MinIO
-    """
-    spark = (SparkSession.builder
-        .appName("BitcoinPriceJSONToDelta")
-        .config("spark.jars.packages", 
-                "io.delta:delta-spark_2.12:3.3.0,"
-                "org.apache.hadoop:hadoop-aws:3.3.2")
-        .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-        .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-        .config("spark.hadoop.fs.s3a.endpoint", MINIO_ENDPOINT)
-        .config("spark.hadoop.fs.s3a.access.key", MINIO_ACCESS_KEY)
-        .config("spark.hadoop.fs.s3a.secret.key", MINIO_SECRET_KEY)
-        .config("spark.hadoop.fs.s3a.path.style.access", "true")
-        .config("spark.hadoop.fs.s3a.impl", "org.apache.hadoop.fs.s3a.S3AFileSystem")
-        .config("spark.hadoop.fs.s3a.connection.ssl.enabled", "false")
-        .getOrCreate())
-    
-    return spark
-
 def process_bitcoin_json():
     """
     Process Bitcoin data from JSON file and write to Delta Lake format in MinIO
@@ -47,7 +24,7 @@ def process_bitcoin_json():
     logger.info(f"Starting to process Bitcoin price data from {INPUT_JSON_PATH}...")
     
     # Create Spark session
-    spark = create_spark_session()
+    spark = create_spark_session("BitcoinPriceJSONToDelta", profile="batch-write")
     logger.info("Spark session created")
     
     try:
@@ -1,10 +1,13 @@
-from pyspark.sql import SparkSession
 from pyspark.sql.types import StructType, StructField, StringType, DoubleType, IntegerType
-from pyspark.sql.functions import from_json, col, current_timestamp
+from pyspark.sql.functions import from_json, col, current_timestamp, to_timestamp
+from pyspark.sql.streaming import StreamingQueryListener
+import argparse
 import logging
 import os
 import io
 
+from spark_session import create_spark_session
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -15,15 +18,20 @@ KAFKA_TOPIC = "bitcoin-price"
 KAFKA_BOOTSTRAP_SERVERS = "localhost:9092"
 
 # MinIO configuration
-MINIO_ENDPOINT = "http://localhost:9000"
-MINIO_ACCESS_KEY = "minio"
-MINIO_SECRET_KEY = "minio123"
 MINIO_BUCKET = "stock-data"
 
 # Delta Lake output path - use local path for checkpoints to avoid S3 issues
 DELTA_PATH = f"s3a://{MINIO_BUCKET}/bitcoin_prices_delta_rt"
 LOCAL_CHECKPOINT_PATH = "/tmp/spark-checkpoints/bitcoin_prices"
 
+# Micro-batch configuration: one Delta commit (and one set of Parquet files) per trigger, so a
+# longer interval means fewer, larger files
+TRIGGER_MODES = ["processing-time", "available-now"]
+TRIGGER_MODE = "processing-time"
+TRIGGER_INTERVAL = "30 seconds"
+# Upper bound of Kafka offsets read per micro-batch (across partitions)
+MAX_OFFSETS_PER_TRIGGER = 50000
+
 # Define schema for the incoming JSON data
 schema = StructType([
     StructField("symbol", StringType(), True),
@@ -38,33 +46,6 @@ schema = StructType([
     StructField("fetch_time", StringType(), True)
 ])
 
-def create_spark_session():
-    """
-    Create and configure Spark session with necessary dependencies for Delta Lake and MinIO
-    """
-    spark = (SparkSession.builder
-        .appName("BitcoinPriceConsumer")
-        .config("spark.jars.packages", 
-                "io.delta:delta-spark_2.12:3.3.0,"
-                "org.apache.hadoop:hadoop-aws:3.3.2")
-        .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
-        .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
-        .config("spark.hadoop.fs.s3a.endpoint", MINIO_ENDPOINT)
-        .config("spark.hadoop.fs.s3a.access.key", MINIO_ACCESS_KEY)
-        .config("spark.hadoop.fs.s3a.secret.key", MINIO_SECRET_KEY)
-        .config("spark.hadoop.fs.s3a.path.style.access", "true")
-        .config("spark.hadoop.fs.s3a.impl", "org.apache.hadoop.fs.s3a.S3AFileSystem")
-        .config("spark.hadoop.fs.s3a.connection.ssl.enabled", "false")
-        .config("spark.hadoop.fs.s3a.aws.credentials.provider", "org.apache.hadoop.fs.s3a.SimpleAWSCredentialsProvider")
-        # Add more S3A configurations
-        .config("spark.hadoop.fs.s3a.committer.magic.enabled", "false")
-        .config("spark.hadoop.fs.s3a.committer.name", "directory")
-        .config("spark.hadoop.fs.s3a.fast.upload", "true")
-        .config("spark.sql.sources.commitProtocolClass", "org.apache.spark.sql.execution.datasources.SQLHadoopMapReduceCommitProtocol")
-        .getOrCreate())
-    
-    return spark
-
 def ensure_local_checkpoint_dir():
     """
     Create local checkpoint directory
@@ -99,18 +80,66 @@ def ensure_minio_directories(spark):
         logger.error(f"Error ensuring MinIO directories: {e}")
         return False
 
-def process_bitcoin_data():
+class BatchMetricsListener(StreamingQueryListener):
+    """
+    Log per-micro-batch metrics of every streaming query of the session
+    """
+
+    def onQueryStarted(self, event):
+        logger.info(f"Streaming query '{event.name}' started (id {event.id})")
+
+    def onQueryProgress(self, event):
+        progress = event.progress
+        state_rows = sum(op.numRowsTotal for op in progress.stateOperators)
+        state_bytes = sum(op.memoryUsedBytes for op in progress.stateOperators)
+        logger.info(
+            f"[{progress.name}] batch {progress.batchId}: {progress.numInputRows} rows, "
+            f"input {progress.inputRowsPerSecond:.1f} rows/s, "
+            f"processed {progress.processedRowsPerSecond:.1f} rows/s, "
+            f"duration {progress.batchDuration} ms, "
+            f"state {state_rows} rows / {state_bytes / 1024 / 1024:.1f} MB"
+        )
+
+    def onQueryIdle(self, event):
+        pass
+
+    def onQueryTerminated(self, event):
+        if event.exception:
+            logger.error(f"Streaming query {event.id} failed: {event.exception}")
+        else:
+            logger.info(f"Streaming query {event.id} terminated")
+
+def with_trigger(writer, trigger_mode, trigger_interval):
+    """
+    Apply the trigger: a micro-batch every trigger_interval, or everything available now then stop
+    """
+    if trigger_mode == "available-now":
+        return writer.trigger(availableNow=True)
+    if trigger_mode == "processing-time":
+        return writer.trigger(processingTime=trigger_interval)
+    raise ValueError(f"Unknown trigger mode '{trigger_mode}', expected one of {TRIGGER_MODES}")
+
+def process_bitcoin_data(trigger_mode=TRIGGER_MODE, trigger_interval=TRIGGER_INTERVAL,
+                         max_offsets_per_trigger=MAX_OFFSETS_PER_TRIGGER, debug_console=False):
     """
     Process Bitcoin data from Kafka and write to Delta Lake format in MinIO
+
+    Args:
+        trigger_mode: "processing-time" (runs until stopped) or "available-now" (drains Kafka and exits)
+        trigger_interval: micro-batch interval for processing-time, e.g. "30 seconds"
+        max_offsets_per_trigger: Kafka offsets read per micro-batch at most (None for no limit)
+        debug_console: also print every micro-batch to the console
     """
-    logger.info("Starting Bitcoin price consumer...")
+    logger.info(f"Starting Bitcoin price consumer (trigger {trigger_mode}, interval {trigger_interval}, "
+                f"max offsets per trigger {max_offsets_per_trigger})...")
     
     # Ensure local checkpoint directory exists
     if not ensure_local_checkpoint_dir():
         raise Exception("Failed to create local checkpoint directory")
     
     # Create Spark session
-    spark = create_spark_session()
+    spark = create_spark_session("BitcoinPriceConsumer", profile="streaming")
+    spark.streams.addListener(BatchMetricsListener())
     logger.info("Spark session created")
     
     try:
@@ -119,49 +148,63 @@ def process_bitcoin_data():
             raise Exception("Failed to create MinIO directory structure")
         
         # Read from Kafka
-        kafka_stream = (spark
+        kafka_reader = (spark
             .readStream
             .format("kafka")
             .option("kafka.bootstrap.servers", KAFKA_BOOTSTRAP_SERVERS)
             .option("subscribe", KAFKA_TOPIC)
-            .option("startingOffsets", "latest")
-            .load())
+            .option("startingOffsets", "latest"))
+        if max_offsets_per_trigger:
+            kafka_reader = kafka_reader.option("maxOffsetsPerTrigger", max_offsets_per_trigger)
+        kafka_stream = kafka_reader.load()
         
         logger.info("Kafka stream initialized")
         
-        # Parse JSON data
+        # Parse JSON data; the bar time arrives as an ISO-8601 string and is stored as a real
+        # timestamp (as spark-batch-processor.py does), so date_trunc, data skipping and Z-order
+        # work on it. A table created with the old string column has to be rewritten once.
         parsed_stream = (kafka_stream
             .selectExpr("CAST(value AS STRING)")
             .select(from_json(col("value"), schema).alias("data"))
             .select("data.*")
+            .withColumn("timestamp", to_timestamp(col("timestamp")))
             .withColumn("processing_time", current_timestamp()))
 
-        # --- Debug: Write to console ---
-        console_query = (parsed_stream
-            .writeStream
-            .format("console")
-            .outputMode("append")
-            .start())
-        
-        logger.info("Started writing to console for debugging")
-        # --- End Debug ---
+        # Debug only: a second query that re-reads every micro-batch from Kafka
+        if debug_console:
+            with_trigger(parsed_stream
+                .writeStream
+                .queryName("bitcoin_prices_console")
+                .format("console")
+                .outputMode("append"), trigger_mode, trigger_interval).start()
+            logger.info("Started writing to console for debugging")
 
         # Write to Delta Lake format in MinIO using local checkpoints
-        delta_query = (parsed_stream
+        delta_query = with_trigger(parsed_stream
             .writeStream
+            .queryName("bitcoin_prices_delta")
             .format("delta")
             .outputMode("append")
-            .option("checkpointLocation", LOCAL_CHECKPOINT_PATH)
-            .start(DELTA_PATH))
+            .option("checkpointLocation", LOCAL_CHECKPOINT_PATH), trigger_mode, trigger_interval).start(DELTA_PATH)
         
         logger.info(f"Started writing to Delta Lake at {DELTA_PATH}")
         
-        # Wait for the streaming query to terminate
+        # Wait for the streaming query to terminate (available-now stops once Kafka is drained)
         delta_query.awaitTermination()
         
     except Exception as e:
         logger.error(f"Error in Bitcoin price consumer: {e}")
+    finally:
         spark.stop()
 
 if __name__ == "__main__":
-    process_bitcoin_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Consume Bitcoin prices from Kafka into Delta Lake")
+    parser.add_argument("--trigger", choices=TRIGGER_MODES, default=TRIGGER_MODE, help="Trigger mode")
+    parser.add_argument("--trigger-interval", default=TRIGGER_INTERVAL,
+                        help="Micro-batch interval for processing-time triggers")
+    parser.add_argument("--max-offsets-per-trigger", type=int, default=MAX_OFFSETS_PER_TRIGGER,
+                        help="Kafka offsets per micro-batch at most (0 for no limit)")
+    parser.add_argument("--debug-console", action="store_true", help="Also print micro-batches to the console")
+    args = parser.parse_args()
+
+    process_bitcoin_data(args.trigger, args.trigger_interval, args.max_offsets_per_trigger, args.debug_console)
\ No newline at end of file
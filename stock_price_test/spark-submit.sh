@@ -1,2 +1,4 @@
-spark-submit --master local[*] --packages org.apache.spark:spark-sql-kafka-0-10_2.12:3.3.0,org.apache.hadoop:hadoop-aws:3.3.2,io.delta:delta-spark_2.12:3.3.0   --conf "spark.sql.extensions=io.delta.sql.DeltaSparkSessionExtension"   --conf "spark.sql.catalog.spark_catalog=org.apache.spark.sql.delta.catalog.DeltaCatalog"   /home/hoangbaoan/repos/mlops_bigdata_2025II/stock_price_test/spark-consumer.py
-spark-submit --master k8s://https://localhost:9443 --packages org.apache.spark:spark-sql-kafka-0-10_2.12:3.3.0,org.apache.hadoop:hadoop-aws:3.3.2,io.delta:delta-spark_2.12:3.3.0   --conf "spark.sql.extensions=io.delta.sql.DeltaSparkSessionExtension"   --conf "spark.sql.catalog.spark_catalog=org.apache.spark.sql.delta.catalog.DeltaCatalog"   /home/hoangbaoan/repos/mlops_bigdata_2025II/stock_price_test/spark-consumer.py
\ No newline at end of file
+spark-submit --master local[*] --packages org.apache.spark:spark-sql-kafka-0-10_2.12:3.3.0,org.apache.hadoop:hadoop-aws:3.3.2,io.delta:delta-spark_2.12:3.3.0   --conf "spark.sql.extensions=io.delta.sql.DeltaSparkSessionExtension"   --conf "spark.sql.catalog.spark_catalog=org.apache.spark.sql.delta.catalog.DeltaCatalog"   --py-files /home/hoangbaoan/repos/mlops_bigdata_2025II/stock_price_test/spark_session.py   /home/hoangbaoan/repos/mlops_bigdata_2025II/stock_price_test/spark-consumer.py
+spark-submit --master k8s://https://localhost:9443 --packages org.apache.spark:spark-sql-kafka-0-10_2.12:3.3.0,org.apache.hadoop:hadoop-aws:3.3.2,io.delta:delta-spark_2.12:3.3.0   --conf "spark.sql.extensions=io.delta.sql.DeltaSparkSessionExtension"   --conf "spark.sql.catalog.spark_catalog=org.apache.spark.sql.delta.catalog.DeltaCatalog"   --py-files /home/hoangbaoan/repos/mlops_bigdata_2025II/stock_price_test/spark_session.py   /home/hoangbaoan/repos/mlops_bigdata_2025II/stock_price_test/spark-consumer.py
+spark-submit --master local[*] --packages org.apache.hadoop:hadoop-aws:3.3.2,io.delta:delta-spark_2.12:3.3.0   --conf "spark.sql.extensions=io.delta.sql.DeltaSparkSessionExtension"   --conf "spark.sql.catalog.spark_catalog=org.apache.spark.sql.delta.catalog.DeltaCatalog"   --py-files /home/hoangbaoan/repos/mlops_bigdata_2025II/stock_price_test/spark_session.py   /home/hoangbaoan/repos/mlops_bigdata_2025II/stock_price_test/spark-batch-inference.py --model-uri runs:/<run_id>/model --arrow-batch-size 10000
+spark-submit --master local[*] --packages org.apache.hadoop:hadoop-aws:3.3.2,io.delta:delta-spark_2.12:3.3.0   --conf "spark.sql.extensions=io.delta.sql.DeltaSparkSessionExtension"   --conf "spark.sql.catalog.spark_catalog=org.apache.spark.sql.delta.catalog.DeltaCatalog"   --py-files /home/hoangbaoan/repos/mlops_bigdata_2025II/stock_price_test/spark_session.py   /home/hoangbaoan/repos/mlops_bigdata_2025II/stock_price_test/delta-maintenance.py --schedule
\ No newline at end of file
@@ -0,0 +1,111 @@
+from pyspark.sql import SparkSession
+import logging
+
+logger = logging.getLogger(__name__)
+
+# MinIO configuration
+MINIO_ENDPOINT = "http://localhost:9000"
+MINIO_ACCESS_KEY = "minio"
+MINIO_SECRET_KEY = "minio123"
+
+SPARK_PACKAGES = "io.delta:delta-spark_2.12:3.3.0,org.apache.hadoop:hadoop-aws:3.3.2"
+
+# Settings shared by every job: Delta Lake, MinIO over S3A and the commit protocol
+BASE_CONFIG = {
+    "spark.jars.packages": SPARK_PACKAGES,
+    "spark.sql.extensions": "io.delta.sql.DeltaSparkSessionExtension",
+    "spark.sql.catalog.spark_catalog": "org.apache.spark.sql.delta.catalog.DeltaCatalog",
+    "spark.hadoop.fs.s3a.endpoint": MINIO_ENDPOINT,
+    "spark.hadoop.fs.s3a.access.key": MINIO_ACCESS_KEY,
+    "spark.hadoop.fs.s3a.secret.key": MINIO_SECRET_KEY,
+    "spark.hadoop.fs.s3a.path.style.access": "true",
+    "spark.hadoop.fs.s3a.impl": "org.apache.hadoop.fs.s3a.S3AFileSystem",
+    "spark.hadoop.fs.s3a.connection.ssl.enabled": "false",
+    "spark.hadoop.fs.s3a.aws.credentials.provider": "org.apache.hadoop.fs.s3a.SimpleAWSCredentialsProvider",
+    "spark.hadoop.fs.s3a.committer.magic.enabled": "false",
+    "spark.hadoop.fs.s3a.committer.name": "directory",
+    "spark.hadoop.fs.s3a.fast.upload": "true",
+    "spark.sql.sources.commitProtocolClass":
+        "org.apache.spark.sql.execution.datasources.SQLHadoopMapReduceCommitProtocol",
+    # Arrow for toPandas/createDataFrame and pandas UDFs
+    "spark.sql.execution.arrow.pyspark.enabled": "true",
+    "spark.sql.execution.arrow.pyspark.fallback.enabled": "true",
+}
+
+# Performance profiles layered on top of BASE_CONFIG
+PROFILES = {
+    # Small, frequent micro-batches: few shuffle partitions so each trigger schedules few tasks,
+    # small in-memory upload buffers. AQE does not apply to streaming queries.
+    "streaming": {
+        "spark.sql.shuffle.partitions": "8",
+        "spark.sql.adaptive.enabled": "false",
+        "spark.hadoop.fs.s3a.connection.maximum": "32",
+        "spark.hadoop.fs.s3a.threads.max": "16",
+        "spark.hadoop.fs.s3a.fast.upload.buffer": "bytebuffer",
+        "spark.hadoop.fs.s3a.fast.upload.active.blocks": "2",
+        "spark.hadoop.fs.s3a.multipart.size": "16M",
+        "spark.hadoop.fs.s3a.multipart.threshold": "16M",
+        "spark.sql.execution.arrow.maxRecordsPerBatch": "1000",
+    },
+    # Large writes: many parallel multipart uploads of large parts buffered on disk,
+    # AQE coalesces shuffle output into files of about the advisory size.
+    "batch-write": {
+        "spark.sql.shuffle.partitions": "200",
+        "spark.sql.adaptive.enabled": "true",
+        "spark.sql.adaptive.coalescePartitions.enabled": "true",
+        "spark.sql.adaptive.advisoryPartitionSizeInBytes": "128m",
+        "spark.databricks.delta.optimizeWrite.enabled": "true",
+        "spark.hadoop.fs.s3a.connection.maximum": "200",
+        "spark.hadoop.fs.s3a.threads.max": "64",
+        "spark.hadoop.fs.s3a.fast.upload.buffer": "disk",
+        "spark.hadoop.fs.s3a.fast.upload.active.blocks": "8",
+        "spark.hadoop.fs.s3a.multipart.size": "128M",
+        "spark.hadoop.fs.s3a.multipart.threshold": "128M",
+        "spark.sql.execution.arrow.maxRecordsPerBatch": "10000",
+    },
+    # Ad-hoc queries over Delta/Parquet: random-access reads for column chunks, smaller input
+    # splits for more parallelism, AQE for joins and aggregations.
+    "interactive-read": {
+        "spark.sql.shuffle.partitions": "32",
+        "spark.sql.adaptive.enabled": "true",
+        "spark.sql.adaptive.coalescePartitions.enabled": "true",
+        "spark.sql.adaptive.skewJoin.enabled": "true",
+        "spark.sql.files.maxPartitionBytes": "64m",
+        "spark.hadoop.fs.s3a.connection.maximum": "100",
+        "spark.hadoop.fs.s3a.threads.max": "32",
+        "spark.hadoop.fs.s3a.experimental.input.fadvise": "random",
+        "spark.hadoop.fs.s3a.readahead.range": "1M",
+        "spark.sql.execution.arrow.maxRecordsPerBatch": "10000",
+    },
+}
+
+def profile_config(profile, overrides=None):
+    """
+    Full configuration of a profile: BASE_CONFIG, then the profile, then overrides
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown Spark profile '{profile}', expected one of {list(PROFILES)}")
+    return {**BASE_CONFIG, **PROFILES[profile], **(overrides or {})}
+
+def create_spark_session(app_name, profile="batch-write", master=None, overrides=None):
+    """
+    Create and configure Spark session with Delta Lake, MinIO and the settings of a performance profile
+
+    Args:
+        app_name: Spark application name
+        profile: one of PROFILES ("streaming", "batch-write", "interactive-read")
+        master: Spark master, e.g. local[*] (defaults to the one given to spark-submit)
+        overrides: extra settings applied last, e.g. {"spark.sql.shuffle.partitions": "64"}
+
+    S3A settings are read when the S3A filesystem is first created in the JVM, so switching
+    profiles needs a new process, not only a new session.
+    """
+    builder = SparkSession.builder.appName(app_name)
+    if master:
+        builder = builder.master(master)
+    for key, value in profile_config(profile, overrides).items():
+        builder = builder.config(key, value)
+    spark = builder.getOrCreate()
+    logger.info(f"Spark session '{app_name}' created with profile '{profile}'")
+
+    return spark